@@ -1,17 +1,23 @@
 import contextlib
+import hashlib
+import json
 import logging
 import re
 import shutil
 import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from bs4 import BeautifulSoup
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.test import Client, override_settings
 from django.utils.timezone import override as override_timezone
 from django_scopes import scope, scopes_disabled
 
+from eventyay import __version__
 from eventyay.base.models.transaction import rolledback_transaction
 from eventyay.common.signals import register_data_exporters
 from eventyay.base.models import Event
@@ -19,6 +25,30 @@ from eventyay.base.models import Event
 SERVER_NAME = settings.SITE_URL.split('://')[1]
 
 
+def make_getter():
+    client = Client()
+
+    def get(url):
+        try:
+            # Try getting the file from disk directly first, …
+            return get_mediastatic_content(url)
+        except FileNotFoundError:
+            # … then fall back to asking the views.
+            response = client.get(
+                url,
+                is_html_export=True,
+                HTTP_ACCEPT='text/html',
+                SERVER_NAME=SERVER_NAME,
+            )
+            return get_content(response)
+
+    return get
+
+
+def needs_fake_admin(event):
+    return not event.is_public or event.custom_domain or not event.get_feature_flag('show_schedule')
+
+
 @contextlib.contextmanager
 def fake_admin(event):
     with rolledback_transaction():
@@ -26,23 +56,7 @@ def fake_admin(event):
         event.custom_domain = None
         event.feature_flags['show_schedule'] = True
         event.save()
-        client = Client()
-
-        def get(url):
-            try:
-                # Try getting the file from disk directly first, …
-                return get_mediastatic_content(url)
-            except FileNotFoundError:
-                # … then fall back to asking the views.
-                response = client.get(
-                    url,
-                    is_html_export=True,
-                    HTTP_ACCEPT='text/html',
-                    SERVER_NAME=SERVER_NAME,
-                )
-                return get_content(response)
-
-        yield get
+        yield make_getter()
 
 
 def find_assets(html):
@@ -124,10 +138,8 @@ def get_content(response):
     return b''.join(response.streaming_content) if response.streaming else response.content
 
 
-def dump_content(destination, path, getter):
-    destination = Path(destination)
-    logging.debug(path)
-
+def get_file_path(destination, path):
+    destination = Path(destination).resolve()
     # We need to urldecode the file path, as otherwise we will end up with a file name
     # that won't be found when the export is served by a web server.
     file_path = urllib.parse.unquote(path)
@@ -136,6 +148,12 @@ def dump_content(destination, path, getter):
     file_path = (destination / file_path.lstrip('/')).resolve()
     if destination not in file_path.parents:  # pragma: no cover
         raise CommandError('Path traversal detected, aborting.')
+    return file_path
+
+
+def dump_content(destination, path, getter):
+    logging.debug(path)
+    file_path = get_file_path(destination, path)
     file_path.parent.mkdir(parents=True, exist_ok=True)
 
     content = getter(path)
@@ -164,23 +182,146 @@ def get_mediastatic_content(url):
         return media_file.read()
 
 
-def export_event(event, destination):
+def fingerprint(*data):
+    return hashlib.sha256(json.dumps(data, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def event_fingerprint(event):
+    """Covers everything that is shown on all pages, so that any change to it
+    results in a full export. The current schedule is not part of it, as a
+    release only changes the pages covered by ``page_fingerprints`` and the
+    schedule pages, which are rendered on every export."""
+    return fingerprint(
+        __version__,
+        {
+            field.attname: getattr(event, field.attname)
+            for field in event._meta.concrete_fields
+            # Changes on every save, even if nothing that is shown changed
+            if field.attname != 'updated'
+        },
+        event.settings.freeze(),
+    )
+
+
+def page_fingerprints(event):
+    """Map the paths of all talk, speaker and schedule version pages to a
+    fingerprint of the data they show. Pages that are not listed here (like
+    the schedule itself or the talk list) are re-rendered on every export."""
+    schedule = event.current_schedule
+    if not schedule:
+        return {}
+    slots = defaultdict(list)
+    for slot in schedule.scheduled_talks:
+        slots[slot.submission_id].append((slot.start, slot.end, slot.room_id, slot.room.updated))
+
+    talks = {}
+    fingerprints = {}
+    for talk in event.talks.prefetch_related('resources'):
+        talks[talk.pk] = fingerprint(
+            talk.updated,
+            sorted(slots[talk.pk]),
+            [(speaker.pk, speaker.get_display_name(), speaker.avatar.name) for speaker in talk.speakers.all()],
+            [(resource.pk, resource.updated) for resource in talk.resources.all()],
+        )
+        fingerprints[get_path(talk.urls.public)] = talks[talk.pk]
+        fingerprints[get_path(talk.urls.ical)] = talks[talk.pk]
+
+    for speaker in event.speakers.prefetch_related('submissions'):
+        profile = speaker.event_profile(event)
+        speaker_fingerprint = fingerprint(
+            profile.updated,
+            speaker.get_display_name(),
+            speaker.avatar.name,
+            [talks[talk.pk] for talk in speaker.submissions.all() if talk.pk in talks],
+        )
+        fingerprints[get_path(profile.urls.public)] = speaker_fingerprint
+        fingerprints[get_path(profile.urls.talks_ical)] = speaker_fingerprint
+
+    # Released schedule versions never change, but the current one is shown as such on its page
+    for version in event.schedules.filter(version__isnull=False):
+        for url in (version.urls.public, version.urls.widget_data, version.urls.nojs):
+            fingerprints[get_path(url)] = fingerprint(version.pk, version.pk == schedule.pk)
+    return fingerprints
+
+
+def render_pages(event, destination, paths, get=None):
+    """Render ``paths`` to ``destination`` and return their content. Without a
+    ``get`` callable, the pages are rendered by a pool of
+    ``HTMLEXPORT_WORKERS`` threads with their own test client (and database
+    connection) each."""
+    if get or settings.HTMLEXPORT_WORKERS < 2 or len(paths) < 2:
+        get = get or make_getter()
+        return {path: dump_content(destination, path, get) for path in paths}
+
+    def render_chunk(chunk):
+        try:
+            with scope(event=event), override_timezone(event.timezone):
+                get = make_getter()
+                return {path: dump_content(destination, path, get) for path in chunk}
+        finally:
+            connections.close_all()
+
+    workers = min(settings.HTMLEXPORT_WORKERS, len(paths))
+    chunks = [paths[i::workers] for i in range(workers)]
+    result = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for rendered in executor.map(render_chunk, chunks):
+            result.update(rendered)
+    return result
+
+
+def export_event(event, destination, manifest=None):
+    """Export all pages of the event to ``destination`` and return a manifest
+    of the exported pages.
+
+    If the manifest of a previous export to the same destination is passed,
+    only pages whose fingerprint changed are rendered again, and only files
+    that are not yet part of the export are copied."""
+    # Computed before fake_admin() changes and saves the event for the export
+    global_fingerprint = event_fingerprint(event)
+    fingerprints = page_fingerprints(event)
     with (
         override_settings(COMPRESS_ENABLED=True, COMPRESS_OFFLINE=True),
         override_timezone(event.timezone),
-        fake_admin(event) as get,
+        fake_admin(event) if needs_fake_admin(event) else contextlib.nullcontext() as get,
     ):
         logging.info('Collecting URLs for export')
-        urls = list(event_urls(event))
-        assets = set()
-
-        logging.info(f'Exporting {len(urls)} pages')
-        for url in map(get_path, urls):
-            content = dump_content(destination, url, get)
+        urls = list(dict.fromkeys(map(get_path, event_urls(event))))
+
+        manifest = manifest or {}
+        if manifest.get('fingerprint') != global_fingerprint:
+            # Everything may have changed, start from scratch
+            manifest = {}
+            for child in Path(destination).iterdir():
+                if child.is_dir():
+                    delete_directory(child)
+                else:
+                    child.unlink()
+        old_pages = manifest.get('pages', {})
+        old_files = set(manifest.get('files', []))
+        pages = {}
+
+        unchanged = [
+            url
+            for url in urls
+            if url in fingerprints
+            and old_pages.get(url, {}).get('fingerprint') == fingerprints[url]
+            and get_file_path(destination, url).exists()
+        ]
+        for url in unchanged:
+            pages[url] = old_pages[url]
+        changed = [url for url in urls if url not in pages]
+
+        logging.info(f'Exporting {len(changed)} pages, {len(unchanged)} pages are unchanged')
+        for url, content in render_pages(event, destination, changed, get).items():
+            page = {'fingerprint': fingerprints.get(url), 'assets': []}
             if not url.startswith('/media/') and not url.startswith('/static/'):
-                assets |= set(map(get_path, find_assets(content)))
+                page['assets'] = sorted(set(map(get_path, find_assets(content))))
+            pages[url] = page
 
+        assets = set().union(*(page['assets'] for page in pages.values())) - old_files
         css_assets = set()
+        get = get or make_getter()
 
         logging.info(f'Exporting {len(assets)} static files from HTML links')
         for url in assets:
@@ -189,10 +330,35 @@ def export_event(event, destination):
             if url.endswith('.css'):
                 css_assets |= set(find_urls(content))
 
+        css_assets = {get_path(urllib.parse.unquote(url)) for url in css_assets} - old_files
         logging.info(f'Exporting {len(css_assets)} files from CSS links')
-        for url_path in (get_path(urllib.parse.unquote(url)) for url in css_assets):
+        for url_path in css_assets:
             dump_content(destination, url_path, get)
 
+        # Remove pages of talks and speakers that are no longer part of the schedule
+        for url in set(old_pages) - set(pages):
+            with contextlib.suppress(FileNotFoundError):
+                get_file_path(destination, url).unlink()
+
+    return {
+        'fingerprint': global_fingerprint,
+        'pages': pages,
+        'files': sorted(old_files | assets | css_assets),
+    }
+
+
+def load_manifest(event):
+    try:
+        with open(get_export_manifest_path(event)) as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_manifest(event, manifest):
+    with open(get_export_manifest_path(event), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+
 
 def delete_directory(path):
     with contextlib.suppress(FileNotFoundError):
@@ -207,11 +373,16 @@ def get_export_zip_path(event):
     return get_export_path(event).with_suffix('.zip')
 
 
+def get_export_manifest_path(event):
+    return get_export_path(event).with_suffix('.manifest.json')
+
+
 class Command(BaseCommand):
     def add_arguments(self, parser):
         super().add_arguments(parser)
         parser.add_argument('event', type=str)
         parser.add_argument('--zip', action='store_true')
+        parser.add_argument('--full', action='store_true', help='Re-render all pages, even unchanged ones.')
 
     def handle(self, *args, **options):
         event_slug = options.get('event')
@@ -229,12 +400,19 @@ class Command(BaseCommand):
             tmp_dir = export_dir.with_name(export_dir.name + '-new')
 
             delete_directory(tmp_dir)
-            tmp_dir.mkdir()
+            manifest = None if options.get('full') else load_manifest(event)
+            if manifest and export_dir.exists():
+                # Update a copy of the previous export, so that it stays intact if the export fails
+                shutil.copytree(export_dir, tmp_dir)
+            else:
+                manifest = None
+                tmp_dir.mkdir()
 
             try:
-                export_event(event, tmp_dir)
+                manifest = export_event(event, tmp_dir, manifest=manifest)
                 delete_directory(export_dir)
                 tmp_dir.rename(export_dir)
+                save_manifest(event, manifest)
             except Exception as exc:
                 logging.error(f'Export failed: {exc}')
                 delete_directory(tmp_dir)
@@ -248,8 +426,7 @@ class Command(BaseCommand):
                     base_name=zip_path.parent / zip_path.stem,
                     format='zip',
                 )
-                delete_directory(export_dir)
-
+                # The export directory is kept as the base of the next incremental export
                 logging.info(f'Exported to {zip_path}')
             else:
                 logging.info(f'Exported to {export_dir}')
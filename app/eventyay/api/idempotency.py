@@ -0,0 +1,188 @@
+"""
+Storage of idempotent API calls.
+
+Requests to the API with an ``X-Idempotency-Key`` header are executed only once per key and authentication, every
+repetition receives the stored response of the first call. The ``IdempotencyMiddleware`` keeps track of the calls
+through the backend configured in ``settings.API_IDEMPOTENCY_BACKEND``:
+
+- ``DatabaseIdempotencyBackend`` stores calls as ``ApiCall`` objects, which are deleted by a periodic task after
+  ``settings.API_IDEMPOTENCY_TTL`` seconds.
+- ``RedisIdempotencyBackend`` locks calls with an atomic ``SET NX`` and stores responses with a TTL, so that nothing
+  needs to be cleaned up. Responses larger than ``settings.API_IDEMPOTENCY_MAX_BODY_SIZE`` are stored in the
+  database instead.
+"""
+
+import base64
+import json
+from functools import lru_cache
+from hashlib import sha1
+from typing import NamedTuple, Union
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from eventyay.api.models import ApiCall
+
+# Returned by ``acquire`` if the same call is still being processed by another request
+LOCKED = object()
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    # In the format of ``HttpResponse.headers._store``, i.e. {lowercased name: (name, value)}
+    headers: dict
+    body: bytes
+
+
+class BaseIdempotencyBackend:
+    def acquire(
+        self, request: HttpRequest, auth_hash: str, idempotency_key: str
+    ) -> Union[None, object, StoredResponse]:
+        """
+        Registers a call. Returns ``None`` if the call has not been seen before and needs to be processed, ``LOCKED``
+        if it is currently being processed by another request, or the ``StoredResponse`` of an earlier call.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def store(self, auth_hash: str, idempotency_key: str, response: StoredResponse) -> None:
+        """
+        Stores the response of a call registered with ``acquire``.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def release(self, auth_hash: str, idempotency_key: str) -> None:
+        """
+        Forgets a call registered with ``acquire``, so that it can be retried.
+        """
+        raise NotImplementedError()  # NOQA
+
+
+class DatabaseIdempotencyBackend(BaseIdempotencyBackend):
+    def acquire(self, request, auth_hash, idempotency_key):
+        with transaction.atomic():
+            call, created = ApiCall.objects.select_for_update().get_or_create(
+                auth_hash=auth_hash,
+                idempotency_key=idempotency_key,
+                defaults={
+                    'locked': now(),
+                    'request_method': request.method,
+                    'request_path': request.path,
+                    'response_code': 0,
+                    'response_headers': '{}',
+                    'response_body': b'',
+                },
+            )
+        if created:
+            return None
+        if call.locked:
+            return LOCKED
+
+        content = call.response_body
+        if isinstance(content, memoryview):
+            content = content.tobytes()
+        return StoredResponse(call.response_code, json.loads(call.response_headers), content)
+
+    def store(self, auth_hash, idempotency_key, response):
+        ApiCall.objects.filter(auth_hash=auth_hash, idempotency_key=idempotency_key).update(
+            locked=None,
+            response_code=response.status_code,
+            response_headers=json.dumps(response.headers),
+            response_body=response.body,
+        )
+
+    def release(self, auth_hash, idempotency_key):
+        ApiCall.objects.filter(auth_hash=auth_hash, idempotency_key=idempotency_key).delete()
+
+
+class RedisIdempotencyBackend(BaseIdempotencyBackend):
+    _locked = b'locked'
+    _database = b'database'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection('redis')
+        self.database = DatabaseIdempotencyBackend()
+
+    def _key(self, auth_hash, idempotency_key):
+        return 'eventyay_idempotency:{}:{}'.format(auth_hash, sha1(idempotency_key.encode()).hexdigest())
+
+    def acquire(self, request, auth_hash, idempotency_key):
+        key = self._key(auth_hash, idempotency_key)
+        if self.redis.set(key, self._locked, nx=True, ex=settings.API_IDEMPOTENCY_LOCK_TIMEOUT):
+            return None
+
+        value = self.redis.get(key)
+        if value is None or value == self._locked:
+            # Either still running or the call has just expired, in which case the client can simply retry
+            return LOCKED
+        if value == self._database:
+            return self.database.acquire(request, auth_hash, idempotency_key)
+
+        data = json.loads(value)
+        return StoredResponse(data['status_code'], data['headers'], base64.b64decode(data['body']))
+
+    def store(self, auth_hash, idempotency_key, response):
+        key = self._key(auth_hash, idempotency_key)
+        if len(response.body) > settings.API_IDEMPOTENCY_MAX_BODY_SIZE:
+            ApiCall.objects.update_or_create(
+                auth_hash=auth_hash,
+                idempotency_key=idempotency_key,
+                defaults={
+                    'locked': None,
+                    'request_method': '',
+                    'request_path': '',
+                    'response_code': response.status_code,
+                    'response_headers': json.dumps(response.headers),
+                    'response_body': response.body,
+                },
+            )
+            self.redis.set(key, self._database, ex=settings.API_IDEMPOTENCY_TTL)
+            return
+
+        value = json.dumps(
+            {
+                'status_code': response.status_code,
+                'headers': response.headers,
+                'body': base64.b64encode(response.body).decode(),
+            }
+        )
+        self.redis.set(key, value, ex=settings.API_IDEMPOTENCY_TTL)
+
+    def release(self, auth_hash, idempotency_key):
+        self.redis.delete(self._key(auth_hash, idempotency_key))
+
+
+@lru_cache(maxsize=1)
+def get_idempotency_backend() -> BaseIdempotencyBackend:
+    return import_string(settings.API_IDEMPOTENCY_BACKEND)()
+
+
+def get_stored_response(response) -> StoredResponse:
+    """
+    Returns the representation of an ``HttpResponse`` that is stored for repetitions of an idempotent call.
+    """
+    if isinstance(response.content, str):
+        body = response.content.encode()
+    elif isinstance(response.content, memoryview):
+        body = response.content.tobytes()
+    elif isinstance(response.content, bytes):
+        body = response.content
+    elif hasattr(response.content, 'read'):
+        body = response.read()
+    elif hasattr(response, 'data'):
+        body = json.dumps(response.data).encode()
+    else:
+        body = repr(response).encode()
+    return StoredResponse(response.status_code, dict(response.headers._store), body)
+
+
+def get_auth_hash(request: HttpRequest) -> str:
+    auth_hash_parts = '{}:{}'.format(
+        request.headers.get('Authorization', ''),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+    )
+    return sha1(auth_hash_parts.encode()).hexdigest()
@@ -1,15 +1,14 @@
-import json
-from hashlib import sha1
-
-from django.conf import settings
-from django.db import transaction
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.urls import resolve
-from django.utils.timezone import now
 from django_scopes import scope
 from rest_framework import status
 
-from eventyay.api.models import ApiCall
+from eventyay.api.idempotency import (
+    LOCKED,
+    get_auth_hash,
+    get_idempotency_backend,
+    get_stored_response,
+)
 from eventyay.base.models import Organizer
 
 
@@ -27,75 +26,32 @@ class IdempotencyMiddleware:
         if not request.headers.get('X-Idempotency-Key'):
             return self.get_response(request)
 
-        auth_hash_parts = '{}:{}'.format(
-            request.headers.get('Authorization', ''),
-            request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
-        )
-        auth_hash = sha1(auth_hash_parts.encode()).hexdigest()
+        auth_hash = get_auth_hash(request)
         idempotency_key = request.headers.get('X-Idempotency-Key', '')
+        backend = get_idempotency_backend()
 
-        with transaction.atomic():
-            call, created = ApiCall.objects.select_for_update().get_or_create(
-                auth_hash=auth_hash,
-                idempotency_key=idempotency_key,
-                defaults={
-                    'locked': now(),
-                    'request_method': request.method,
-                    'request_path': request.path,
-                    'response_code': 0,
-                    'response_headers': '{}',
-                    'response_body': b'',
-                },
-            )
-
-        if created:
+        stored = backend.acquire(request, auth_hash, idempotency_key)
+        if stored is None:
             resp = self.get_response(request)
-            with transaction.atomic():
-                if resp.status_code in (409, 429, 503):
-                    # This is the exception: These calls are *meant* to be retried!
-                    call.delete()
-                else:
-                    call.response_code = resp.status_code
-                    if isinstance(resp.content, str):
-                        call.response_body = resp.content.encode()
-                    elif isinstance(resp.content, memoryview):
-                        call.response_body = resp.content.tobytes()
-                    elif isinstance(resp.content, bytes):
-                        call.response_body = resp.content
-                    elif hasattr(resp.content, 'read'):
-                        call.response_body = resp.read()
-                    elif hasattr(resp, 'data'):
-                        call.response_body = json.dumps(resp.data)
-                    else:
-                        call.response_body = repr(resp).encode()
-                    call.response_headers = json.dumps(resp.headers._store)
-                    call.locked = None
-                    call.save(
-                        update_fields=[
-                            'locked',
-                            'response_code',
-                            'response_headers',
-                            'response_body',
-                        ]
-                    )
+            if resp.status_code in (409, 429, 503):
+                # This is the exception: These calls are *meant* to be retried!
+                backend.release(auth_hash, idempotency_key)
+            else:
+                backend.store(auth_hash, idempotency_key, get_stored_response(resp))
             return resp
+        elif stored is LOCKED:
+            r = JsonResponse(
+                {'detail': 'Concurrent request with idempotency key.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+            r['Retry-After'] = 5
+            return r
         else:
-            if call.locked:
-                r = JsonResponse(
-                    {'detail': 'Concurrent request with idempotency key.'},
-                    status=status.HTTP_409_CONFLICT,
-                )
-                r['Retry-After'] = 5
-                return r
-
-            content = call.response_body
-            if isinstance(content, memoryview):
-                content = content.tobytes()
             r = HttpResponse(
-                content=content,
-                status=call.response_code,
+                content=stored.body,
+                status=stored.status_code,
             )
-            for k, v in json.loads(call.response_headers).values():
+            for k, v in stored.headers.values():
                 r[k] = v
             return r
 
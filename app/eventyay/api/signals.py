@@ -1,10 +1,12 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.dispatch import Signal, receiver
 from django.utils.timezone import now
 from django_scopes import scopes_disabled
 
 from eventyay.api.models import ApiCall, WebHookCall
+from eventyay.base.services.cleanup import delete_in_batches
 from eventyay.base.signals import periodic_task
 from eventyay.helpers.periodic import minimum_interval
 
@@ -27,4 +29,8 @@ def cleanup_webhook_logs(sender, **kwargs):
 @scopes_disabled()
 @minimum_interval(minutes_after_success=12 * 60)
 def cleanup_api_logs(sender, **kwargs):
-    ApiCall.objects.filter(created__lte=now() - timedelta(hours=24)).delete()
+    # Only calls of the database idempotency backend, the redis backend lets its calls expire
+    delete_in_batches(
+        ApiCall.objects.filter(created__lte=now() - timedelta(seconds=settings.API_IDEMPOTENCY_TTL)),
+        'cleanup_api_logs',
+    )
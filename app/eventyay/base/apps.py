@@ -6,12 +6,19 @@ class EventyayBaseConfig(AppConfig):
     label = 'base'
 
     def ready(self):
+        from . import cache  # NOQA
         from . import exporter  # NOQA
         from . import payment  # NOQA
         from . import exporters  # NOQA
         from . import invoice  # NOQA
         from . import notifications  # NOQA
         from . import email  # NOQA
+        from .services import cartexpiry  # NOQA
+        from .services import eventstats  # NOQA
+        from .services import favourites  # NOQA
+        from .services import ordersearch  # NOQA
+        from .services import periodic  # NOQA
+        from .services import tickets  # NOQA
         from django.conf import settings
 
         try:
@@ -1,27 +1,78 @@
 import hashlib
+import threading
 import time
-from typing import Callable, Dict, List
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
 
+from django.conf import settings
 from django.core.cache import caches
+from django.core.signals import request_started
 from django.db.models import Model
+from django.dispatch import receiver
+
+_MISSING = object()
+# Namespace prefixes seen by the current thread, by prefix key, as (prefix, expiry time)
+_local_prefixes = threading.local()
+
+
+def _count_local(namespace: str, kind: str, result: str):
+    from eventyay.base.metrics import eventyay_cache_local_requests_total
+
+    eventyay_cache_local_requests_total.inc(1, namespace=namespace, kind=kind, result=result)
+
+
+@receiver(request_started, dispatch_uid='cache_reset_local_prefixes')
+def reset_local_prefixes(**kwargs):
+    """
+    Forgets all namespace prefixes seen by the current thread, so that every request reads them from the shared
+    cache once and notices caches that have been cleared in the meantime.
+    """
+    _local_prefixes.values = {}
 
 
 class NamespacedCache:
-    def __init__(self, prefixkey: str, cache: str = 'default'):
+    """
+    A cache whose keys are all prefixed with a namespace prefix that changes every time the cache is cleared.
+
+    The prefix is kept in the memory of the current thread for the rest of the request or at most
+    ``settings.CACHE_LOCAL_TTL`` seconds, so that it costs a round trip to the shared cache only once per request.
+    Values computed through ``get_or_set`` are kept in a process-local cache for the same time. As their keys
+    contain the prefix, clearing the cache invalidates them as well, in all processes once they notice the new prefix.
+    Setting or deleting single keys only drops the process-local copy in the current process; other processes keep
+    serving their copy for up to ``settings.CACHE_LOCAL_TTL`` seconds, so values that need to be invalidated
+    everywhere immediately must be invalidated through ``clear()``.
+    """
+
+    def __init__(self, prefixkey: str, cache: str = 'default', namespace: str = None):
         self.cache = caches[cache]
         self.prefixkey = prefixkey
+        self.namespace = namespace or prefixkey
         self._last_prefix = None
 
+    def _current_prefix(self) -> int:
+        prefixes = getattr(_local_prefixes, 'values', None)
+        if prefixes is None:
+            prefixes = _local_prefixes.values = {}
+        entry = prefixes.get(self.prefixkey)
+        if entry and entry[1] > time.monotonic():
+            _count_local(self.namespace, 'prefix', 'hit')
+            return entry[0]
+
+        _count_local(self.namespace, 'prefix', 'miss')
+        prefix = self.cache.get(self.prefixkey)
+        if prefix is None:
+            prefix = int(time.time())
+            self.cache.set(self.prefixkey, prefix)
+        prefixes[self.prefixkey] = (prefix, time.monotonic() + settings.CACHE_LOCAL_TTL)
+        return prefix
+
     def _prefix_key(self, original_key: str, known_prefix=None) -> str:
         # Race conditions can happen here, but should be very very rare.
         # We could only handle this by going _really_ lowlevel using
         # memcached's `add` keyword instead of `set`.
         # See also:
         # https://code.google.com/p/memcached/wiki/NewProgrammingTricks#Namespacing
-        prefix = known_prefix or self.cache.get(self.prefixkey)
-        if prefix is None:
-            prefix = int(time.time())
-            self.cache.set(self.prefixkey, prefix)
+        prefix = known_prefix or self._current_prefix()
         self._last_prefix = prefix
         key = '%s:%d:%s' % (self.prefixkey, prefix, original_key)
         if len(key) > 200:  # Hash long keys, as memcached has a length limit
@@ -39,19 +90,31 @@ class NamespacedCache:
         except ValueError:
             prefix = int(time.time())
             self.cache.set(self.prefixkey, prefix)
+        if getattr(_local_prefixes, 'values', None) is not None:
+            _local_prefixes.values.pop(self.prefixkey, None)
 
     def set(self, key: str, value: str, timeout: int = 300):
-        return self.cache.set(self._prefix_key(key), value, timeout)
+        key = self._prefix_key(key)
+        _local_values.delete(key)
+        return self.cache.set(key, value, timeout)
 
     def get(self, key: str) -> str:
         return self.cache.get(self._prefix_key(key, known_prefix=self._last_prefix))
 
+    def add(self, key: str, value: str, timeout: int = 300) -> bool:
+        return self.cache.add(self._prefix_key(key), value, timeout)
+
     def get_or_set(self, key: str, default: Callable, timeout=300) -> str:
-        return self.cache.get_or_set(
-            self._prefix_key(key, known_prefix=self._last_prefix),
-            default=default,
-            timeout=timeout,
-        )
+        key = self._prefix_key(key, known_prefix=self._last_prefix)
+        value = _local_values.get(key, _MISSING)
+        if value is not _MISSING:
+            _count_local(self.namespace, 'value', 'hit')
+            return value
+
+        _count_local(self.namespace, 'value', 'miss')
+        value = self.cache.get_or_set(key, default=default, timeout=timeout)
+        _local_values.set(key, value)
+        return value
 
     def get_many(self, keys: List[str]) -> Dict[str, str]:
         values = self.cache.get_many([self._prefix_key(key) for key in keys])
@@ -64,19 +127,30 @@ class NamespacedCache:
         newvalues = {}
         for k, v in values.items():
             newvalues[self._prefix_key(k)] = v
+        for k in newvalues:
+            _local_values.delete(k)
         return self.cache.set_many(newvalues, timeout)
 
     def delete(self, key: str):  # NOQA
-        return self.cache.delete(self._prefix_key(key))
+        key = self._prefix_key(key)
+        _local_values.delete(key)
+        return self.cache.delete(key)
 
     def delete_many(self, keys: List[str]):  # NOQA
-        return self.cache.delete_many([self._prefix_key(key) for key in keys])
+        keys = [self._prefix_key(key) for key in keys]
+        for key in keys:
+            _local_values.delete(key)
+        return self.cache.delete_many(keys)
 
     def incr(self, key: str, by: int = 1):  # NOQA
-        return self.cache.incr(self._prefix_key(key), by)
+        key = self._prefix_key(key)
+        _local_values.delete(key)
+        return self.cache.incr(key, by)
 
     def decr(self, key: str, by: int = 1):  # NOQA
-        return self.cache.decr(self._prefix_key(key), by)
+        key = self._prefix_key(key)
+        _local_values.delete(key)
+        return self.cache.decr(key, by)
 
     def close(self):  # NOQA
         pass
@@ -98,4 +172,66 @@ class ObjectRelatedCache(NamespacedCache):
 
     def __init__(self, obj: Model, cache: str = 'default'):
         assert isinstance(obj, Model)
-        super().__init__('%s:%s' % (obj._meta.object_name, obj.pk), cache)
+        super().__init__('%s:%s' % (obj._meta.object_name, obj.pk), cache, namespace=obj._meta.object_name)
+
+
+class LocalLRUCache:
+    """
+    A small, thread-safe least-recently-used cache living in the memory of the
+    current process. Entries expire ``ttl`` seconds after they have been set.
+    The cache is bounded by the number of entries and, if ``maxbytes`` is
+    given, by the total size of all values as computed by ``sizeof``.
+
+    As every worker process has its own copy, this is only suitable for data
+    that is either immutable or where short-lived staleness is acceptable.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 60, maxbytes: int = None, sizeof: Callable = len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None) -> Any:
+        with self._lock:
+            try:
+                expires, size, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        size = self.sizeof(value) if self.maxbytes else 0
+        if self.maxbytes and size > self.maxbytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self._bytes > self.maxbytes):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+# Values computed through ``NamespacedCache.get_or_set``, by their prefixed key
+_local_values = LocalLRUCache(maxsize=settings.CACHE_LOCAL_MAXSIZE, ttl=settings.CACHE_LOCAL_TTL)
@@ -427,6 +427,10 @@ DEFAULT_SETTINGS = {
         'default': 'classic',
         'type': str,
     },
+    'ticket_cache_version': {
+        'default': '0',
+        'type': int,
+    },
     'ticket_secret_generator': {
         'default': 'random',
         'type': str,
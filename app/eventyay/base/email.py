@@ -51,6 +51,17 @@ class SendGridEmail:
 
     def __init__(self, api_key):
         self.api_key = api_key
+        self.client = None
+
+    def open(self):
+        # Mirrors the Django backend API, so a single API client can be reused for a whole batch of messages
+        if self.client is None:
+            self.client = SendGridAPIClient(self.api_key)
+            return True
+        return False
+
+    def close(self):
+        self.client = None
 
     def test(self, from_addr):
         message = Mail(
@@ -98,7 +109,7 @@ class SendGridEmail:
                 subject=email.subject,
                 html_content=html_content,
             )
-            sg = SendGridAPIClient(self.api_key)
+            sg = self.client or SendGridAPIClient(self.api_key)
             bcc = []
             for mail in email.bcc:
                 bcc.append(Bcc(mail))
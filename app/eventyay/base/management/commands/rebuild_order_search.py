@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django_scopes import scopes_disabled
+
+from eventyay.base.services.ordersearch import outdated_orders, update_outdated_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Build the search documents of all orders that have no up-to-date one, e.g. after upgrading'
+
+    @scopes_disabled()
+    def handle(self, *args, **options):
+        total = outdated_orders().count()
+        done = 0
+        while updated := update_outdated_search_documents(max_batches=1):
+            done += updated
+            self.stdout.write(f'{done}/{total}')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {done} search documents.'))
@@ -1,5 +1,6 @@
 import json
 import math
+import threading
 import time
 from collections import defaultdict
 
@@ -119,6 +120,42 @@ class Counter(Metric):
         self._inc_in_redis(fullmetric, amount)
 
 
+class BufferedCounter(Counter):
+    """
+    Counter Metric Object for values that are increased too often to write every increment to Redis, e.g. in hot
+    loops. Increments are summed up in the memory of the current process and written at most every
+    ``flush_interval`` seconds, so increments of the last seconds before a process exits can get lost.
+    """
+
+    def __init__(self, name, helpstring, labelnames=None, flush_interval=10):
+        super().__init__(name, helpstring, labelnames)
+        self.flush_interval = flush_interval
+        self._buffer = defaultdict(float)
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **kwargs):
+        """
+        Increments Counter by given amount for the labels specified in kwargs.
+        """
+        if amount < 0:
+            raise ValueError('Counter cannot be increased by negative values.')
+
+        self._check_label_consistency(kwargs)
+
+        fullmetric = self._construct_metric_identifier(self.name, kwargs)
+        with self._lock:
+            self._buffer[fullmetric] += amount
+            if time.monotonic() - self._flushed < self.flush_interval:
+                return
+            buffer, self._buffer, self._flushed = self._buffer, defaultdict(float), time.monotonic()
+
+        pipeline = self._get_redis_pipeline()
+        for key, value in buffer.items():
+            self._inc_in_redis(key, value, pipeline)
+        self._execute_redis_pipeline(pipeline)
+
+
 class Gauge(Metric):
     """
     Gauge Metric Object
@@ -301,3 +338,21 @@ eventyay_task_runs_total = Counter('eventyay_task_runs_total', 'Total calls to a
 eventyay_task_duration_seconds = Histogram(
     'eventyay_task_duration_seconds', 'Call time of a celery task', ['task_name']
 )
+eventyay_periodic_objects_total = Counter(
+    'eventyay_periodic_objects_total', 'Objects deleted or expired by periodic tasks', ['task', 'model']
+)
+eventyay_signal_receiver_calls_total = BufferedCounter(
+    'eventyay_signal_receiver_calls_total',
+    'Total calls to a receiver of an event plugin signal',
+    ['signal', 'receiver'],
+)
+eventyay_signal_receiver_seconds_total = BufferedCounter(
+    'eventyay_signal_receiver_seconds_total',
+    'Total time spent in a receiver of an event plugin signal',
+    ['signal', 'receiver'],
+)
+eventyay_cache_local_requests_total = BufferedCounter(
+    'eventyay_cache_local_requests_total',
+    'Lookups in the process-local cache in front of the namespaced caches',
+    ['namespace', 'kind', 'result'],
+)
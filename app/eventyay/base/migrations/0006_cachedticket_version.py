@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0005_alter_logentry_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cachedcombinedticket",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cachedticket",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
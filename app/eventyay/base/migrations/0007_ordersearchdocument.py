@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # The trigram index is only available on PostgreSQL, other databases search the column without an index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS base_ordersearchdocument_text_trgm '
+        'ON base_ordersearchdocument USING gin (text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS base_ordersearchdocument_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0006_cachedticket_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderSearchDocument",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="base.order",
+                    ),
+                ),
+                ("text", models.TextField()),
+                ("order_modified", models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
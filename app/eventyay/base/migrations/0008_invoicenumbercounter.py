@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0007_ordersearchdocument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceNumberCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("prefix", models.CharField(max_length=160)),
+                ("value", models.PositiveBigIntegerField(default=0)),
+                (
+                    "organizer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoice_number_counters",
+                        to="base.organizer",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("organizer", "prefix")},
+            },
+        ),
+    ]
@@ -37,7 +37,7 @@ from .exhibitor import (
 )
 from .feedback import Feedback
 from .giftcards import GiftCard, GiftCardAcceptance, GiftCardTransaction
-from .invoices import Invoice, InvoiceLine, invoice_filename
+from .invoices import Invoice, InvoiceLine, InvoiceNumberCounter, invoice_filename
 from .product import (
     Product,
     ProductAddOn,
@@ -69,6 +69,7 @@ from .orders import (
     OrderPayment,
     OrderPosition,
     OrderRefund,
+    OrderSearchDocument,
     QuestionAnswer,
     RevokedTicketSecret,
     cachedcombinedticket_name,
@@ -160,6 +161,7 @@ __all__ = [
     "Invoice",
     "InvoiceAddress",
     "InvoiceLine",
+    "InvoiceNumberCounter",
     "InvoiceVoucher",
     "Item",
     "ItemAddOn",
@@ -181,6 +183,7 @@ __all__ = [
     "OrderPayment",
     "OrderPosition",
     "OrderRefund",
+    "OrderSearchDocument",
     "OrderedModel",
     "Organizer",
     "Organizer_SettingsStore",
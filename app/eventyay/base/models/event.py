@@ -54,7 +54,7 @@ from eventyay.common.urls import EventUrls
 from eventyay.core.permissions import Permission, SYSTEM_ROLES
 from eventyay.core.utils.json import CustomJSONEncoder
 from eventyay.consts import TIMEZONE_CHOICES
-from eventyay.helpers.database import GroupConcat
+from eventyay.helpers.database import GroupConcat, bulk_save
 from eventyay.helpers.daterange import daterange
 from eventyay.helpers.json import safe_string
 from eventyay.helpers.thumb import get_thumbnail
@@ -382,7 +382,26 @@ class EventMixin:
         return safe_string(json.dumps(eventdict))
 
     @classmethod
-    def annotated(cls, qs, channel='web'):
+    def annotated(cls, qs, channel='web', active_quotas=True):
+        """
+        Annotates the events of ``qs`` with ``has_paid_product`` and, unless ``active_quotas`` is ``False``, fetches
+        the quotas needed for ``best_availability_state``.
+        """
+        from eventyay.base.models import Product
+
+        qs = qs.annotate(
+            has_paid_product=Exists(Product.objects.filter(event_id=OuterRef(cls._event_id), default_price__gt=0))
+        )
+        if active_quotas:
+            qs = qs.prefetch_related(cls.active_quotas_prefetch(channel))
+        return qs
+
+    @staticmethod
+    def active_quotas_prefetch(channel='web'):
+        """
+        Returns a ``Prefetch`` that stores the quotas of events with products that are available in ``channel`` as
+        ``active_quotas``, which can also be used with ``prefetch_related_objects`` on already fetched events.
+        """
         from eventyay.base.models import Product, ProductVariation, Quota
 
         sq_active_product = (
@@ -411,20 +430,16 @@ class EventMixin:
             .annotate(products=GroupConcat('pk', delimiter=','))
             .values('products')
         )
-        return qs.annotate(
-            has_paid_product=Exists(Product.objects.filter(event_id=OuterRef(cls._event_id), default_price__gt=0))
-        ).prefetch_related(
-            Prefetch(
-                'quotas',
-                to_attr='active_quotas',
-                queryset=Quota.objects.using(settings.DATABASE_REPLICA)
-                .annotate(
-                    active_products=Subquery(sq_active_product, output_field=models.TextField()),
-                    active_variations=Subquery(sq_active_variation, output_field=models.TextField()),
-                )
-                .exclude(Q(active_products='') & Q(active_variations=''))
-                .select_related('event', 'subevent'),
+        return Prefetch(
+            'quotas',
+            to_attr='active_quotas',
+            queryset=Quota.objects.using(settings.DATABASE_REPLICA)
+            .annotate(
+                active_products=Subquery(sq_active_product, output_field=models.TextField()),
+                active_variations=Subquery(sq_active_variation, output_field=models.TextField()),
             )
+            .exclude(Q(active_products='') & Q(active_variations=''))
+            .select_related('event', 'subevent'),
         )
 
     @cached_property
@@ -551,6 +566,41 @@ def default_mail_settings():
     }
 
 
+def _copy_objects(qs, fixup=None, log_entries=None, **attrs):
+    """
+    Copies all objects of ``qs`` with bulk inserts. ``attrs`` are set on every copy and ``fixup`` is called with every
+    copy before it is saved. Returns the copies by the IDs of their originals.
+    """
+    copies = {}
+    for obj in qs:
+        old_pk = obj.pk
+        obj.pk = None
+        for k, v in attrs.items():
+            setattr(obj, k, v)
+        if fixup:
+            fixup(obj)
+        copies[old_pk] = obj
+    bulk_save(qs.model, list(copies.values()))
+    if log_entries is not None:
+        log_entries += [obj.log_action('eventyay.object.cloned', save=False) for obj in copies.values()]
+    return copies
+
+
+def _copy_relations(field, source_map, target_map):
+    """
+    Copies the rows of the many-to-many ``field`` between the originals of ``source_map`` and ``target_map`` to
+    their copies.
+    """
+    through = field.remote_field.through
+    source = field.m2m_column_name()
+    target = field.m2m_reverse_name()
+    rows = through.objects.filter(**{source + '__in': source_map.keys()}).values_list(source, target)
+    through.objects.bulk_create(
+        [through(**{source: source_map[s].pk, target: target_map[t].pk}) for s, t in rows if t in target_map],
+        batch_size=500,
+    )
+
+
 # We don't subclass PretalxModel because:
 # - We want to avoid the `objects = ScopedManager()` (we may use it later, after the making "enext" stable enough).
 # - We don't want to inherit the LogMixin (already have LoggedModel).
@@ -1100,15 +1150,25 @@ class Event(
             tz,
         )
 
-    def copy_data_from(self, other):
+    def copy_data_from(self, other, skip_attributes=None):
+        """
+        Copies products, quotas, questions, check-in lists, seating and settings from another event. Every table is
+        copied with a few bulk inserts, references between the copies are resolved through maps from the IDs of the
+        originals to their copies, which are passed on to plugins through ``event_copy_data``. Settings listed in
+        ``skip_attributes`` are not copied.
+        """
         from ..signals import event_copy_data
         from . import (
+            CheckinList,
+            LogEntry,
             Product,
             ProductAddOn,
             ProductBundle,
             ProductCategory,
             ProductMetaValue,
+            ProductVariation,
             Question,
+            QuestionOption,
             Quota,
         )
 
@@ -1119,112 +1179,70 @@ class Event(
         self.testmode = other.testmode
         self.save()
         self.log_action('eventyay.object.cloned', data={'source': other.slug, 'source_id': other.pk})
+        log_entries = []
 
-        tax_map = {}
-        for t in other.tax_rules.all():
-            tax_map[t.pk] = t
-            t.pk = None
-            t.event = self
-            t.save()
-            t.log_action('eventyay.object.cloned')
-
-        category_map = {}
-        for c in ProductCategory.objects.filter(event=other):
-            category_map[c.pk] = c
-            c.pk = None
-            c.event = self
-            c.save()
-            c.log_action('eventyay.object.cloned')
-
-        product_meta_properties_map = {}
-        for imp in other.product_meta_properties.all():
-            product_meta_properties_map[imp.pk] = imp
-            imp.pk = None
-            imp.event = self
-            imp.save()
-            imp.log_action('eventyay.object.cloned')
-
-        product_map = {}
-        variation_map = {}
-        for i in Product.objects.filter(event=other).prefetch_related('variations'):
-            vars = list(i.variations.all())
-            product_map[i.pk] = i
-            i.pk = None
-            i.event = self
+        tax_map = _copy_objects(other.tax_rules.all(), log_entries=log_entries, event=self)
+        category_map = _copy_objects(ProductCategory.objects.filter(event=other), log_entries=log_entries, event=self)
+        product_meta_properties_map = _copy_objects(
+            other.product_meta_properties.all(), log_entries=log_entries, event=self
+        )
+
+        def fix_product(i):
             if i.picture:
-                i.picture.save(i.picture.name, i.picture)
+                i.picture.save(i.picture.name, i.picture, save=False)
             if i.category_id:
                 i.category = category_map[i.category_id]
             if i.tax_rule_id:
                 i.tax_rule = tax_map[i.tax_rule_id]
-            i.save()
-            i.log_action('eventyay.object.cloned')
-            for v in vars:
-                variation_map[v.pk] = v
-                v.pk = None
-                v.product = i
-                v.save()
-
-        for imv in ProductMetaValue.objects.filter(product__event=other).prefetch_related('product', 'property'):
-            imv.pk = None
-            imv.property = product_meta_properties_map[imv.property.pk]
-            imv.product = product_map[imv.product.pk]
-            imv.save()
-
-        for ia in ProductAddOn.objects.filter(base_product__event=other).prefetch_related(
-            'base_product', 'addon_category'
-        ):
-            ia.pk = None
-            ia.base_product = product_map[ia.base_product.pk]
-            ia.addon_category = category_map[ia.addon_category.pk]
-            ia.save()
 
-        for ia in ProductBundle.objects.filter(base_product__event=other).prefetch_related(
-            'base_product', 'bundled_product', 'bundled_variation'
-        ):
-            ia.pk = None
-            ia.base_product = product_map[ia.base_product.pk]
-            ia.bundled_product = product_map[ia.bundled_product.pk]
-            if ia.bundled_variation:
-                ia.bundled_variation = variation_map[ia.bundled_variation.pk]
-            ia.save()
-
-        for q in Quota.objects.filter(event=other, subevent__isnull=True).prefetch_related('products', 'variations'):
-            products = list(q.products.all())
-            vars = list(q.variations.all())
-            oldid = q.pk
-            q.pk = None
-            q.event = self
-            q.closed = False
-            q.save()
-            q.log_action('eventyay.object.cloned')
-            for i in products:
-                if i.pk in product_map:
-                    q.products.add(product_map[i.pk])
-            for v in vars:
-                q.variations.add(variation_map[v.pk])
-            self.products.filter(hidden_if_available_id=oldid).update(hidden_if_available=q)
-
-        question_map = {}
-        for q in Question.objects.filter(event=other).prefetch_related('products', 'options'):
-            products = list(q.products.all())
-            opts = list(q.options.all())
-            question_map[q.pk] = q
-            q.pk = None
-            q.event = self
-            q.save()
-            q.log_action('eventyay.object.cloned')
-
-            for i in products:
-                q.products.add(product_map[i.pk])
-            for o in opts:
-                o.pk = None
-                o.question = q
-                o.save()
-
-        for q in self.questions.filter(dependency_question__isnull=False):
+        product_map = _copy_objects(
+            Product.objects.filter(event=other), fixup=fix_product, log_entries=log_entries, event=self
+        )
+        variation_map = _copy_objects(
+            ProductVariation.objects.filter(product__event=other),
+            fixup=lambda v: setattr(v, 'product', product_map[v.product_id]),
+        )
+
+        def fix_meta_value(imv):
+            imv.property = product_meta_properties_map[imv.property_id]
+            imv.product = product_map[imv.product_id]
+
+        _copy_objects(ProductMetaValue.objects.filter(product__event=other), fixup=fix_meta_value)
+
+        def fix_addon(ia):
+            ia.base_product = product_map[ia.base_product_id]
+            ia.addon_category = category_map[ia.addon_category_id]
+
+        _copy_objects(ProductAddOn.objects.filter(base_product__event=other), fixup=fix_addon)
+
+        def fix_bundle(ia):
+            ia.base_product = product_map[ia.base_product_id]
+            ia.bundled_product = product_map[ia.bundled_product_id]
+            if ia.bundled_variation_id:
+                ia.bundled_variation = variation_map[ia.bundled_variation_id]
+
+        _copy_objects(ProductBundle.objects.filter(base_product__event=other), fixup=fix_bundle)
+
+        quota_map = _copy_objects(
+            Quota.objects.filter(event=other, subevent__isnull=True), log_entries=log_entries, event=self, closed=False
+        )
+        _copy_relations(Quota.products.field, quota_map, product_map)
+        _copy_relations(Quota.variations.field, quota_map, variation_map)
+        hidden_products = [i for i in product_map.values() if i.hidden_if_available_id in quota_map]
+        for i in hidden_products:
+            i.hidden_if_available = quota_map[i.hidden_if_available_id]
+        Product.objects.bulk_update(hidden_products, ['hidden_if_available'], batch_size=500)
+
+        question_map = _copy_objects(Question.objects.filter(event=other), log_entries=log_entries, event=self)
+        _copy_relations(Question.products.field, question_map, product_map)
+        _copy_objects(
+            QuestionOption.objects.filter(question__event=other),
+            fixup=lambda o: setattr(o, 'question', question_map[o.question_id]),
+        )
+        dependent_questions = [q for q in question_map.values() if q.dependency_question_id]
+        for q in dependent_questions:
             q.dependency_question = question_map[q.dependency_question_id]
-            q.save(update_fields=['dependency_question'])
+        Question.objects.bulk_update(dependent_questions, ['dependency_question'], batch_size=500)
 
         def _walk_rules(rules):
             if isinstance(rules, dict):
@@ -1240,19 +1258,13 @@ class Event(
                 for i in rules:
                     _walk_rules(i)
 
-        checkin_list_map = {}
-        for cl in other.checkin_lists.filter(subevent__isnull=True).prefetch_related('limit_products'):
-            products = list(cl.limit_products.all())
-            checkin_list_map[cl.pk] = cl
-            cl.pk = None
-            cl.event = self
-            rules = cl.rules
-            _walk_rules(rules)
-            cl.rules = rules
-            cl.save()
-            cl.log_action('eventyay.object.cloned')
-            for i in products:
-                cl.limit_products.add(product_map[i.pk])
+        checkin_list_map = _copy_objects(
+            other.checkin_lists.filter(subevent__isnull=True),
+            fixup=lambda cl: _walk_rules(cl.rules),
+            log_entries=log_entries,
+            event=self,
+        )
+        _copy_relations(CheckinList.limit_products.field, checkin_list_map, product_map)
 
         if other.seating_plan:
             if other.seating_plan.organizer_id == self.organizer_id:
@@ -1261,23 +1273,22 @@ class Event(
                 self.organizer.seating_plans.create(name=other.seating_plan.name, layout=other.seating_plan.layout)
             self.save()
 
-        for m in other.seat_category_mappings.filter(subevent__isnull=True):
-            m.pk = None
-            m.event = self
-            m.product = product_map[m.product_id]
-            m.save()
-
-        for s in other.seats.filter(subevent__isnull=True):
-            s.pk = None
-            s.event = self
+        def fix_seat(s):
             if s.product_id:
                 s.product = product_map[s.product_id]
-            s.save()
+
+        _copy_objects(other.seat_category_mappings.filter(subevent__isnull=True), fixup=fix_seat, event=self)
+        _copy_objects(other.seats.filter(subevent__isnull=True), fixup=fix_seat, event=self)
+
+        bulk_save(LogEntry, log_entries)
+        LogEntry.bulk_postprocess(log_entries)
 
         skip_settings = (
             'ticket_secrets_eventyay_sig1_pubkey',
             'ticket_secrets_eventyay_sig1_privkey',
+            *(skip_attributes or ()),
         )
+        settings_objects = []
         for s in other.settings._objects.all():
             if s.key in skip_settings:
                 continue
@@ -1297,17 +1308,19 @@ class Event(
                 )
                 newname = default_storage.save(fname, fi)
                 s.value = 'file://' + newname
-                s.save()
+                settings_objects.append(s)
             elif s.key == 'tax_rate_default':
                 try:
                     if int(s.value) in tax_map:
                         s.value = tax_map.get(int(s.value)).pk
-                        s.save()
+                        settings_objects.append(s)
                 except ValueError:
                     pass
             else:
-                s.save()
+                settings_objects.append(s)
+        other.settings._objects.model.objects.bulk_create(settings_objects, batch_size=500)
 
+        self.cache.clear()
         self.settings.flush()
         event_copy_data.send(
             sender=self,
@@ -1776,8 +1789,8 @@ class Event(
         irs = self.get_invoice_renderers()
         return irs[self.settings.invoice_renderer]
 
-    def subevents_annotated(self, channel):
-        return SubEvent.annotated(self.subevents, channel)
+    def subevents_annotated(self, channel, active_quotas=True):
+        return SubEvent.annotated(self.subevents, channel, active_quotas=active_quotas)
 
     def subevents_sorted(self, queryset):
         ordering = self.settings.get('frontpage_subevent_ordering', default='date_ascending', as_type=str)
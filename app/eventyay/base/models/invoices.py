@@ -183,8 +183,8 @@ class Invoice(models.Model):
         ]
         return '\n'.join([p.strip() for p in parts if p and p.strip()])
 
-    def _get_numeric_invoice_number(self, c_length):
-        numeric_invoices = (
+    def _get_max_numeric_invoice_number(self):
+        return (
             Invoice.objects.filter(
                 event__organizer=self.event.organizer,
                 prefix=self.prefix,
@@ -194,7 +194,31 @@ class Invoice(models.Model):
             .aggregate(max=Max('numeric_number'))['max']
             or 0
         )
-        return self._to_numeric_invoice_number(numeric_invoices + 1, c_length)
+
+    def _get_numeric_invoice_number(self, c_length, resync=False):
+        """
+        Allocates the next number from the counter of the organizer and prefix. The counter row stays locked until
+        the surrounding transaction ends, so the invoice has to be saved in the same transaction to keep the numbers
+        free of gaps. With ``resync``, the counter is moved past all existing invoices first, e.g. after a duplicate
+        key error caused by invoices that have been numbered otherwise.
+        """
+        counter = (
+            InvoiceNumberCounter.objects.select_for_update()
+            .filter(organizer=self.event.organizer, prefix=self.prefix)
+            .first()
+        )
+        if counter is None:
+            # The first invoice with this prefix since the counters have been introduced
+            counter = InvoiceNumberCounter.objects.create(
+                organizer=self.event.organizer,
+                prefix=self.prefix,
+                value=self._get_max_numeric_invoice_number(),
+            )
+        elif resync:
+            counter.value = max(counter.value, self._get_max_numeric_invoice_number())
+        counter.value += 1
+        counter.save(update_fields=['value'])
+        return self._to_numeric_invoice_number(counter.value, c_length)
 
     def _get_invoice_number_from_order(self):
         return '{order}-{count}'.format(
@@ -220,14 +244,15 @@ class Invoice(models.Model):
             if self.order.testmode:
                 self.prefix += 'TEST-'
             for i in range(10):
-                if self.event.settings.get('invoice_numbers_consecutive'):
-                    self.invoice_no = self._get_numeric_invoice_number(
-                        self.event.settings.invoice_numbers_counter_length
-                    )
-                else:
-                    self.invoice_no = self._get_invoice_number_from_order()
                 try:
                     with transaction.atomic():
+                        if self.event.settings.get('invoice_numbers_consecutive'):
+                            self.invoice_no = self._get_numeric_invoice_number(
+                                self.event.settings.invoice_numbers_counter_length,
+                                resync=i > 0,
+                            )
+                        else:
+                            self.invoice_no = self._get_invoice_number_from_order()
                         return super().save(*args, **kwargs)
                 except DatabaseError:
                     # Suppress duplicate key errors and try again
@@ -320,3 +345,25 @@ class InvoiceLine(models.Model):
 
     def __str__(self):
         return 'Line {} of invoice {}'.format(self.position, self.invoice)
+
+
+class InvoiceNumberCounter(models.Model):
+    """
+    Holds the last consecutive invoice number that has been issued by an organizer with a given prefix. The row is
+    locked while a number is allocated, which serializes the numbering of invoices with the same prefix without
+    scanning all existing invoices.
+
+    :param organizer: The organizer the invoices belong to
+    :type organizer: Organizer
+    :param prefix: The invoice number prefix
+    :type prefix: str
+    :param value: The last number that has been issued
+    :type value: int
+    """
+
+    organizer = models.ForeignKey('Organizer', related_name='invoice_number_counters', on_delete=models.CASCADE)
+    prefix = models.CharField(max_length=160)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('organizer', 'prefix')
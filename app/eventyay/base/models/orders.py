@@ -716,17 +716,17 @@ class Order(LockModel, LoggedModel):
         tr = str.maketrans(d)
         return code.upper().translate(tr)
 
-    def assign_code(self):
+    def generate_code(self, length=None):
+        """
+        Returns a random order code that is not banned, without checking if it is already in use.
+        """
         # This omits some character pairs completely because they are hard to read even on screens (1/I and O/0)
         # and includes only one of two characters for some pairs because they are sometimes hard to distinguish in
         # handwriting (2/Z, 4/A, 5/S, 6/G, 8/B). This allows for better detection e.g. in incoming wire transfers that
         # might include OCR'd handwritten text
         charset = list('ABCDEFGHJKLMNPQRSTUVWXYZ379')
-        iteration = 0
-        length = settings.ENTROPY['order_code']
         while True:
-            code = get_random_string(length=length, allowed_chars=charset)
-            iteration += 1
+            code = get_random_string(length=length or settings.ENTROPY['order_code'], allowed_chars=charset)
 
             if banned(code):
                 continue
@@ -735,6 +735,14 @@ class Order(LockModel, LoggedModel):
                 # Subtle way to recognize test orders while debugging: They all contain a 0 at the second place,
                 # even though zeros are not used outside test mode.
                 code = code[0] + '0' + code[2:]
+            return code
+
+    def assign_code(self):
+        iteration = 0
+        length = settings.ENTROPY['order_code']
+        while True:
+            code = self.generate_code(length)
+            iteration += 1
 
             if not Order.objects.filter(event__organizer=self.event.organizer, code=code).exists():
                 self.code = code
@@ -2540,6 +2548,34 @@ class InvoiceAddress(models.Model):
         return scheme['concatenation'](self.name_parts).strip()
 
 
+class OrderSearchDocument(models.Model):
+    """
+    A denormalized, lowercased copy of all searchable texts of an order, its invoice address and its
+    positions, one value per line. The order search matches against this single column instead of joining
+    all related tables. On PostgreSQL, the column has a trigram index that speeds up substring lookups.
+
+    Documents are kept up to date by ``eventyay.base.services.ordersearch``.
+
+    :param order: The order this document belongs to
+    :type order: Order
+    :param text: The searchable text
+    :type text: str
+    :param order_modified: The ``last_modified`` value of the order the document has been built from
+    :type order_modified: datetime
+    """
+
+    order = models.OneToOneField(
+        Order,
+        primary_key=True,
+        related_name='search_document',
+        on_delete=models.CASCADE,
+    )
+    text = models.TextField()
+    order_modified = models.DateTimeField()
+
+    objects = ScopedManager(organizer='order__event__organizer')
+
+
 def cachedticket_name(instance, filename: str) -> str:
     secret = get_random_string(length=16, allowed_chars=string.ascii_letters + string.digits)
     return 'tickets/{org}/{ev}/{code}-{no}-{prov}-{secret}.dat'.format(
@@ -2570,6 +2606,8 @@ class CachedTicket(models.Model):
     extension = models.CharField(max_length=255)
     file = models.FileField(null=True, blank=True, upload_to=cachedticket_name, max_length=255)
     created = models.DateTimeField(auto_now_add=True)
+    # The ticket cache version of the event at the time of rendering, see ticket_cache_version
+    version = models.PositiveIntegerField(default=0)
 
 
 class CachedCombinedTicket(models.Model):
@@ -2579,6 +2617,8 @@ class CachedCombinedTicket(models.Model):
     extension = models.CharField(max_length=255)
     file = models.FileField(null=True, blank=True, upload_to=cachedcombinedticket_name, max_length=255)
     created = models.DateTimeField(auto_now_add=True)
+    # The ticket cache version of the event at the time of rendering, see ticket_cache_version
+    version = models.PositiveIntegerField(default=0)
 
 
 class CancellationRequest(models.Model):
@@ -4,7 +4,6 @@ from urllib.parse import quote
 
 from django.conf import settings
 from django.db import models, transaction
-from django.db.models import Count
 from django.db.utils import DatabaseError
 from django.utils.functional import cached_property
 from django.utils.timezone import now
@@ -14,7 +13,6 @@ from i18nfield.fields import I18nTextField
 
 from eventyay.agenda.tasks import export_schedule_html
 from eventyay.base.models import PretalxModel
-from eventyay.base.models.submission import SubmissionFavourite
 from eventyay.common.text.phrases import phrases
 from eventyay.common.urls import EventUrls
 from eventyay.schedule.notifications import render_notifications
@@ -25,7 +23,6 @@ from eventyay.talk_rules.person import is_reviewer
 from eventyay.talk_rules.submission import is_wip, orga_can_change_submissions
 
 from .mixins import PretalxModel
-from .submission import SubmissionFavourite
 
 
 class Schedule(PretalxModel):
@@ -316,19 +313,10 @@ class Schedule(PretalxModel):
         result['count'] = len(result['new_talks']) + len(result['canceled_talks']) + len(result['moved_talks'])
         return result
 
-    @cached_property
-    def use_room_availabilities(self):
-        from eventyay.base.models import Availability
-
-        return Availability.objects.filter(room__isnull=False, event=self.event).exists
-
     def get_talk_warnings(
         self,
         talk,
         with_speakers=True,
-        room_avails=None,
-        speaker_avails=None,
-        speaker_profiles=None,
     ) -> list:
         """A list of warnings that apply to this slot.
 
@@ -336,28 +324,24 @@ class Schedule(PretalxModel):
         ``speaker``, for now) and a ``message`` fit for public display.
         This property only shows availability based warnings.
         """
-        from eventyay.base.models import Availability, TalkSlot
+        from eventyay.base.models import TalkSlot
+        from eventyay.schedule.availability import get_availability_index
 
         if not talk.start or not talk.submission or not talk.room:
             return []
         warnings = []
-        availability = talk.as_availability
+        index = get_availability_index(self.event)
         url = talk.submission.orga_urls.base
-        if self.use_room_availabilities:
-            if room_avails is None:
-                room_avails = talk.room.availabilities.all()
-            if room_avails and not any(
-                room_availability.contains(availability) for room_availability in Availability.union(room_avails)
-            ):
-                warnings.append(
-                    {
-                        'type': 'room',
-                        'message': str(_('Room {room_name} is not available at the scheduled time.')).format(
-                            room_name=f'{phrases.base.quotation_open}{talk.room.name}{phrases.base.quotation_close}'
-                        ),
-                        'url': url,
-                    }
-                )
+        if not index.room_is_available(talk.room_id, talk.start, talk.real_end):
+            warnings.append(
+                {
+                    'type': 'room',
+                    'message': str(_('Room {room_name} is not available at the scheduled time.')).format(
+                        room_name=f'{phrases.base.quotation_open}{talk.room.name}{phrases.base.quotation_close}'
+                    ),
+                    'url': url,
+                }
+            )
         overlaps = (
             TalkSlot.objects.filter(schedule=self, room=talk.room)
             .filter(
@@ -380,18 +364,8 @@ class Schedule(PretalxModel):
 
         for speaker in talk.submission.speakers.all():
             if with_speakers:
-                if speaker_profiles:
-                    profile = speaker_profiles.get(speaker)
-                else:
-                    profile = speaker.event_profile(self.event)
-                if profile and speaker_avails is not None:
-                    profile_availabilities = speaker_avails.get(profile.pk)
-                else:
-                    profile_availabilities = list(profile.availabilities.all()) if profile else []
-                if profile_availabilities and not any(
-                    speaker_availability.contains(availability)
-                    for speaker_availability in Availability.union(profile_availabilities)
-                ):
+                profile_id = index.users.get(speaker.pk)
+                if profile_id and not index.speaker_is_available(profile_id, talk.start, talk.real_end):
                     warnings.append(
                         {
                             'type': 'speaker',
@@ -447,34 +421,11 @@ class Schedule(PretalxModel):
         if filter_updated:
             talks = talks.filter(updated__gte=filter_updated)
         with_speakers = self.event.cfp.request_availabilities
-        room_avails = defaultdict(
-            list,
-            {room.pk: room.availabilities.all() for room in self.event.rooms.all().prefetch_related('availabilities')},
-        )
-        speaker_avails = None
-        speaker_profiles = None
-        if with_speakers:
-            from eventyay.base.models import SpeakerProfile
-
-            speaker_profiles = {
-                profile.user: profile
-                for profile in SpeakerProfile.objects.filter(event=self.event).select_related('user')
-            }
-            speaker_avails = defaultdict(
-                list,
-                {
-                    profile.pk: profile.availabilities.all()
-                    for profile in SpeakerProfile.objects.filter(event=self.event).prefetch_related('availabilities')
-                },
-            )
         result = {}
         for talk in talks:
             talk_warnings = self.get_talk_warnings(
                 talk=talk,
                 with_speakers=with_speakers,
-                room_avails=room_avails.get(talk.room_id) if talk.room_id else None,
-                speaker_avails=speaker_avails,
-                speaker_profiles=speaker_profiles,
             )
             if talk_warnings:
                 result[talk] = talk_warnings
@@ -587,6 +538,8 @@ class Schedule(PretalxModel):
         return self != self.event.current_schedule
 
     def build_data(self, all_talks=False, filter_updated=None, all_rooms=False):
+        from eventyay.base.services.favourites import get_favourite_counts
+
         talks = self.talks.all()
         if not all_talks:
             talks = self.talks.filter(is_visible=True)
@@ -611,6 +564,7 @@ class Schedule(PretalxModel):
             'event_end': self.event.date_to.isoformat(),
         }
         show_do_not_record = self.event.cfp.request_do_not_record
+        fav_counts = get_favourite_counts(self.event)
         for talk in talks:
             rooms.add(talk.room)
             if talk.submission:
@@ -632,7 +586,7 @@ class Schedule(PretalxModel):
                         'duration': talk.submission.get_duration(),
                         'updated': talk.updated.isoformat(),
                         'state': talk.submission.state if all_talks else None,
-                        'fav_count': (count_fav_talk(talk.submission.code) if talk.submission else 0),
+                        'fav_count': fav_counts.get(talk.submission_id, 0),
                         'do_not_record': (talk.submission.do_not_record if show_do_not_record else None),
                         'tags': talk.submission.get_tag(),
                         'session_type': talk.submission.submission_type.name,
@@ -688,8 +642,3 @@ class Schedule(PretalxModel):
     def __str__(self) -> str:
         """Help when debugging."""
         return f'Schedule(event={self.event.slug}, version={self.version})'
-
-
-def count_fav_talk(submission_code):
-    count = SubmissionFavourite.objects.filter(submission__code=submission_code).aggregate(count=Count('id'))['count']
-    return count
@@ -3,11 +3,13 @@ import hashlib
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import subprocess
 import tempfile
 import uuid
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from io import BytesIO
 
@@ -15,12 +17,15 @@ from arabic_reshaper import ArabicReshaper
 from bidi.algorithm import get_display
 from django.conf import settings
 from django.contrib.staticfiles import finders
+from django.db import connection, connections
 from django.dispatch import receiver
 from django.utils.formats import date_format
 from django.utils.html import conditional_escape
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from pypdf import PdfReader
+from django_scopes import scopes_disabled
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
 from pytz import timezone
 from reportlab.graphics import renderPDF
 from reportlab.graphics.barcode.qr import QrCodeWidget
@@ -35,6 +40,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen.canvas import Canvas
 from reportlab.platypus import Paragraph
 
+from eventyay.base.cache import LocalLRUCache
 from eventyay.base.i18n import language
 from eventyay.base.invoice import ThumbnailingImageReader
 from eventyay.base.models import Order, OrderPosition, Question
@@ -46,6 +52,11 @@ from eventyay.presale.style import get_fonts
 
 logger = logging.getLogger(__name__)
 
+# Fonts only need to be registered with reportlab once per process, and images that are the same on many pages
+# (logos, the "powered by" badge, …) only need to be decoded and resized once.
+_registered_fonts = set()
+_image_cache = LocalLRUCache(maxsize=256, ttl=3600)
+
 
 DEFAULT_VARIABLES = OrderedDict(
     (
@@ -727,21 +738,48 @@ class Renderer:
             self.bg_bytes = None
             self.bg_pdf = None
 
+    @classmethod
+    def _register_font(cls, name, path):
+        if name not in _registered_fonts:
+            pdfmetrics.registerFont(TTFont(name, finders.find(path)))
+            _registered_fonts.add(name)
+
     @classmethod
     def _register_fonts(cls):
-        pdfmetrics.registerFont(TTFont('Open Sans', finders.find('fonts/OpenSans-Regular.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans I', finders.find('fonts/OpenSans-Italic.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans B', finders.find('fonts/OpenSans-Bold.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans B I', finders.find('fonts/OpenSans-BoldItalic.ttf')))
+        cls._register_font('Open Sans', 'fonts/OpenSans-Regular.ttf')
+        cls._register_font('Open Sans I', 'fonts/OpenSans-Italic.ttf')
+        cls._register_font('Open Sans B', 'fonts/OpenSans-Bold.ttf')
+        cls._register_font('Open Sans B I', 'fonts/OpenSans-BoldItalic.ttf')
 
         for family, styles in get_fonts().items():
-            pdfmetrics.registerFont(TTFont(family, finders.find(styles['regular']['truetype'])))
+            cls._register_font(family, styles['regular']['truetype'])
             if 'italic' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' I', finders.find(styles['italic']['truetype'])))
+                cls._register_font(family + ' I', styles['italic']['truetype'])
             if 'bold' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' B', finders.find(styles['bold']['truetype'])))
+                cls._register_font(family + ' B', styles['bold']['truetype'])
             if 'bolditalic' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' B I', finders.find(styles['bolditalic']['truetype'])))
+                cls._register_font(family + ' B I', styles['bolditalic']['truetype'])
+
+    def _get_image_reader(self, image_file, width, height, cache_key=None):
+        """
+        Returns a reader for ``image_file`` that is resized to fit ``width``×``height``. If a ``cache_key`` is
+        given, the reader is kept in memory and reused for all further pages that show the same image.
+        """
+        if cache_key:
+            cache_key = (cache_key, width, height)
+            cached = _image_cache.get(cache_key)
+            if cached:
+                return cached
+        ir = ThumbnailingImageReader(image_file)
+        try:
+            size = ir.resize(width, height, 300)
+        except:
+            logger.exception('Can not resize image')
+            size = (width, height)
+        else:
+            if cache_key:
+                _image_cache.set(cache_key, (ir, size))
+        return ir, size
 
     def _draw_poweredby(self, canvas: Canvas, op: OrderPosition, o: dict):
         content = o.get('content', 'dark')
@@ -749,12 +787,7 @@ class Renderer:
             content = 'dark'
         img = finders.find('pretixpresale/pdf/powered_by_eventyay_{}.png'.format(content))
 
-        ir = ThumbnailingImageReader(img)
-        try:
-            width, height = ir.resize(None, float(o['size']) * mm, 300)
-        except:
-            logger.exception('Can not resize image')
-            pass
+        ir, (width, height) = self._get_image_reader(img, None, float(o['size']) * mm, cache_key=img)
         canvas.drawImage(
             ir,
             float(o['left']) * mm,
@@ -814,22 +847,22 @@ class Renderer:
 
     def _draw_imagearea(self, canvas: Canvas, op: OrderPosition, order: Order, o: dict):
         ev = self._get_ev(op, order)
-        if not o['content'] or o['content'] not in self.images:
-            image_file = None
-        else:
+        image_file = cache_key = None
+        if o['content'] and o['content'] in self.images:
+            variable = self.images[o['content']]
             try:
-                image_file = self.images[o['content']]['evaluate'](op, order, ev)
+                image_file = variable['evaluate'](op, order, ev)
+                if image_file and 'etag' in variable:
+                    etag = variable['etag'](op, order, ev)
+                    cache_key = (self.event.pk, o['content'], etag) if etag else None
             except:
                 logger.exception('Failed to process variable.')
                 image_file = None
 
         if image_file:
-            ir = ThumbnailingImageReader(image_file)
-            try:
-                ir.resize(float(o['width']) * mm, float(o['height']) * mm, 300)
-            except:
-                logger.exception('Can not resize image')
-                pass
+            ir, _size = self._get_image_reader(
+                image_file, float(o['width']) * mm, float(o['height']) * mm, cache_key=cache_key
+            )
             canvas.drawImage(
                 image=ir,
                 x=float(o['left']) * mm,
@@ -918,7 +951,58 @@ class Renderer:
         if show_page:
             canvas.showPage()
 
+    def _add_background_form(self, output: PdfWriter):
+        """
+        Adds the first page of the background PDF to ``output`` as a form XObject. Every page of the output
+        references this single object instead of carrying its own copy of the background, which keeps both the
+        rendering time and the file size independent of the number of pages. Returns the indirect reference to
+        the form.
+        """
+        bg_page = self.bg_pdf.pages[0]
+        form = DecodedStreamObject()
+        contents = bg_page.get_contents()
+        form.set_data(contents.get_data() if contents is not None else b'')
+        form.update(
+            {
+                NameObject('/Type'): NameObject('/XObject'),
+                NameObject('/Subtype'): NameObject('/Form'),
+                NameObject('/BBox'): ArrayObject(bg_page.mediabox),
+            }
+        )
+        for key in ('/Resources', '/Group'):
+            if key in bg_page:
+                form[NameObject(key)] = bg_page[key].clone(output)
+        return output._add_object(form.flate_encode())
+
+    def _render_background_form(self, buffer, title):
+        buffer.seek(0)
+        new_pdf = PdfReader(buffer)
+        output = PdfWriter()
+        form_ref = self._add_background_form(output)
+
+        for page in new_pdf.pages:
+            page = output.add_page(page)
+            draw_background_forms(page, [('/EventyayBackground', form_ref, 0, 0)])
+            if '/Rotate' in self.bg_pdf.pages[0]:
+                page[NameObject('/Rotate')] = self.bg_pdf.pages[0]['/Rotate']
+
+        output.add_metadata(
+            {
+                '/Title': str(title),
+                '/Creator': 'pretix',
+            }
+        )
+        outbuffer = BytesIO()
+        output.write(outbuffer)
+        outbuffer.seek(0)
+        return outbuffer
+
     def render_background(self, buffer, title=_('Ticket')):
+        try:
+            return self._render_background_form(buffer, title)
+        except Exception:
+            logger.exception('Could not use the background as a form, falling back to merging it into every page')
+
         if settings.PDFTK:
             buffer.seek(0)
             with tempfile.TemporaryDirectory() as d:
@@ -941,16 +1025,17 @@ class Renderer:
                 with open(os.path.join(d, 'out.pdf'), 'rb') as f:
                     return BytesIO(f.read())
         else:
-            from pypdf import PdfReader, PdfWriter
-
             buffer.seek(0)
             new_pdf = PdfReader(buffer)
             output = PdfWriter()
 
+            bg_page = self.bg_pdf.pages[0]
             for page in new_pdf.pages:
-                bg_page = copy.copy(self.bg_pdf.pages[0])
-                bg_page.merge_page(page)
-                output.add_page(bg_page)
+                # A shallow copy of the background page would share its content stream between all pages, so every
+                # page is merged into a fresh blank page instead
+                new_page = output.add_blank_page(bg_page.mediabox.width, bg_page.mediabox.height)
+                new_page.merge_page(bg_page)
+                new_page.merge_page(page)
 
             output.add_metadata(
                 {
@@ -962,3 +1047,71 @@ class Renderer:
             output.write(outbuffer)
             outbuffer.seek(0)
             return outbuffer
+
+
+def draw_background_forms(page, forms: list):
+    """
+    Draws form XObjects, e.g. created by ``Renderer._add_background_form``, below the existing content of ``page``.
+    ``forms`` is a list of ``(name, form_ref, x, y)`` tuples, every form is drawn with its origin moved to ``x``,
+    ``y``. The same form may be drawn multiple times under the same name.
+    """
+    if '/Resources' not in page:
+        page[NameObject('/Resources')] = DictionaryObject()
+    resources = page['/Resources']
+    if '/XObject' not in resources:
+        resources[NameObject('/XObject')] = DictionaryObject()
+
+    # The backgrounds are drawn first so that the page content is painted on top of them
+    prefix = b''
+    for name, form_ref, x, y in forms:
+        resources['/XObject'][NameObject(name)] = form_ref
+        prefix += b'q 1 0 0 1 %f %f cm %s Do Q\n' % (x, y, name.encode())
+    contents = page.get_contents()
+    content = DecodedStreamObject()
+    content.set_data(prefix + (contents.get_data() if contents is not None else b''))
+    page.replace_contents(content.flate_encode())
+
+
+def _render_chunk(render_chunk, chunk):
+    # Positions are already limited to the right event(s) by the caller
+    with scopes_disabled():
+        return render_chunk(chunk)
+
+
+def render_in_chunks(render_chunk, chunks: list, progress_callback=lambda v: None, metadata: dict = None) -> BytesIO:
+    """
+    Calls ``render_chunk`` for every item of ``chunks`` and concatenates the PDF files it returns, in order, into a
+    single file. ``render_chunk`` may return ``None`` for chunks that did not produce any pages.
+
+    If ``PDF_RENDER_WORKERS`` is larger than one, the chunks are rendered in a pool of forked worker processes, so
+    ``render_chunk`` needs to be a module-level function and the chunks need to be picklable, e.g. lists of IDs.
+    Every worker only holds the chunk it is currently rendering in memory.
+    """
+    merger = PdfWriter()
+
+    def append(i, data):
+        if data:
+            merger.append(BytesIO(data))
+        progress_callback((i + 1) / len(chunks) * 100)
+
+    if settings.PDF_RENDER_WORKERS > 1 and len(chunks) > 1 and not connection.in_atomic_block:
+        # The forked workers must not share the database connections of this process, they open their own ones
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(settings.PDF_RENDER_WORKERS, len(chunks)),
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            futures = [executor.submit(_render_chunk, render_chunk, chunk) for chunk in chunks]
+            for i, future in enumerate(futures):
+                append(i, future.result())
+    else:
+        for i, chunk in enumerate(chunks):
+            append(i, _render_chunk(render_chunk, chunk))
+
+    if metadata:
+        merger.add_metadata(metadata)
+    outbuffer = BytesIO()
+    merger.write(outbuffer)
+    merger.close()
+    outbuffer.seek(0)
+    return outbuffer
@@ -13,14 +13,29 @@ from cryptography.hazmat.primitives.serialization import (
     load_pem_public_key,
 )
 from django.conf import settings
+from django.db import transaction
 from django.dispatch import receiver
 from django.utils.crypto import get_random_string
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
-from eventyay.base.models import Product, ProductVariation, SubEvent
+from eventyay.base.cache import LocalLRUCache
+from eventyay.base.models import (
+    Order,
+    OrderPosition,
+    Product,
+    ProductVariation,
+    RevokedTicketSecret,
+    SubEvent,
+)
 from eventyay.base.secretgenerators import pretix_sig1_pb2
+from eventyay.base.services.ordersearch import schedule_search_document_update
 from eventyay.base.signals import register_ticket_secret_generators
 
+# Parsed keys by their serialized form, so that a key is only parsed once per process, and a new key of an event
+# is picked up as soon as it has been stored in the settings
+_key_cache = LocalLRUCache(maxsize=1000, ttl=3600)
+
 
 class BaseTicketSecretGenerator:
     """
@@ -90,6 +105,30 @@ class BaseTicketSecretGenerator:
         """
         raise NotImplementedError()
 
+    def generate_secrets(self, positions, force_invalidate=False) -> list:
+        """
+        Generate new secrets for a list of order positions, following the same rules as ``generate_secret``, and
+        return them in the same order. Generators that can create many secrets faster than one by one can override
+        this method.
+        """
+        kwargs = {}
+        with_attendee_name = 'attendee_name' in inspect.signature(self.generate_secret).parameters
+        secrets = []
+        for position in positions:
+            if with_attendee_name:
+                kwargs['attendee_name'] = position.attendee_name
+            secrets.append(
+                self.generate_secret(
+                    product=position.product,
+                    variation=position.variation,
+                    subevent=position.subevent,
+                    current_secret=position.secret,
+                    force_invalidate=force_invalidate,
+                    **kwargs,
+                )
+            )
+        return secrets
+
 
 class RandomTicketSecretGenerator(BaseTicketSecretGenerator):
     verbose_name = _('Random (default, works with all apps in the ecosystem)')
@@ -147,15 +186,26 @@ class Sig1TicketSecretGenerator(BaseTicketSecretGenerator):
             pubkey.public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
         ).decode()
 
-    def _sign_payload(self, payload):
+    def _private_key(self):
         if not self.event.settings.ticket_secrets_pretix_sig1_privkey:
             self._generate_keys()
-        privkey = load_pem_private_key(
-            base64.b64decode(self.event.settings.ticket_secrets_pretix_sig1_privkey),
-            None,
-            Backend(),
-        )
-        signature = privkey.sign(payload)
+        serialized = self.event.settings.ticket_secrets_pretix_sig1_privkey
+        privkey = _key_cache.get(serialized)
+        if privkey is None:
+            privkey = load_pem_private_key(base64.b64decode(serialized), None, Backend())
+            _key_cache.set(serialized, privkey)
+        return privkey
+
+    def _public_key(self):
+        serialized = self.event.settings.ticket_secrets_pretix_sig1_pubkey
+        pubkey = _key_cache.get(serialized)
+        if pubkey is None:
+            pubkey = load_pem_public_key(base64.b64decode(serialized), Backend())
+            _key_cache.set(serialized, pubkey)
+        return pubkey
+
+    def _sign_payload(self, payload):
+        signature = self._private_key().sign(payload)
         return bytes([0x01]) + struct.pack('>H', len(payload)) + struct.pack('>H', len(signature)) + payload + signature
 
     def _parse(self, secret):
@@ -168,11 +218,7 @@ class Sig1TicketSecretGenerator(BaseTicketSecretGenerator):
             sig_len = struct.unpack('>H', rawbytes[3:5])[0]
             payload = rawbytes[5 : 5 + payload_len]
             signature = rawbytes[5 + payload_len : 5 + payload_len + sig_len]
-            pubkey = load_pem_public_key(
-                base64.b64decode(self.event.settings.ticket_secrets_pretix_sig1_pubkey),
-                Backend(),
-            )
-            pubkey.verify(signature, payload)
+            self._public_key().verify(signature, payload)
             t = pretix_sig1_pb2.Ticket()
             t.ParseFromString(payload)
             return t
@@ -207,6 +253,13 @@ class Sig1TicketSecretGenerator(BaseTicketSecretGenerator):
         result = base64.b64encode(self._sign_payload(payload)).decode()[::-1]
         return result
 
+    def verify_secrets(self, secrets) -> dict:
+        """
+        Verifies the signatures of a list of secrets and returns a dictionary mapping every secret to its decoded
+        ``Ticket`` message, or to ``None`` if it is invalid.
+        """
+        return {secret: self._parse(secret) for secret in set(secrets)}
+
 
 @receiver(register_ticket_secret_generators, dispatch_uid='ticket_generator_default')
 def recv_classic(sender, **kwargs):
@@ -224,20 +277,46 @@ def assign_ticket_secret(
     if gen.use_revocation_list and force_invalidate_if_revokation_list_used:
         force_invalidate = True
 
-    kwargs = {}
-    if 'attendee_name' in inspect.signature(gen.generate_secret).parameters:
-        kwargs['attendee_name'] = position.attendee_name
-    secret = gen.generate_secret(
-        product=position.product,
-        variation=position.variation,
-        subevent=position.subevent,
-        current_secret=position.secret,
-        force_invalidate=force_invalidate,
-        **kwargs,
-    )
+    secret = gen.generate_secrets([position], force_invalidate=force_invalidate)[0]
     changed = position.secret != secret
     if position.secret and changed and gen.use_revocation_list:
         position.revoked_secrets.create(event=event, secret=position.secret)
     position.secret = secret
     if save and changed:
         position.save()
+
+
+def assign_ticket_secrets(
+    event,
+    positions,
+    force_invalidate_if_revokation_list_used=False,
+    force_invalidate=False,
+):
+    """
+    Like ``assign_ticket_secret``, but for many positions of an event at once. Revoked secrets and changed positions
+    are written with a constant number of queries, which bypasses ``OrderPosition.save()``.
+    """
+    gen = event.ticket_secret_generator
+    if gen.use_revocation_list and force_invalidate_if_revokation_list_used:
+        force_invalidate = True
+
+    positions = list(positions)
+    revoked = []
+    changed = []
+    for position, secret in zip(positions, gen.generate_secrets(positions, force_invalidate=force_invalidate)):
+        if position.secret == secret:
+            continue
+        if position.secret and gen.use_revocation_list:
+            revoked.append(RevokedTicketSecret(event=event, position=position, secret=position.secret))
+        position.secret = secret
+        changed.append(position)
+
+    if not changed:
+        return
+    with transaction.atomic():
+        RevokedTicketSecret.objects.bulk_create(revoked, batch_size=500)
+        OrderPosition.all.bulk_update(changed, ['secret'], batch_size=500)
+        order_ids = {p.order_id for p in changed}
+        Order.objects.filter(pk__in=order_ids).update(last_modified=now())
+    for order_id in order_ids:
+        schedule_search_document_update(order_id)
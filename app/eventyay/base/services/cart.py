@@ -34,6 +34,7 @@ from eventyay.base.models.orders import OrderFee, OrderPosition
 from eventyay.base.models.product import ProductMetaValue
 from eventyay.base.models.tax import TAXED_ZERO, TaxedPrice, TaxRule
 from eventyay.base.reldate import RelativeDateWrapper
+from eventyay.base.services.cartexpiry import track_cart_expiry
 from eventyay.base.services.checkin import _save_answers
 from eventyay.base.services.locking import LockTimeoutException, NoLockManager
 from eventyay.base.services.pricing import get_price
@@ -1386,11 +1387,19 @@ class CartManager:
                 self.now_dt = now_dt
                 self._extend_expiry_of_valid_existing_positions()
                 err, warning = self._perform_operations()
-            if err:
-                raise CartError(err)
-            # Store warning for later retrieval if needed
-            if warning:
-                self._last_warning = warning
+
+        # Outside of the lock, as this needs another query
+        track_cart_expiry(
+            self.event,
+            self.cart_id,
+            self._expiry,
+            set(self.positions.values_list('subevent_id', flat=True).distinct()),
+        )
+        if err:
+            raise CartError(err)
+        # Store warning for later retrieval if needed
+        if warning:
+            self._last_warning = warning
 
 
 def update_tax_rates(event: Event, cart_id: str, invoice_address: InvoiceAddress):
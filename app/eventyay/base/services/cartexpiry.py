@@ -0,0 +1,102 @@
+"""
+Prompt release of expired cart reservations.
+
+Cart positions stop counting towards their quotas as soon as they expire, but the availability of quotas is cached – for
+up to two minutes in the quota availability cache in redis and for a few seconds by the product lists in the event's
+cache. Until these caches run out, products whose reservations have lapsed are still shown as reserved or sold out.
+
+With redis available, every cart is tracked in a sorted set scored by the time its reservations expire
+
+    cart_expiries = {'{event_id}:{subevent_id}:{cart_id}': expires}
+
+which is updated whenever a cart is changed or its reservations are extended. Every minute, ``sweep_expired_carts``
+takes all carts that have expired since its last run, recomputes the availability of the quotas of their events or
+dates, which writes the fresh numbers to the quota availability cache, drops the cached product lists and assigns the
+freed capacity to the waiting list if automatic assignment is enabled. The expired positions themselves are kept for
+two weeks, since their reservations can be extended as long as the quotas allow it.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django_scopes import scopes_disabled
+
+from eventyay.base.channels import get_all_sales_channels
+from eventyay.base.models import Event
+from eventyay.base.services.quotas import QuotaAvailability, product_quota_cache_key
+from eventyay.base.services.waitinglist import assign_automatically
+from eventyay.base.signals import periodic_task
+
+CART_EXPIRIES_KEY = 'cart_expiries'
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('redis')
+
+
+def track_cart_expiry(event: Event, cart_id: str, expires: datetime, subevent_ids: Iterable) -> None:
+    """
+    Registers the time at which the reservations of a cart in the given dates of an event expire, once the current
+    transaction has been committed.
+    """
+    if not settings.HAS_REDIS or not cart_id:
+        return
+    members = {f'{event.pk}:{subevent_id or ""}:{cart_id}': expires.timestamp() for subevent_id in subevent_ids}
+    if members:
+        transaction.on_commit(lambda: _redis().zadd(CART_EXPIRIES_KEY, members))
+
+
+def release_expired_reservations(event: Event, subevent_ids: set) -> None:
+    """
+    Updates the cached availability of the quotas of the given dates of an event after reservations have expired and
+    offers the freed capacity to the waiting list.
+    """
+    seq = Q(subevent_id__in={se for se in subevent_ids if se})
+    if None in subevent_ids:
+        seq |= Q(subevent__isnull=True)
+    quotas = list(event.quotas.filter(seq).filter(size__isnull=False))
+    if quotas:
+        qa = QuotaAvailability()
+        qa.queue(*quotas)
+        qa.compute()
+
+    event.cache.delete_many(
+        [
+            product_quota_cache_key(subevent_id, channel, require_seat)
+            for subevent_id in subevent_ids
+            for channel in get_all_sales_channels()
+            for require_seat in (False, True)
+        ]
+    )
+
+    if event.settings.waiting_list_auto and (event.presale_is_running or event.has_subevents):
+        assign_automatically.apply_async(args=(event.pk,))
+
+
+@receiver(signal=periodic_task)
+@scopes_disabled()
+def sweep_expired_carts(sender, **kwargs):
+    if not settings.HAS_REDIS:
+        return
+
+    now_ts = time.time()
+    pipe = _redis().pipeline()
+    pipe.zrangebyscore(CART_EXPIRIES_KEY, '-inf', now_ts)
+    pipe.zremrangebyscore(CART_EXPIRIES_KEY, '-inf', now_ts)
+    expired, _ = pipe.execute()
+
+    subevents = defaultdict(set)
+    for member in expired:
+        event_id, subevent_id, _ = member.decode().split(':', 2)
+        subevents[int(event_id)].add(int(subevent_id) if subevent_id else None)
+
+    for event in Event.objects.filter(pk__in=subevents.keys()).select_related('organizer'):
+        release_expired_reservations(event, subevents[event.pk])
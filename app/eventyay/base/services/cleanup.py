@@ -1,46 +1,122 @@
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.management import call_command
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django_scopes import scopes_disabled
 
+from eventyay.base.metrics import eventyay_periodic_objects_total
 from eventyay.base.models import CachedCombinedTicket, CachedTicket
+from eventyay.base.services.tasks import ProfiledTask
+from eventyay.celery_app import app
+from eventyay.helpers.periodic import minimum_interval
 
-from ..models import CachedFile, CartPosition, InvoiceAddress
+from ..models import CachedFile, CartPosition, Event, InvoiceAddress
 from ..signals import periodic_task
+from .tickets import get_ticket_cache_version
+
+
+def delete_in_batches(qs, task, delete=None):
+    """
+    Deletes the objects of ``qs`` in chunks of ``CLEANUP_BATCH_SIZE``, each with a single ``DELETE ... WHERE id IN``
+    statement, unless ``delete`` is given to delete a chunk of primary keys in a different way.
+    """
+    model = qs.model
+    total = 0
+    while True:
+        pks = list(qs.values_list('pk', flat=True)[: settings.CLEANUP_BATCH_SIZE])
+        if not pks:
+            break
+        if delete:
+            delete(pks)
+        else:
+            model.objects.filter(pk__in=pks).delete()
+        total += len(pks)
+        eventyay_periodic_objects_total.inc(len(pks), task=task, model=model._meta.model_name)
+    return total
+
+
+def _delete_with_files(model):
+    def delete(pks):
+        files = [name for name in model.objects.filter(pk__in=pks).values_list('file', flat=True) if name]
+        # The objects are not referenced by any other model and their only post_delete receivers remove their files,
+        # which we do in the background instead, so the rows can be removed without loading them
+        model.objects.filter(pk__in=pks)._raw_delete(model.objects.db)
+        if files:
+            delete_stored_files.apply_async(args=(files,))
+
+    return delete
+
+
+@app.task(base=ProfiledTask)
+def delete_stored_files(names: list):
+    for name in names:
+        default_storage.delete(name)
 
 
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def clean_cart_positions(sender, **kwargs):
-    for cp in CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=False):
-        cp.delete()
-    for cp in CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=True):
-        cp.delete()
-    for ia in InvoiceAddress.objects.filter(order__isnull=True, last_modified__lt=now() - timedelta(days=14)):
-        ia.delete()
+    delete_in_batches(
+        CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=False),
+        'clean_cart_positions',
+    )
+    delete_in_batches(
+        CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=True),
+        'clean_cart_positions',
+    )
+    delete_in_batches(
+        InvoiceAddress.objects.filter(order__isnull=True, last_modified__lt=now() - timedelta(days=14)),
+        'clean_cart_positions',
+    )
 
 
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def clean_cached_files(sender, **kwargs):
-    for cf in CachedFile.objects.filter(expires__isnull=False, expires__lt=now()):
-        cf.delete()
+    delete_in_batches(
+        CachedFile.objects.filter(expires__isnull=False, expires__lt=now()),
+        'clean_cached_files',
+        _delete_with_files(CachedFile),
+    )
 
 
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def clean_cached_tickets(sender, **kwargs):
-    for cf in CachedTicket.objects.filter(created__lte=now() - timedelta(hours=settings.CACHE_TICKETS_HOURS)):
-        cf.delete()
-    for cf in CachedCombinedTicket.objects.filter(created__lte=now() - timedelta(hours=settings.CACHE_TICKETS_HOURS)):
-        cf.delete()
-    for cf in CachedTicket.objects.filter(created__lte=now() - timedelta(minutes=30), file__isnull=True):
-        cf.delete()
-    for cf in CachedCombinedTicket.objects.filter(created__lte=now() - timedelta(minutes=30), file__isnull=True):
-        cf.delete()
+    for model in (CachedTicket, CachedCombinedTicket):
+        delete_in_batches(
+            model.objects.filter(created__lte=now() - timedelta(hours=settings.CACHE_TICKETS_HOURS)),
+            'clean_cached_tickets',
+            _delete_with_files(model),
+        )
+        delete_in_batches(
+            model.objects.filter(created__lte=now() - timedelta(minutes=30), file__isnull=True),
+            'clean_cached_tickets',
+            _delete_with_files(model),
+        )
+
+
+@receiver(signal=periodic_task)
+@minimum_interval(minutes_after_success=30)
+@scopes_disabled()
+def clean_outdated_cached_tickets(sender, **kwargs):
+    event_ids = set(CachedTicket.objects.values_list('order_position__order__event_id', flat=True).distinct())
+    event_ids |= set(CachedCombinedTicket.objects.values_list('order__event_id', flat=True).distinct())
+    for event in Event.objects.filter(pk__in=event_ids):
+        version = get_ticket_cache_version(event)
+        delete_in_batches(
+            CachedTicket.objects.filter(order_position__order__event=event, version__lt=version),
+            'clean_outdated_cached_tickets',
+            _delete_with_files(CachedTicket),
+        )
+        delete_in_batches(
+            CachedCombinedTicket.objects.filter(order__event=event, version__lt=version),
+            'clean_outdated_cached_tickets',
+            _delete_with_files(CachedCombinedTicket),
+        )
 
 
 @receiver(signal=periodic_task)
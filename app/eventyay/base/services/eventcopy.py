@@ -0,0 +1,45 @@
+"""
+Copying the data of an event into a new one.
+
+Template events can have hundreds of products, questions and seats, so the copy made by ``Event.copy_data_from`` runs
+in the background when a new event is created from another one in the control panel. The copy is made in a single
+transaction, so if it fails, e.g. in a plugin receiving ``event_copy_data``, the new event is left without any of the
+copied data instead of with only part of it.
+"""
+
+import logging
+
+from django.db import transaction
+from django.utils.translation import gettext as _
+from django_scopes import scopes_disabled
+
+from eventyay.base.i18n import LazyLocaleException
+from eventyay.base.models import Event
+from eventyay.base.services.tasks import ProfiledEventTask
+from eventyay.celery_app import app
+
+logger = logging.getLogger(__name__)
+
+
+class EventCopyError(LazyLocaleException):
+    pass
+
+
+@app.task(base=ProfiledEventTask, throws=(EventCopyError,))
+def copy_event_data(event: Event, other: int, skip_attributes: list = None) -> int:
+    try:
+        # The source event may belong to another organizer than the one the task is scoped to
+        with transaction.atomic(), scopes_disabled():
+            event.copy_data_from(Event.objects.get(pk=other), skip_attributes=skip_attributes)
+    except Exception:
+        logger.exception('Could not copy the data of event %s into event %s', other, event.pk)
+        # Caches might have been cleared with data of the rolled back transaction in between
+        event.cache.clear()
+        event.settings.flush()
+        raise EventCopyError(
+            _(
+                'The event {event} has been created, but the data of the other event could not be copied into it. '
+                'Please set it up manually or delete it and try again.'
+            ).format(event=event.slug)
+        )
+    return event.pk
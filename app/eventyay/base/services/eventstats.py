@@ -0,0 +1,189 @@
+"""
+Statistics shown on the dashboards of the control panel.
+
+The numbers of an event (or one of its dates) are computed together into a single record that is kept in the
+event's cache, so that dashboards opened in many tabs do not run the same aggregate queries over and over again.
+Whenever an order, a check-in, a waiting list entry or a quota of the event changes, a change marker is updated and
+the next dashboard load recomputes the record – at most once every ``MIN_AGE`` seconds, so that busy on-sales do not
+turn every page load into a recomputation. Records also expire after ``settings.DASHBOARD_STATS_TTL`` seconds to
+reconcile changes that did not send any signal, e.g. queryset updates.
+"""
+
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from eventyay.base.models import (
+    Event,
+    Order,
+    OrderPosition,
+    ProductVariation,
+    Quota,
+    SubEvent,
+    WaitingListEntry,
+)
+from eventyay.base.signals import (
+    checkin_created,
+    order_approved,
+    order_canceled,
+    order_changed,
+    order_denied,
+    order_expired,
+    order_modified,
+    order_paid,
+    order_placed,
+    order_reactivated,
+)
+
+# Minimum age in seconds of a record before a change causes it to be recomputed
+MIN_AGE = 10
+# Time in seconds a process may take to recompute a record before others start to compute it as well
+COMPUTE_TIMEOUT = 60
+
+
+def _waitinglist_available(event: Event, subevent: SubEvent, wles) -> int:
+    quota_cache = {}
+    happy = 0
+    tuples = wles.values('product', 'variation').order_by().annotate(cnt=Count('id'))
+
+    products = {
+        i.pk: i
+        for i in event.products.filter(id__in=[t['product'] for t in tuples]).prefetch_related(
+            Prefetch(
+                'quotas',
+                to_attr='_subevent_quotas',
+                queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent),
+            ),
+        )
+    }
+    vars = {
+        i.pk: i
+        for i in ProductVariation.objects.filter(
+            product__event=event,
+            id__in=[t['variation'] for t in tuples if t['variation']],
+        ).prefetch_related(
+            Prefetch(
+                'quotas',
+                to_attr='_subevent_quotas',
+                queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent),
+            ),
+        )
+    }
+
+    for wlt in tuples:
+        product = products.get(wlt['product'])
+        variation = vars.get(wlt['variation'])
+        if not product:
+            continue
+        quotas = variation._get_quotas(subevent=subevent) if variation else product._get_quotas(subevent=subevent)
+        row = (
+            variation.check_quotas(subevent=subevent, count_waitinglist=False, _cache=quota_cache)
+            if variation
+            else product.check_quotas(subevent=subevent, count_waitinglist=False, _cache=quota_cache)
+        )
+        if row[1] is None:
+            happy += 1
+        elif row[1] > 0:
+            happy += 1
+            for q in quotas:
+                if q.size is not None:
+                    quota_cache[q.pk] = (
+                        quota_cache[q.pk][0],
+                        quota_cache[q.pk][1] - 1,
+                    )
+    return happy
+
+
+def compute_event_stats(event: Event, subevent: SubEvent = None) -> dict:
+    """
+    Computes the dashboard statistics of an event or one of its dates from the database.
+    """
+    computed = time.time()
+    opqs = OrderPosition.objects.filter(order__event=event)
+    if subevent:
+        opqs = opqs.filter(subevent=subevent)
+
+    tickets = opqs.filter(
+        product__admission=True,
+        order__status__in=(Order.STATUS_PAID, Order.STATUS_PENDING),
+    ).aggregate(
+        ordered=Count('id'),
+        paid=Count('id', filter=Q(order__status=Order.STATUS_PAID)),
+    )
+
+    if subevent:
+        rev = opqs.filter(order__status=Order.STATUS_PAID).aggregate(sum=Sum('price'))['sum']
+    else:
+        rev = Order.objects.filter(event=event, status=Order.STATUS_PAID).aggregate(sum=Sum('total'))['sum']
+
+    wles = WaitingListEntry.objects.filter(event=event, subevent=subevent, voucher__isnull=True)
+    waitinglist_length = wles.count()
+
+    return {
+        'computed': computed,
+        'tickets_ordered': tickets['ordered'],
+        'tickets_paid': tickets['paid'],
+        'revenue': rev or Decimal('0.00'),
+        'waitinglist_length': waitinglist_length,
+        'waitinglist_available': _waitinglist_available(event, subevent, wles) if waitinglist_length else 0,
+        'checkins': {
+            cl.pk: (cl.inside_count, cl.position_count) for cl in event.checkin_lists.filter(subevent=subevent)
+        },
+    }
+
+
+def get_event_stats(event: Event, subevent: SubEvent = None) -> dict:
+    """
+    Returns the dashboard statistics of an event or one of its dates, served from the cache if possible. The
+    ``updated`` key of the result contains the time at which the numbers have been computed.
+    """
+    key = 'dashboard_stats_{}'.format(subevent.pk if subevent else 0)
+    cached = event.cache.get_many([key, 'dashboard_stats_changed'])
+    stats = cached.get(key)
+    if stats is not None:
+        changed = cached.get('dashboard_stats_changed') or 0
+        outdated = changed >= stats['computed'] and time.time() - stats['computed'] > MIN_AGE
+        # If somebody else is already recomputing the record, the outdated numbers are good enough for now
+        if not outdated or not event.cache.add(key + '_lock', 1, COMPUTE_TIMEOUT):
+            return dict(stats, updated=datetime.fromtimestamp(stats['computed'], tz=timezone.utc))
+
+    stats = compute_event_stats(event, subevent)
+    event.cache.set(key, stats, settings.DASHBOARD_STATS_TTL)
+    event.cache.delete(key + '_lock')
+    return dict(stats, updated=datetime.fromtimestamp(stats['computed'], tz=timezone.utc))
+
+
+def invalidate_event_stats(event: Event) -> None:
+    """
+    Marks the dashboard statistics of an event and all of its dates as outdated once the current transaction has been
+    committed.
+    """
+    transaction.on_commit(lambda: event.cache.set('dashboard_stats_changed', time.time(), settings.DASHBOARD_STATS_TTL))
+
+
+@receiver(order_placed, dispatch_uid='eventstats_order_placed')
+@receiver(order_paid, dispatch_uid='eventstats_order_paid')
+@receiver(order_canceled, dispatch_uid='eventstats_order_canceled')
+@receiver(order_reactivated, dispatch_uid='eventstats_order_reactivated')
+@receiver(order_expired, dispatch_uid='eventstats_order_expired')
+@receiver(order_modified, dispatch_uid='eventstats_order_modified')
+@receiver(order_changed, dispatch_uid='eventstats_order_changed')
+@receiver(order_approved, dispatch_uid='eventstats_order_approved')
+@receiver(order_denied, dispatch_uid='eventstats_order_denied')
+@receiver(checkin_created, dispatch_uid='eventstats_checkin_created')
+def event_changed(sender: Event, **kwargs):
+    invalidate_event_stats(sender)
+
+
+@receiver(post_save, sender=WaitingListEntry, dispatch_uid='eventstats_waitinglist_saved')
+@receiver(post_delete, sender=WaitingListEntry, dispatch_uid='eventstats_waitinglist_deleted')
+@receiver(post_save, sender=Quota, dispatch_uid='eventstats_quota_saved')
+def event_object_changed(sender, instance, **kwargs):
+    if instance.event_id:
+        invalidate_event_stats(instance.event)
@@ -0,0 +1,123 @@
+"""
+Favourite counts of sessions.
+
+With redis available, the number of favourites per submission is kept as a counter in a per-event hash
+
+    favourites:{event_id}:counts = {submission_id: count, '_built': 1}
+
+which is updated whenever a favourite is added or removed, so that rendering a schedule only needs a single
+round trip to fetch the counts of all of its sessions. The hash is built from the database on first use and
+periodically rebuilt to correct any drift, e.g. from favourites deleted in bulk. Without redis, all counts of
+an event are computed with a single aggregate query.
+"""
+
+from typing import Dict
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_scopes import scopes_disabled
+
+from eventyay.base.models import Event, SubmissionFavourite
+from eventyay.base.signals import periodic_task
+from eventyay.helpers.periodic import minimum_interval
+
+BUILT_MARKER = '_built'
+
+# Only update counters that have been built from the database before, otherwise we'd create a partial hash. This
+# needs to happen atomically, as a reconciliation may delete the hash in between.
+_INCREMENT_IF_BUILT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('HINCRBY', KEYS[1], ARGV[2], ARGV[3])
+end
+return nil
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('redis')
+
+
+def _cache_key(event_id):
+    return f'favourites:{event_id}:counts'
+
+
+def _count_favourites(event_id) -> Dict[int, int]:
+    with scopes_disabled():
+        return dict(
+            SubmissionFavourite.objects.filter(submission__event_id=event_id)
+            .order_by()
+            .values('submission_id')
+            .annotate(c=Count('id'))
+            .values_list('submission_id', 'c')
+        )
+
+
+def reconcile_favourite_counts(event_id) -> Dict[int, int]:
+    """
+    Recomputes the favourite counts of all submissions of an event from the database and replaces the cached
+    counters with the result.
+    """
+    counts = _count_favourites(event_id)
+    if settings.HAS_REDIS:
+        pipe = _redis().pipeline()
+        pipe.delete(_cache_key(event_id))
+        pipe.hset(_cache_key(event_id), mapping={BUILT_MARKER: 1, **{str(k): v for k, v in counts.items()}})
+        pipe.execute()
+    return counts
+
+
+def get_favourite_counts(event: Event) -> Dict[int, int]:
+    """
+    Returns a dictionary mapping the IDs of all favourited submissions of ``event`` to their number of favourites.
+    Submissions without favourites are not included.
+    """
+    if not settings.HAS_REDIS:
+        return _count_favourites(event.pk)
+
+    data = _redis().hgetall(_cache_key(event.pk))
+    if BUILT_MARKER.encode() not in data:
+        return reconcile_favourite_counts(event.pk)
+    return {int(k): int(v) for k, v in data.items() if k.decode() != BUILT_MARKER and int(v) > 0}
+
+
+def _change_count(event_id, submission_id, by):
+    _redis().eval(_INCREMENT_IF_BUILT, 1, _cache_key(event_id), BUILT_MARKER, str(submission_id), by)
+
+
+def _event_id(favourite):
+    try:
+        return favourite.submission.event_id
+    except ObjectDoesNotExist:
+        # The submission is being deleted as well, the counter is dropped by the next reconciliation
+        return None
+
+
+@receiver(post_save, sender=SubmissionFavourite, dispatch_uid='favourites_count_added')
+def favourite_added(sender, instance, created, **kwargs):
+    if created and settings.HAS_REDIS and (event_id := _event_id(instance)):
+        transaction.on_commit(lambda: _change_count(event_id, instance.submission_id, 1))
+
+
+@receiver(post_delete, sender=SubmissionFavourite, dispatch_uid='favourites_count_removed')
+def favourite_removed(sender, instance, **kwargs):
+    if settings.HAS_REDIS and (event_id := _event_id(instance)):
+        transaction.on_commit(lambda: _change_count(event_id, instance.submission_id, -1))
+
+
+@receiver(signal=periodic_task)
+@minimum_interval(minutes_after_success=60)
+def reconcile_favourites(sender, **kwargs):
+    if not settings.HAS_REDIS:
+        return
+    with scopes_disabled():
+        event_ids = set(
+            SubmissionFavourite.objects.order_by().values_list('submission__event_id', flat=True).distinct()
+        )
+    for event_id in event_ids:
+        reconcile_favourite_counts(event_id)
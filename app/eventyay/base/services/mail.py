@@ -1,15 +1,17 @@
 import base64
+import hashlib
 import inspect
 import logging
 import os
 import re
 import smtplib
 import ssl
+import time
 import warnings
 from email.mime.image import MIMEImage
 from email.utils import formataddr
 from typing import Any, Dict, List, Sequence, Union
-from urllib.parse import urljoin, urlparse
+from urllib.parse import unquote, urljoin, urlparse
 
 import pytz
 import requests
@@ -17,6 +19,10 @@ from bs4 import BeautifulSoup
 from celery import chain
 from celery.exceptions import MaxRetriesExceededError
 from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.files.storage import default_storage
 from django.core.mail import (
     EmailMultiAlternatives,
     SafeMIMEMultipart,
@@ -31,6 +37,7 @@ from django.utils.translation import pgettext
 from django_scopes import scope, scopes_disabled
 from i18nfield.strings import LazyI18nString
 
+from eventyay.base.cache import LocalLRUCache
 from eventyay.base.email import ClassicMailRenderer
 from eventyay.base.i18n import language
 from eventyay.base.models import (
@@ -43,7 +50,7 @@ from eventyay.base.models import (
     User,
 )
 from eventyay.base.services.invoices import invoice_pdf_task
-from eventyay.base.services.tasks import TransactionAwareTask
+from eventyay.base.services.tasks import ProfiledEventTask, TransactionAwareTask
 from eventyay.base.services.tickets import get_tickets_for_order
 from eventyay.base.settings import GlobalSettingsObject
 from eventyay.base.signals import email_filter, global_email_filter
@@ -82,6 +89,7 @@ def mail(
     user=None,
     attach_ical=False,
     attach_cached_files: Sequence = None,
+    batch: list = None,
 ):
     """
     Sends out an email to a user. The mail will be sent synchronously or asynchronously depending on the installation.
@@ -125,6 +133,10 @@ def mail(
 
     :param attach_cached_files: A list of cached file to attach to this email.
 
+    :param batch: A list the prepared message will be appended to instead of being queued on its own. Used for bulk
+        mailings that are later handed to ``mail_send_batch_task`` in chunks, which sends them over a single
+        connection. Messages that need an invoice to be rendered first are always queued on their own.
+
     :raises MailOrderException: on obvious, immediate failures. Not raising an exception does not necessarily mean
         that the email has been sent, just that it has been queued by the email backend.
     """
@@ -262,7 +274,7 @@ def mail(
                 logger.exception('Could not render HTML body')
                 body_html = None
 
-        send_task = mail_send_task.si(
+        send_kwargs = dict(
             to=[email] if isinstance(email, str) else list(email),
             bcc=bcc,
             subject=subject,
@@ -281,12 +293,14 @@ def mail(
             if attach_cached_files
             else [],
         )
+        pending_invoices = [i for i in invoices if not i.file] if invoices else []
 
-        if invoices:
-            task_chain = [invoice_pdf_task.si(i.pk).on_error(send_task) for i in invoices if not i.file]
-        else:
-            task_chain = []
+        if batch is not None and not pending_invoices:
+            batch.append(send_kwargs)
+            return
 
+        send_task = mail_send_task.si(**send_kwargs)
+        task_chain = [invoice_pdf_task.si(i.pk).on_error(send_task) for i in pending_invoices]
         task_chain.append(send_task)
 
         if 'locmem' in settings.EMAIL_BACKEND:
@@ -311,16 +325,14 @@ class CustomEmail(EmailMultiAlternatives):
         return super()._create_mime_attachment(content, mimetype)
 
 
-@app.task(base=TransactionAwareTask, bind=True, acks_late=True)
-def mail_send_task(
-    self,
-    *args,
+def _build_email(
+    event: Event = None,
+    *,
     to: List[str],
     subject: str,
     body: str,
     html: str,
     sender: str,
-    event: int = None,
     position: int = None,
     headers: dict = None,
     bcc: List[str] = None,
@@ -332,7 +344,12 @@ def mail_send_task(
     attach_cached_files: List[int] = None,
     attach_file_base64: str = None,
     attach_file_name: str = None,
-) -> bool:
+):
+    """
+    Builds the message object for the serialized mail arguments produced by ``mail()``, including all attachments
+    and email filters. Needs to be called within the organizer scope of ``event``. Returns the message and the
+    resolved order (or ``None``).
+    """
     email = CustomEmail(subject, body, sender, to=to, bcc=bcc, headers=headers)
     if html is not None:
         html_message = SafeMIMEMultipart(_subtype='related', encoding=settings.DEFAULT_CHARSET)
@@ -344,6 +361,129 @@ def mail_send_task(
     if user:
         user = User.objects.get(pk=user)
 
+    if event:
+        if order:
+            try:
+                order = event.orders.get(pk=order)
+            except Order.DoesNotExist:
+                order = None
+            else:
+                with language(order.locale, event.settings.region):
+                    if not event.settings.mail_attach_tickets:
+                        attach_tickets = False
+                    if position:
+                        try:
+                            position = order.positions.get(pk=position)
+                        except OrderPosition.DoesNotExist:
+                            attach_tickets = False
+                    if attach_tickets:
+                        args = []
+                        attach_size = 0
+                        for name, ct in get_tickets_for_order(order, base_position=position):
+                            content = ct.file.read()
+                            args.append((name, content, ct.type))
+                            attach_size += len(content)
+
+                        if attach_size < 4 * 1024 * 1024:
+                            # Do not attach more than 4MB, it will bounce way to often.
+                            for a in args:
+                                try:
+                                    email.attach(*a)
+                                except:
+                                    pass
+                        else:
+                            message = (
+                                f'Attachment have not been send because {attach_size} bytes are '
+                                'likely too large to arrive.'
+                            )
+                            order.log_action(
+                                'pretix.event.order.email.attachments.skipped',
+                                data={
+                                    'subject': 'Attachments skipped',
+                                    'message': message,
+                                    'recipient': '',
+                                    'invoices': [],
+                                },
+                            )
+                    if attach_ical:
+                        ical_events = set()
+                        if event.has_subevents:
+                            if position:
+                                ical_events.add(position.subevent)
+                            else:
+                                for p in order.positions.all():
+                                    ical_events.add(p.subevent)
+                        else:
+                            ical_events.add(order.event)
+
+                        for i, e in enumerate(ical_events):
+                            cal = get_ical([e])
+                            email.attach(
+                                'event-{}.ics'.format(i),
+                                cal.serialize(),
+                                'text/calendar',
+                            )
+
+        email = email_filter.send_chained(event, 'message', message=email, order=order, user=user)
+
+    if invoices:
+        invoices = Invoice.objects.filter(pk__in=invoices)
+        for inv in invoices:
+            if inv.file:
+                try:
+                    with language(inv.order.locale):
+                        email.attach(
+                            pgettext('invoice', 'Invoice {num}').format(num=inv.number).replace(' ', '_') + '.pdf',
+                            inv.file.file.read(),
+                            'application/pdf',
+                        )
+                except:
+                    logger.exception('Could not attach invoice to email')
+                    pass
+
+    if attach_cached_files:
+        for cf in CachedFile.objects.filter(id__in=attach_cached_files):
+            if cf.file:
+                try:
+                    email.attach(
+                        cf.filename,
+                        cf.file.file.read(),
+                        cf.type,
+                    )
+                except:
+                    logger.exception('Could not attach file to email')
+                    pass
+
+    email = global_email_filter.send_chained(event, 'message', message=email, user=user, order=order)
+    if attach_file_base64:
+        attach_file_content = base64.b64decode(attach_file_base64)
+        email.attach(attach_file_name, attach_file_content, 'application/pdf')
+
+    return email, order
+
+
+@app.task(base=TransactionAwareTask, bind=True, acks_late=True)
+def mail_send_task(
+    self,
+    *args,
+    to: List[str],
+    subject: str,
+    body: str,
+    html: str,
+    sender: str,
+    event: int = None,
+    position: int = None,
+    headers: dict = None,
+    bcc: List[str] = None,
+    invoices: List[int] = None,
+    order: int = None,
+    attach_tickets=False,
+    user=None,
+    attach_ical=False,
+    attach_cached_files: List[int] = None,
+    attach_file_base64: str = None,
+    attach_file_name: str = None,
+) -> bool:
     if event:
         with scopes_disabled():
             event = Event.objects.get(id=event)
@@ -358,103 +498,25 @@ def mail_send_task(
             return scopes_disabled()  # noqa
 
     with cm():
-        if event:
-            if order:
-                try:
-                    order = event.orders.get(pk=order)
-                except Order.DoesNotExist:
-                    order = None
-                else:
-                    with language(order.locale, event.settings.region):
-                        if not event.settings.mail_attach_tickets:
-                            attach_tickets = False
-                        if position:
-                            try:
-                                position = order.positions.get(pk=position)
-                            except OrderPosition.DoesNotExist:
-                                attach_tickets = False
-                        if attach_tickets:
-                            args = []
-                            attach_size = 0
-                            for name, ct in get_tickets_for_order(order, base_position=position):
-                                content = ct.file.read()
-                                args.append((name, content, ct.type))
-                                attach_size += len(content)
-
-                            if attach_size < 4 * 1024 * 1024:
-                                # Do not attach more than 4MB, it will bounce way to often.
-                                for a in args:
-                                    try:
-                                        email.attach(*a)
-                                    except:
-                                        pass
-                            else:
-                                message = (
-                                    f'Attachment have not been send because {attach_size} bytes are '
-                                    'likely too large to arrive.'
-                                )
-                                order.log_action(
-                                    'pretix.event.order.email.attachments.skipped',
-                                    data={
-                                        'subject': 'Attachments skipped',
-                                        'message': message,
-                                        'recipient': '',
-                                        'invoices': [],
-                                    },
-                                )
-                        if attach_ical:
-                            ical_events = set()
-                            if event.has_subevents:
-                                if position:
-                                    ical_events.add(position.subevent)
-                                else:
-                                    for p in order.positions.all():
-                                        ical_events.add(p.subevent)
-                            else:
-                                ical_events.add(order.event)
-
-                            for i, e in enumerate(ical_events):
-                                cal = get_ical([e])
-                                email.attach(
-                                    'event-{}.ics'.format(i),
-                                    cal.serialize(),
-                                    'text/calendar',
-                                )
-
-            email = email_filter.send_chained(event, 'message', message=email, order=order, user=user)
-
-        if invoices:
-            invoices = Invoice.objects.filter(pk__in=invoices)
-            for inv in invoices:
-                if inv.file:
-                    try:
-                        with language(inv.order.locale):
-                            email.attach(
-                                pgettext('invoice', 'Invoice {num}').format(num=inv.number).replace(' ', '_') + '.pdf',
-                                inv.file.file.read(),
-                                'application/pdf',
-                            )
-                    except:
-                        logger.exception('Could not attach invoice to email')
-                        pass
-
-        if attach_cached_files:
-            for cf in CachedFile.objects.filter(id__in=attach_cached_files):
-                if cf.file:
-                    try:
-                        email.attach(
-                            cf.filename,
-                            cf.file.file.read(),
-                            cf.type,
-                        )
-                    except:
-                        logger.exception('Could not attach file to email')
-                        pass
-
-        email = global_email_filter.send_chained(event, 'message', message=email, user=user, order=order)
-        if attach_file_base64:
-            attach_file_content = base64.b64decode(attach_file_base64)
-            email.attach(attach_file_name, attach_file_content, 'application/pdf')
+        email, order = _build_email(
+            event,
+            to=to,
+            subject=subject,
+            body=body,
+            html=html,
+            sender=sender,
+            position=position,
+            headers=headers,
+            bcc=bcc,
+            invoices=invoices,
+            order=order,
+            attach_tickets=attach_tickets,
+            user=user,
+            attach_ical=attach_ical,
+            attach_cached_files=attach_cached_files,
+            attach_file_base64=attach_file_base64,
+            attach_file_name=attach_file_name,
+        )
 
         try:
             backend.send_messages([email])
@@ -563,6 +625,40 @@ def mail_send_task(
             raise SendMailException('Failed to send an email to {}.'.format(to))
 
 
+@app.task(base=ProfiledEventTask, bind=True, acks_late=True)
+def mail_send_batch_task(self, event: Event, messages: List[dict]) -> int:
+    """
+    Sends a chunk of messages collected with ``mail(..., batch=...)`` over a single connection to the event's mail
+    backend, throttled to ``MAIL_BATCH_RATE_LIMIT`` messages per second if configured. Messages that can't be sent
+    are handed over to ``mail_send_task`` individually, which takes care of retries and error logging.
+    """
+    backend = event.get_mail_backend()
+    interval = 1 / settings.MAIL_BATCH_RATE_LIMIT if settings.MAIL_BATCH_RATE_LIMIT > 0 else 0
+    sent = 0
+    try:
+        for kwargs in messages:
+            t0 = time.monotonic()
+            try:
+                email, order = _build_email(event, **{k: v for k, v in kwargs.items() if k != 'event'})
+                backend.open()
+                backend.send_messages([email])
+            except Exception:
+                logger.warning(
+                    'Could not send batched email to %s, queueing it separately.', kwargs['to'], exc_info=True
+                )
+                # The connection might be in an undefined state, the next message will open a new one
+                backend.close()
+                mail_send_task.apply_async(kwargs=kwargs)
+            else:
+                sent += 1
+
+            if interval:
+                time.sleep(max(0, interval - (time.monotonic() - t0)))
+    finally:
+        backend.close()
+    return sent
+
+
 def mail_send(*args, **kwargs):
     mail_send_task.apply_async(args=args, kwargs=kwargs)
 
@@ -642,8 +738,7 @@ def convert_image_to_cid(image_src, cid_id, verify_ssl=True):
             path = urlparse(image_src).path
             guess_subtype = os.path.splitext(path)[1][1:]
 
-            response = requests.get(image_src, verify=verify_ssl)
-            mime_image = MIMEImage(response.content, _subtype=guess_subtype)
+            mime_image = MIMEImage(fetch_image(image_src, verify_ssl), _subtype=guess_subtype)
 
         mime_image.add_header('Content-ID', '<%s>' % cid_id)
 
@@ -653,6 +748,75 @@ def convert_image_to_cid(image_src, cid_id, verify_ssl=True):
         return None
 
 
+_image_cache = LocalLRUCache(
+    maxsize=256,
+    ttl=settings.MAIL_IMAGE_CACHE_TTL,
+    maxbytes=settings.MAIL_IMAGE_CACHE_LOCAL_SIZE,
+    sizeof=lambda e: len(e[1]),
+)
+
+
+def fetch_image(url, verify_ssl=True) -> bytes:
+    """
+    Returns the content of an image referenced in an email. Public media files and static files are read directly
+    from storage. Everything else is downloaded and cached, both in the current process and in the shared cache, as a
+    mailing to thousands of recipients otherwise downloads the same images over and over again. Entries are kept
+    for ``MAIL_IMAGE_CACHE_TTL`` seconds and revalidated with their ``ETag`` afterwards.
+    """
+    content = _read_image_from_storage(url)
+    if content is not None:
+        return content
+
+    key = 'mail_image:%s' % hashlib.sha256(url.encode()).hexdigest()
+    entry = _image_cache.get(key)
+    if entry is None:
+        entry = caches['default'].get(key)
+    if entry is not None and entry[2] > time.time() - settings.MAIL_IMAGE_CACHE_TTL:
+        _image_cache.set(key, entry)
+        return entry[1]
+
+    headers = {'If-None-Match': entry[0]} if entry is not None and entry[0] else {}
+    response = requests.get(url, verify=verify_ssl, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        content = entry[1]
+    elif response.status_code == 200:
+        content = response.content
+    else:
+        return response.content
+
+    entry = (response.headers.get('ETag') or (entry[0] if entry is not None else None), content, time.time())
+    if len(content) <= settings.MAIL_IMAGE_CACHE_MAX_SIZE:
+        _image_cache.set(key, entry)
+        # Keep the shared entry around for longer than its freshness, so it can be revalidated cheaply
+        caches['default'].set(key, entry, settings.MAIL_IMAGE_CACHE_TTL * 24)
+    return content
+
+
+def _read_image_from_storage(url):
+    parsed = urlparse(url)
+    for base_url, storage in ((settings.MEDIA_URL, default_storage), (settings.STATIC_URL, staticfiles_storage)):
+        base = urlparse(urljoin(settings.SITE_URL, base_url))
+        if parsed.netloc != base.netloc or not parsed.path.startswith(base.path):
+            continue
+        name = unquote(parsed.path[len(base.path) :])
+        if storage is default_storage and (not name.startswith('pub/') or '..' in name.split('/')):
+            # Only public uploads are served by the web server, everything else (invoices, exports, …) must not be
+            # inlined into emails, no matter who wrote the template
+            return None
+        try:
+            if storage.exists(name):
+                with storage.open(name, 'rb') as f:
+                    return f.read()
+            if storage is staticfiles_storage:
+                path = finders.find(name)
+                if path:
+                    with open(path, 'rb') as f:
+                        return f.read()
+        except Exception:
+            logger.warning('Could not read %s from storage, falling back to HTTP', name, exc_info=True)
+    return None
+
+
 def normalize_image_url(url):
     if '://' not in url:
         """
@@ -1,27 +1,36 @@
 import csv
 import io
+import itertools
+from collections import Counter
 from decimal import Decimal
 
+from django.conf import settings as django_settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.utils.timezone import now
+from django.utils.crypto import get_random_string
 from django.utils.translation import gettext as _
+from django_scopes import scopes_disabled
 
 from eventyay.base.i18n import LazyLocaleException, language
 from eventyay.base.models import (
     CachedFile,
     Event,
     InvoiceAddress,
+    LogEntry,
     Order,
     OrderPayment,
     OrderPosition,
     User,
 )
 from eventyay.base.orderimport import get_all_columns
+from eventyay.base.secrets import assign_ticket_secret
 from eventyay.base.services.invoices import generate_invoice, invoice_qualified
+from eventyay.base.services.ordersearch import schedule_search_document_update
+from eventyay.base.services.quotas import QuotaAvailability
 from eventyay.base.services.tasks import ProfiledEventTask
 from eventyay.base.signals import order_paid, order_placed
 from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
 
 
 class DataImportError(LazyLocaleException):
@@ -66,124 +75,291 @@ def setif(record, obj, attr, setting):
         setattr(obj, attr, record[setting[4:]] or '')
 
 
-@app.task(base=ProfiledEventTask, throws=(DataImportError,))
-def import_orders(event: Event, fileid: str, settings: dict, locale: str, user) -> None:
-    # TODO: quotacheck?
-    cf = CachedFile.objects.get(id=fileid)
-    user = User.objects.get(pk=user)
-    with language(locale, event.settings.region):
-        cols = get_all_columns(event)
-        parsed = parse_csv(cf.file)
-        orders = []
-        order = None
-        data = []
-
-        # Run validation
-        for i, record in enumerate(parsed):
-            values = {}
+def _clean(cols, settings, record, line):
+    values = {}
+    for c in cols:
+        val = c.resolve(settings, record)
+        try:
+            values[c.identifier] = c.clean(val, values)
+        except ValidationError as e:
+            raise DataImportError(
+                _('Error while importing value "{value}" for column "{column}" in line "{line}": {message}').format(
+                    value=val if val is not None else '',
+                    column=c.verbose_name,
+                    line=line,
+                    message=e.message,
+                )
+            )
+    return values
+
+
+def _validate(parsed, cols, settings):
+    """
+    Validates all rows of the file without keeping them in memory, so that nothing is imported if any of them is
+    invalid. Returns the number of rows and the number of positions needed per product, variation and date.
+    """
+    rows = 0
+    needed = Counter()
+    for i, record in enumerate(parsed):
+        values = _clean(cols, settings, record, i + 1)
+        rows += 1
+        needed[
+            (
+                getattr(values.get('product'), 'pk', None),
+                getattr(values.get('variation'), 'pk', None),
+                getattr(values.get('subevent'), 'pk', None),
+            )
+        ] += 1
+    return rows, needed
+
+
+def _check_quotas(event, needed: Counter):
+    """
+    Checks that there is enough capacity left in the quotas of the imported products, using a single batched
+    availability computation for all affected quotas.
+    """
+    quotas = list(
+        event.quotas.filter(products__in={product for product, variation, subevent in needed})
+        .distinct()
+        .prefetch_related('products', 'variations')
+    )
+    quota_usage = Counter()
+    for (product, variation, subevent), count in needed.items():
+        for q in quotas:
+            if q.subevent_id != subevent:
+                continue
+            if (variation is None and product in {p.pk for p in q.products.all()}) or (
+                variation is not None and variation in {v.pk for v in q.variations.all()}
+            ):
+                quota_usage[q] += count
+
+    qa = QuotaAvailability()
+    qa.queue(*quota_usage)
+    qa.compute()
+    for q, count in quota_usage.items():
+        state, available = qa.results[q]
+        if available is not None and available < count:
+            raise DataImportError(
+                _('The quota {name} does not have enough capacity left to perform the operation.').format(name=q.name)
+            )
+
+
+def _assign_codes(event, orders):
+    codes = {}
+    for o in orders:
+        code = o.generate_code()
+        while code in codes:
+            code = o.generate_code()
+        codes[code] = o
+    for taken in Order.objects.filter(event__organizer=event.organizer, code__in=codes.keys()).values_list(
+        'code', flat=True
+    ):
+        # Rare collisions with existing orders are resolved one by one
+        codes.pop(taken).assign_code()
+    for code, o in codes.items():
+        o.code = code
+
+
+def _assign_secrets(event, positions):
+    secrets = {}
+    for p in positions:
+        while not p.secret or p.secret in secrets:
+            assign_ticket_secret(event=event, position=p, force_invalidate=True, save=False)
+        secrets[p.secret] = p
+    for taken in OrderPosition.all.filter(
+        order__event__organizer_id=event.organizer_id, secret__in=secrets.keys()
+    ).values_list('secret', flat=True):
+        # Rare collisions with existing tickets are resolved one by one
+        p = secrets.pop(taken)
+        while (
+            p.secret == taken
+            or p.secret in secrets
+            or OrderPosition.all.filter(order__event__organizer_id=event.organizer_id, secret=p.secret).exists()
+        ):
+            assign_ticket_secret(event=event, position=p, force_invalidate=True, save=False)
+        secrets[p.secret] = p
+
+
+def _assign_pseudonymization_ids(positions):
+    ids = {}
+    for p in positions:
+        while not p.pseudonymization_id or p.pseudonymization_id in ids:
+            p.pseudonymization_id = get_random_string(length=10, allowed_chars='ABCDEFGHJKLMNPQRSTUVWXYZ3789')
+        ids[p.pseudonymization_id] = p
+    with scopes_disabled():
+        for taken in OrderPosition.all.filter(pseudonymization_id__in=ids.keys()).values_list(
+            'pseudonymization_id', flat=True
+        ):
+            ids.pop(taken).assign_pseudonymization_id()
+
+
+def _prepare_chunk(event, cols, settings, records):
+    """
+    Builds the orders, positions and invoice addresses of the given rows in memory.
+    """
+    orders = []
+    order = None
+    for i, record in records:
+        values = _clean(cols, settings, record, i + 1)
+
+        try:
+            if order is None or settings['orders'] == 'many':
+                order = Order(
+                    event=event,
+                    testmode=settings['testmode'],
+                )
+                order.meta_info = {}
+                order._positions = []
+                order._address = InvoiceAddress()
+                order._address.name_parts = {'_scheme': event.settings.name_scheme}
+                orders.append(order)
+
+            position = OrderPosition(positionid=len(order._positions) + 1)
+            position.attendee_name_parts = {'_scheme': event.settings.name_scheme}
+            position.meta_info = {}
+            order._positions.append(position)
+
             for c in cols:
-                val = c.resolve(settings, record)
-                try:
-                    values[c.identifier] = c.clean(val, values)
-                except ValidationError as e:
-                    raise DataImportError(
-                        _(
-                            'Error while importing value "{value}" for column "{column}" in line "{line}": {message}'
-                        ).format(
-                            value=val if val is not None else '',
-                            column=c.verbose_name,
-                            line=i + 1,
-                            message=e.message,
-                        )
-                    )
-            data.append(values)
-
-        # Prepare model objects. Yes, this might consume lots of RAM, but allows us to make the actual SQL transaction
-        # shorter. We'll see what works better in reality…
-        for i, record in enumerate(data):
-            try:
-                if order is None or settings['orders'] == 'many':
-                    order = Order(
-                        event=event,
-                        testmode=settings['testmode'],
-                    )
-                    order.meta_info = {}
-                    order._positions = []
-                    order._address = InvoiceAddress()
-                    order._address.name_parts = {'_scheme': event.settings.name_scheme}
-                    orders.append(order)
-
-                position = OrderPosition(positionid=len(order._positions) + 1)
-                position.attendee_name_parts = {'_scheme': event.settings.name_scheme}
-                position.meta_info = {}
-                order._positions.append(position)
-                position.assign_pseudonymization_id()
+                c.assign(values.get(c.identifier), order, position, order._address)
 
-                for c in cols:
-                    c.assign(record.get(c.identifier), order, position, order._address)
-
-            except ImportError as e:
-                raise ImportError(_('Invalid data in row {row}: {message}').format(row=i, message=str(e)))
-
-        # quota check?
-        with event.lock():
-            with transaction.atomic():
-                for o in orders:
-                    o.total = sum([c.price for c in o._positions])  # currently no support for fees
-                    if o.total == Decimal('0.00'):
-                        o.status = Order.STATUS_PAID
-                        o.save()
-                        OrderPayment.objects.create(
+        except ImportError as e:
+            raise ImportError(_('Invalid data in row {row}: {message}').format(row=i, message=str(e)))
+    return orders
+
+
+def _save_chunk(event, cols, settings, orders, user):
+    """
+    Saves the orders of one chunk with bulk inserts in a single short transaction.
+    """
+    positions = [p for o in orders for p in o._positions]
+    with event.lock() as now_dt:
+        with transaction.atomic():
+            # Capacity might have changed since the file has been validated, and we'd rather stop than overbook
+            _check_quotas(event, Counter((p.product_id, p.variation_id, p.subevent_id) for p in positions))
+
+            payments = []
+            for o in orders:
+                o.total = sum([c.price for c in o._positions])  # currently no support for fees
+                o.datetime = now_dt
+                o.set_expires(now_dt)
+                if o.total == Decimal('0.00'):
+                    o.status = Order.STATUS_PAID
+                    payments.append(
+                        OrderPayment(
                             local_id=1,
                             order=o,
                             amount=Decimal('0.00'),
                             provider='free',
                             info='{}',
-                            payment_date=now(),
+                            payment_date=now_dt,
                             state=OrderPayment.PAYMENT_STATE_CONFIRMED,
                         )
-                    elif settings['status'] == 'paid':
-                        o.status = Order.STATUS_PAID
-                        o.save()
-                        OrderPayment.objects.create(
+                    )
+                elif settings['status'] == 'paid':
+                    o.status = Order.STATUS_PAID
+                    payments.append(
+                        OrderPayment(
                             local_id=1,
                             order=o,
                             amount=o.total,
                             provider='manual',
                             info='{}',
-                            payment_date=now(),
+                            payment_date=now_dt,
                             state=OrderPayment.PAYMENT_STATE_CONFIRMED,
                         )
-                    else:
-                        o.status = Order.STATUS_PENDING
-                        o.save()
-                    for p in o._positions:
-                        p.order = o
-                        p.save()
-                    o._address.order = o
-                    o._address.save()
-                    for c in cols:
-                        c.save(o)
+                    )
+                else:
+                    o.status = Order.STATUS_PENDING
+            _assign_codes(event, orders)
+            bulk_save(Order, orders)
+
+            for o in orders:
+                for p in o._positions:
+                    p.order = o
+                    if p.tax_rate is None:
+                        p._calculate_tax()
+                    p.attendee_name_cached = p.attendee_name
+                o._address.order = o
+                o._address.name_cached = o._address.name if o._address.name_parts else ''
+            _assign_secrets(event, positions)
+            _assign_pseudonymization_ids(positions)
+            bulk_save(OrderPosition, positions)
+            bulk_save(InvoiceAddress, [o._address for o in orders])
+            bulk_save(OrderPayment, payments)
+
+            logentries = []
+            for o in orders:
+                for c in cols:
+                    c.save(o)
+                logentries.append(
                     o.log_action(
                         'pretix.event.order.placed',
                         user=user,
                         data={'source': 'import'},
+                        save=False,
                     )
-
+                )
+            bulk_save(LogEntry, logentries)
+            LogEntry.bulk_postprocess(logentries)
             for o in orders:
-                with language(o.locale, event.settings.region):
-                    order_placed.send(event, order=o)
-                    if o.status == Order.STATUS_PAID:
-                        order_paid.send(event, order=o)
-
-                    gen_invoice = (
-                        invoice_qualified(o)
-                        and (
-                            (event.settings.get('invoice_generate') == 'True')
-                            or (event.settings.get('invoice_generate') == 'paid' and o.status == Order.STATUS_PAID)
-                        )
-                        and not o.invoices.last()
-                    )
-                    if gen_invoice:
-                        generate_invoice(o, trigger_pdf=True)
+                # Bulk inserts do not send post_save, so the search documents need to be built explicitly
+                schedule_search_document_update(o.pk)
+
+    for o in orders:
+        with language(o.locale, event.settings.region):
+            order_placed.send(event, order=o)
+            if o.status == Order.STATUS_PAID:
+                order_paid.send(event, order=o)
+
+            gen_invoice = (
+                invoice_qualified(o)
+                and (
+                    (event.settings.get('invoice_generate') == 'True')
+                    or (event.settings.get('invoice_generate') == 'paid' and o.status == Order.STATUS_PAID)
+                )
+                and not o.invoices.last()
+            )
+            if gen_invoice:
+                generate_invoice(o, trigger_pdf=True)
+
+
+@app.task(base=ProfiledEventTask, throws=(DataImportError,), bind=True)
+def import_orders(self, event: Event, fileid: str, settings: dict, locale: str, user) -> None:
+    def set_progress(val):
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta={'value': val})
+
+    cf = CachedFile.objects.get(id=fileid)
+    user = User.objects.get(pk=user)
+    with language(locale, event.settings.region):
+        # Validate the whole file first, so that nothing is imported from a file with invalid rows
+        rows, needed = _validate(parse_csv(cf.file), get_all_columns(event), settings)
+        _check_quotas(event, needed)
+
+        # Then import the rows in chunks, each in its own short transaction. The columns are created again, since
+        # some of them remember the values seen during validation to detect duplicates. If all rows go into a
+        # single order, they can not be split up.
+        cols = get_all_columns(event)
+        cf.file.seek(0)
+        records = enumerate(parse_csv(cf.file))
+        chunk_size = django_settings.ORDER_IMPORT_CHUNK_SIZE if settings['orders'] == 'many' else rows
+        imported = 0
+        try:
+            while imported < rows:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+                _save_chunk(event, cols, settings, _prepare_chunk(event, cols, settings, chunk), user)
+                imported += len(chunk)
+                set_progress(imported / rows * 100)
+        except DataImportError as e:
+            if not imported:
+                raise
+            # The previous chunks have already been committed, importing the whole file again would duplicate them
+            raise DataImportError(
+                _(
+                    '{message} The first {count} rows of the file have already been imported, please remove them '
+                    'from the file before you import it again.'
+                ).format(message=str(e), count=imported)
+            )
     cf.delete()
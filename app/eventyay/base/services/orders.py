@@ -36,11 +36,14 @@ from eventyay.base.i18n import (
     get_language_without_region,
     language,
 )
+from eventyay.base.metrics import eventyay_periodic_objects_total
 from eventyay.base.models import (
     CartPosition,
     Device,
     Event,
     GiftCard,
+    Invoice,
+    LogEntry,
     Product,
     ProductVariation,
     Order,
@@ -91,6 +94,7 @@ from eventyay.base.signals import (
     validate_order,
 )
 from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
 from eventyay.helpers.models import modelcopy
 from eventyay.helpers.periodic import minimum_interval
 
@@ -1261,22 +1265,69 @@ def _perform_order(
     return order.id
 
 
+def _expire_orders_of_event(event, order_ids):
+    """
+    Marks a chunk of pending orders of one event as expired, like ``mark_order_expired`` does for a single order,
+    but taking the event lock only once.
+    """
+    with transaction.atomic():
+        with event.lock() as now_dt:
+            orders = list(
+                Order.objects.select_for_update()
+                .filter(
+                    pk__in=order_ids,
+                    event=event,
+                    expires__lt=now_dt,
+                    status=Order.STATUS_PENDING,
+                    require_approval=False,
+                )
+                .order_by('pk')
+            )
+            Order.objects.filter(pk__in=[o.pk for o in orders]).update(
+                status=Order.STATUS_EXPIRED, last_modified=now_dt
+            )
+
+        logentries = []
+        for o in orders:
+            o.status = Order.STATUS_EXPIRED
+            o.event = event
+            logentries.append(o.log_action('eventyay.event.order.expired', save=False))
+        bulk_save(LogEntry, logentries)
+        LogEntry.bulk_postprocess(logentries)
+
+        last_invoices = {}
+        for i in Invoice.objects.filter(order__in=orders, is_cancellation=False).annotate(
+            has_refered=Exists(Invoice.objects.filter(refers=OuterRef('pk')))
+        ):
+            last_invoices[i.order_id] = i
+        for i in last_invoices.values():
+            if not i.has_refered:
+                generate_cancellation(i)
+
+    for o in orders:
+        order_expired.send(event, order=o)
+    eventyay_periodic_objects_total.inc(len(orders), task='expire_orders', model='order')
+
+
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def expire_orders(sender, **kwargs):
-    event_id = None
-    expire = None
-
-    for o in (
+    event_ids = (
         Order.objects.filter(expires__lt=now(), status=Order.STATUS_PENDING, require_approval=False)
-        .select_related('event')
-        .order_by('event_id')
-    ):
-        if o.event_id != event_id:
-            expire = o.event.settings.get('payment_term_expire_automatically', as_type=bool)
-            event_id = o.event_id
-        if expire:
-            mark_order_expired(o)
+        .order_by()
+        .values_list('event_id', flat=True)
+        .distinct()
+    )
+    for event in Event.objects.filter(pk__in=event_ids).select_related('organizer'):
+        if not event.settings.get('payment_term_expire_automatically', as_type=bool):
+            continue
+        order_ids = list(
+            Order.objects.filter(
+                event=event, expires__lt=now(), status=Order.STATUS_PENDING, require_approval=False
+            ).values_list('pk', flat=True)
+        )
+        for i in range(0, len(order_ids), settings.CLEANUP_BATCH_SIZE):
+            _expire_orders_of_event(event, order_ids[i : i + settings.CLEANUP_BATCH_SIZE])
 
 
 @receiver(signal=periodic_task)
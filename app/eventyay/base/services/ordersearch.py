@@ -0,0 +1,161 @@
+"""
+Search documents of orders.
+
+Every order has an ``OrderSearchDocument`` with all of its searchable texts (code, email, comment, invoice address,
+attendee names and emails, ticket secrets, …) in a single lowercased column, so that the order search only needs a
+substring lookup on one table, which is backed by a trigram index on PostgreSQL.
+
+Documents are rebuilt after the transaction that changed an order, one of its positions or its invoice address has
+been committed. Changes that bypass ``save()``, such as bulk inserts or queryset updates, are caught up by a
+periodic task that rebuilds documents older than their order's ``last_modified`` timestamp, a limited number of
+batches per run. Documents of existing orders are built with the ``rebuild_order_search`` management command.
+"""
+
+import itertools
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_scopes import scopes_disabled
+
+from eventyay.base.models import InvoiceAddress, Order, OrderPosition, OrderSearchDocument
+from eventyay.base.signals import periodic_task
+from eventyay.helpers.periodic import minimum_interval
+
+_pending = threading.local()
+
+# Number of orders whose documents are rebuilt with one set of queries
+BATCH_SIZE = 1000
+# Number of batches rebuilt by one run of the periodic task, the rest is left for the next run
+PERIODIC_MAX_BATCHES = 20
+
+
+def search_terms(query: str) -> set:
+    """
+    Returns the lowercased variants of a search query that are matched against the search documents, i.e. the query
+    itself and, since order codes never contain some easily confused characters, its normalized forms.
+    """
+    terms = {query.lower()}
+    if '-' in query:
+        slug, code = query.rsplit('-', 1)
+        terms.add('{}-{}'.format(slug, Order.normalize_code(code)).lower())
+    else:
+        terms.add(Order.normalize_code(query).lower())
+    return terms
+
+
+def search_document_q(query: str) -> Q:
+    """
+    Returns a filter for ``OrderSearchDocument`` objects matching the given search query.
+    """
+    q = Q()
+    for term in search_terms(query):
+        q |= Q(text__contains=term)
+    return q
+
+
+@scopes_disabled()
+def update_search_documents(order_ids):
+    """
+    Rebuilds the search documents of the given orders with a constant number of queries.
+    """
+    order_ids = list(order_ids)
+    parts = defaultdict(list)
+    orders = Order.objects.filter(pk__in=order_ids).values_list(
+        'pk', 'code', 'event__slug', 'email', 'comment', 'last_modified'
+    )
+    modified = {}
+    for pk, code, slug, email, comment, last_modified in orders:
+        parts[pk] += [code, f'{slug}-{code}', email, comment]
+        modified[pk] = last_modified
+    for order_id, name, company in InvoiceAddress.objects.filter(order_id__in=modified.keys()).values_list(
+        'order_id', 'name_cached', 'company'
+    ):
+        parts[order_id] += [name, company]
+    for order_id, name, email, secret, pseudonymization_id in (
+        OrderPosition.objects.filter(order_id__in=modified.keys())
+        .order_by('order_id', 'positionid')
+        .values_list('order_id', 'attendee_name_cached', 'attendee_email', 'secret', 'pseudonymization_id')
+    ):
+        parts[order_id] += [name, email, secret, pseudonymization_id]
+
+    documents = [
+        OrderSearchDocument(
+            order_id=pk,
+            text='\n'.join(p.replace('\n', ' ').lower() for p in parts[pk] if p),
+            order_modified=last_modified,
+        )
+        for pk, last_modified in modified.items()
+    ]
+    OrderSearchDocument.objects.bulk_create(
+        documents,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['order'],
+        update_fields=['text', 'order_modified'],
+    )
+
+
+def _flush_pending():
+    order_ids = getattr(_pending, 'order_ids', set())
+    _pending.order_ids = set()
+    if order_ids:
+        update_search_documents(order_ids)
+
+
+def schedule_search_document_update(order_id):
+    """
+    Rebuilds the search document of an order once the current transaction has been committed. All orders changed
+    within one transaction are rebuilt together by the first callback that runs, the others find nothing left to do.
+    """
+    if not hasattr(_pending, 'order_ids'):
+        _pending.order_ids = set()
+    _pending.order_ids.add(order_id)
+    transaction.on_commit(_flush_pending)
+
+
+@receiver(post_save, sender=Order, dispatch_uid='ordersearch_order_saved')
+def order_saved(sender, instance, **kwargs):
+    schedule_search_document_update(instance.pk)
+
+
+@receiver(post_save, sender=OrderPosition, dispatch_uid='ordersearch_position_saved')
+@receiver(post_delete, sender=OrderPosition, dispatch_uid='ordersearch_position_deleted')
+@receiver(post_save, sender=InvoiceAddress, dispatch_uid='ordersearch_address_saved')
+def order_part_changed(sender, instance, **kwargs):
+    if instance.order_id:
+        schedule_search_document_update(instance.order_id)
+
+
+def outdated_orders():
+    """
+    Returns all orders without a search document or with a document older than the order.
+    """
+    return Order.objects.filter(
+        Q(search_document__isnull=True) | Q(search_document__order_modified__lt=F('last_modified'))
+    )
+
+
+@scopes_disabled()
+def update_outdated_search_documents(max_batches=None) -> int:
+    """
+    Rebuilds outdated search documents in batches of ``BATCH_SIZE`` orders, at most ``max_batches`` of them. Returns
+    the number of rebuilt documents.
+    """
+    updated = 0
+    for _ in itertools.count() if max_batches is None else range(max_batches):
+        order_ids = list(outdated_orders().values_list('pk', flat=True)[:BATCH_SIZE])
+        if not order_ids:
+            break
+        update_search_documents(order_ids)
+        updated += len(order_ids)
+    return updated
+
+
+@receiver(signal=periodic_task)
+@minimum_interval(minutes_after_success=10)
+def update_outdated_search_documents_periodic(sender, **kwargs):
+    update_outdated_search_documents(max_batches=PERIODIC_MAX_BATCHES)
@@ -0,0 +1,107 @@
+"""
+Scheduling of periodic tasks.
+
+Celery beat calls ``run_periodic_tasks`` every minute, which dispatches every receiver of the ``periodic_task``
+signals as its own ``run_periodic_receiver`` task instead of calling all of them one after another. This way, the
+receivers are spread across all workers and a slow receiver can not delay the others, e.g. order expiry.
+
+Receivers decorated with ``minimum_interval`` are only dispatched when they are due. Every receiver holds a lock
+in the cache while it runs, so that it never runs twice at the same time, and is cancelled once its running
+timeout (``minutes_running_timeout`` or ``settings.PERIODIC_TASK_TIMEOUT`` minutes) has passed. Run counts and
+durations are recorded as metrics per receiver.
+"""
+
+import logging
+import time
+import uuid
+from typing import Callable, Dict
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.cache import cache
+
+from eventyay.base.metrics import Counter, Histogram
+from eventyay.base.services.tasks import ProfiledTask
+from eventyay.base.signals import periodic_task
+from eventyay.celery_app import app
+from eventyay.common.signals import periodic_task as talk_periodic_task
+
+logger = logging.getLogger(__name__)
+
+eventyay_periodic_task_runs_total = Counter(
+    'eventyay_periodic_task_runs_total', 'Total runs of a periodic task receiver', ['receiver', 'status']
+)
+eventyay_periodic_task_duration_seconds = Histogram(
+    'eventyay_periodic_task_duration_seconds',
+    'Run time of a periodic task receiver',
+    ['receiver'],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, float('inf')),
+)
+
+
+def get_periodic_receivers() -> Dict[str, Callable]:
+    """
+    Returns all receivers of the ``periodic_task`` signals by their dotted path.
+    """
+    receivers = {}
+    for signal in (periodic_task, talk_periodic_task):
+        for recv in signal._live_receivers(None)[0]:
+            receivers[f'{recv.__module__}.{recv.__qualname__}'] = (signal, recv)
+    return receivers
+
+
+def _lock_key(name):
+    return f'periodic_task_running:{name}'
+
+
+def _timeout(recv):
+    return getattr(recv, 'running_timeout', settings.PERIODIC_TASK_TIMEOUT) * 60
+
+
+def _is_due(name, recv):
+    keys = [_lock_key(name), *getattr(recv, 'periodic_keys', ())]
+    return not cache.get_many(keys)
+
+
+@app.task(base=ProfiledTask)
+def run_periodic_receiver(name: str):
+    signal, recv = get_periodic_receivers().get(name, (None, None))
+    if recv is None:
+        logger.warning('Periodic task receiver %s does not exist (anymore).', name)
+        return
+
+    uniqid = str(uuid.uuid4())
+    if not cache.add(_lock_key(name), uniqid, timeout=_timeout(recv)):
+        # Still running from an earlier dispatch
+        return
+
+    status = 'success'
+    t0 = time.perf_counter()
+    try:
+        recv(signal=signal, sender=None)
+    except SoftTimeLimitExceeded:
+        status = 'timeout'
+        logger.error('Periodic task receiver %s has been cancelled after its running timeout.', name)
+    except Exception:
+        status = 'error'
+        logger.exception('Periodic task receiver %s failed.', name)
+    finally:
+        eventyay_periodic_task_duration_seconds.observe(time.perf_counter() - t0, receiver=name)
+        eventyay_periodic_task_runs_total.inc(1, receiver=name, status=status)
+        if cache.get(_lock_key(name)) == uniqid:
+            cache.delete(_lock_key(name))
+
+
+@app.task(base=ProfiledTask)
+def run_periodic_tasks():
+    for name, (signal, recv) in get_periodic_receivers().items():
+        if not _is_due(name, recv):
+            continue
+        timeout = _timeout(recv)
+        run_periodic_receiver.apply_async(
+            args=(name,),
+            # A dispatch that waits in the queue for longer than the next one is superseded by it
+            expires=settings.PERIODIC_TASK_DISPATCH_EXPIRES,
+            soft_time_limit=timeout,
+            time_limit=timeout + 60,
+        )
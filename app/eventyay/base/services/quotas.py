@@ -527,6 +527,14 @@ class QuotaAvailability:
                 self.results[q] = Quota.AVAILABILITY_GONE, 0
 
 
+def product_quota_cache_key(subevent_id, channel: str, require_seat) -> str:
+    """
+    Returns the key under which the product lists of an event or date keep the availability of their quotas in the
+    event's cache for a few seconds.
+    """
+    return f'product_quota_cache:{subevent_id or 0}:{channel}:{bool(require_seat)}'
+
+
 def grouper(iterable, n, fillvalue=None):
     """Collect data into fixed-length chunks or blocks"""
     # grouper('ABCDEFG', 3, 'x') --> ABC DEF Gxx
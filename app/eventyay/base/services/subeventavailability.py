@@ -0,0 +1,64 @@
+"""
+Availability of the dates of event series in calendars.
+
+Calendars of large event series show the availability of hundreds or thousands of dates at once. Instead of fetching
+the quotas of all dates and evaluating ``best_availability_state`` for each of them on every page load, the states are
+kept in one record per event, sales channel and month in the event's cache. Dates missing from a record, or whose
+state is older than ``settings.SUBEVENT_AVAILABILITY_TTL`` seconds, are computed together: their active quotas are
+fetched in a single query and their availability is read from the quota availability cache where possible.
+"""
+
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+
+from eventyay.base.models import SubEvent
+from eventyay.base.services.quotas import QuotaAvailability
+
+
+def _month_key(channel: str, subevent: SubEvent) -> str:
+    return 'subevent_availability_{}_{:%Y_%m}'.format(channel, subevent.date_from)
+
+
+def annotate_availability(subevents, channel: str = 'web'):
+    """
+    Sets ``best_availability_state`` on all given subevents, which do not need to be fetched with their
+    ``active_quotas``.
+    """
+    by_event = defaultdict(list)
+    for se in subevents:
+        by_event[se.event_id].append(se)
+
+    min_computed = time.time() - settings.SUBEVENT_AVAILABILITY_TTL
+    records = {}
+    missing = []
+    for event_id, event_subevents in by_event.items():
+        event = event_subevents[0].event
+        records[event_id] = event.cache.get_many({_month_key(channel, se) for se in event_subevents})
+        for se in event_subevents:
+            state, computed = records[event_id].get(_month_key(channel, se), {}).get(se.pk, (None, 0))
+            if computed < min_computed:
+                missing.append(se)
+            else:
+                se.best_availability_state = state
+
+    if not missing:
+        return
+
+    prefetch_related_objects(missing, SubEvent.active_quotas_prefetch(channel))
+    qa = QuotaAvailability()
+    qa.queue(*[q for se in missing for q in se.active_quotas])
+    qa.compute(allow_cache=True)
+
+    computed = time.time()
+    changed = defaultdict(dict)
+    for se in missing:
+        se._quota_cache = qa.results
+        key = _month_key(channel, se)
+        record = changed[se.event_id].setdefault(key, dict(records[se.event_id].get(key, {})))
+        record[se.pk] = (se.best_availability_state, computed)
+
+    for event_id, event_records in changed.items():
+        by_event[event_id][0].event.cache.set_many(event_records, settings.SUBEVENT_AVAILABILITY_TTL * 10)
@@ -0,0 +1,233 @@
+"""
+Generation of the dates of event series.
+
+The bulk creation form of the control panel turns a set of recurrence rules and times of day into dates, which can
+easily be tens of thousands for a daily series with several time slots over a few years. Instead of saving every
+date, quota and check-in list on its own within the request, ``bulk_create_subevents`` generates them in a
+background task: the dates are built in chunks of ``settings.SUBEVENT_BULK_CHUNK_SIZE`` and every chunk is written
+to each related table with one ``bulk_create``, all within a single transaction. Progress is reported after every
+chunk.
+
+Since task arguments need to be serializable, the objects prepared by the forms are passed as dictionaries of their
+field values, see ``dump_instance`` and ``load_instance``.
+"""
+
+import copy
+import itertools
+import json
+from datetime import datetime, time, timedelta
+
+from dateutil.rrule import rruleset, rrulestr
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import make_aware
+
+from eventyay.base.models import (
+    CheckinList,
+    Event,
+    LogEntry,
+    Quota,
+    SubEvent,
+    SubEventMetaValue,
+    SubEventProduct,
+    SubEventProductVariation,
+    User,
+)
+from eventyay.base.reldate import RelativeDateWrapper
+from eventyay.base.services.tasks import ProfiledEventTask
+from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
+from eventyay.helpers.json import CustomJSONEncoder
+
+
+def to_json_data(value):
+    """
+    Returns ``value`` with all values that are not natively supported by JSON (dates, decimals, translated
+    strings, …) converted the same way log entries store them.
+    """
+    return json.loads(json.dumps(value, cls=CustomJSONEncoder))
+
+
+def dump_instance(obj) -> dict:
+    """
+    Returns the field values of an unsaved model instance in a serializable form.
+    """
+    return to_json_data({f.attname: f.value_from_object(obj) for f in obj._meta.concrete_fields if not f.primary_key})
+
+
+def load_instance(model, data: dict):
+    """
+    Creates an unsaved model instance from the result of ``dump_instance``.
+    """
+    obj = model()
+    for f in model._meta.concrete_fields:
+        if f.attname in data:
+            setattr(obj, f.attname, f.to_python(data[f.attname]))
+    return obj
+
+
+def _copies(template, subevents, **kwargs):
+    objs = []
+    for se in subevents:
+        obj = copy.copy(template)
+        obj.pk = None
+        obj.subevent = se
+        for k, v in kwargs.items():
+            setattr(obj, k, v)
+        objs.append(obj)
+    return objs
+
+
+def _rule_set(rules) -> rruleset:
+    s = rruleset()
+    for rule, exclude in rules:
+        if exclude:
+            s.exrule(rrulestr(rule))
+        else:
+            s.rrule(rrulestr(rule))
+    return s
+
+
+def _dates(event, template, rules, times, presale_start, presale_end):
+    tz = event.timezone
+    for rdate in _rule_set(rules):
+        for time_from, time_to, time_admission in times:
+            se = copy.copy(template)
+            se.date_from = make_aware(datetime.combine(rdate, time_from), tz)
+            if time_to:
+                se.date_to = make_aware(
+                    datetime.combine(rdate if time_to > time_from else rdate + timedelta(days=1), time_to), tz
+                )
+            else:
+                se.date_to = None
+            se.date_admission = make_aware(datetime.combine(rdate, time_admission), tz) if time_admission else None
+            se.presale_start = presale_start.datetime(se) if presale_start else None
+            se.presale_end = presale_end.datetime(se) if presale_end else None
+            yield se
+
+
+def _save_chunk(event, user, subevents, meta_values, products, variations, quotas, checkin_lists, log_data):
+    bulk_save(SubEvent, subevents, clear_cache=False)
+    log_entries = [se.log_action('pretix.subevent.added', data=log_data, user=user, save=False) for se in subevents]
+
+    bulk_save(SubEventMetaValue, [v for t in meta_values for v in _copies(t, subevents)])
+    bulk_save(SubEventProduct, [p for t in products for p in _copies(t, subevents)])
+    bulk_save(SubEventProductVariation, [v for t in variations for v in _copies(t, subevents)])
+
+    created_quotas = [(q, _copies(q['quota'], subevents, event=event)) for q in quotas]
+    bulk_save(Quota, [i for q, objs in created_quotas for i in objs], clear_cache=False)
+    product_rels = []
+    variation_rels = []
+    for q, objs in created_quotas:
+        for se, i in zip(subevents, objs):
+            product_rels += [Quota.products.through(quota_id=i.pk, product_id=p) for p in q['products']]
+            variation_rels += [Quota.variations.through(quota_id=i.pk, productvariation_id=v) for v in q['variations']]
+            change_data = dict(q['log_data'], id=i.pk)
+            log_entries.append(i.log_action(action='pretix.event.quota.added', user=user, data=change_data, save=False))
+            log_entries.append(se.log_action('pretix.subevent.quota.added', user=user, data=change_data, save=False))
+    Quota.products.through.objects.bulk_create(product_rels, batch_size=500)
+    Quota.variations.through.objects.bulk_create(variation_rels, batch_size=500)
+
+    created_lists = [(cl, _copies(cl['checkinlist'], subevents, event=event)) for cl in checkin_lists]
+    bulk_save(CheckinList, [i for cl, objs in created_lists for i in objs])
+    product_rels = []
+    for cl, objs in created_lists:
+        for i in objs:
+            product_rels += [
+                CheckinList.limit_products.through(checkinlist_id=i.pk, product_id=p) for p in cl['limit_products']
+            ]
+            log_entries.append(
+                i.log_action(
+                    action='pretix.event.checkinlist.added',
+                    user=user,
+                    data=dict(cl['log_data'], id=i.pk),
+                    save=False,
+                )
+            )
+    CheckinList.limit_products.through.objects.bulk_create(product_rels, batch_size=500)
+
+    bulk_save(LogEntry, log_entries)
+    LogEntry.bulk_postprocess(log_entries)
+
+
+def create_subevents(
+    event: Event,
+    user: User,
+    rules: list,
+    times: list,
+    subevent: dict,
+    presale_start: str = None,
+    presale_end: str = None,
+    meta_values: list = (),
+    products: list = (),
+    variations: list = (),
+    quotas: list = (),
+    checkin_lists: list = (),
+    log_data: dict = None,
+    set_progress=None,
+    on_created=None,
+) -> int:
+    """
+    Creates one date of an event series for every occurrence of the recurrence ``rules`` and every entry of
+    ``times``, together with copies of the given meta values, product settings, quotas and check-in lists.
+
+    :param rules: List of ``(rule, exclude)`` tuples with the string representation of a ``dateutil`` rrule
+    :param times: List of ``(time_from, time_to, time_admission)`` tuples in ISO format, the latter two may be ``None``
+    :param subevent: Dumped ``SubEvent`` all dates are copied from
+    :param presale_start: String representation of a ``RelativeDateWrapper`` relative to each date
+    :param presale_end: String representation of a ``RelativeDateWrapper`` relative to each date
+    :param quotas: List of dictionaries with a dumped ``quota``, the IDs of its ``products`` and ``variations`` and
+                   the ``log_data`` of its creation
+    :param checkin_lists: List of dictionaries with a dumped ``checkinlist``, the IDs of its ``limit_products`` and
+                          the ``log_data`` of its creation
+    :param set_progress: Called with the percentage of dates created so far
+    :param on_created: Called with every chunk of created dates, within the transaction
+    :return: The number of created dates
+    """
+    template = load_instance(SubEvent, subevent)
+    template.event = event
+    times = [
+        [time.fromisoformat(t) if t else None for t in (time_from, time_to, time_admission)]
+        for time_from, time_to, time_admission in times
+    ]
+    dates = _dates(
+        event,
+        template,
+        rules,
+        times,
+        RelativeDateWrapper.from_string(presale_start) if presale_start else None,
+        RelativeDateWrapper.from_string(presale_end) if presale_end else None,
+    )
+
+    meta_values = [load_instance(SubEventMetaValue, v) for v in meta_values]
+    products = [load_instance(SubEventProduct, p) for p in products]
+    variations = [load_instance(SubEventProductVariation, v) for v in variations]
+    quotas = [dict(q, quota=load_instance(Quota, q['quota'])) for q in quotas]
+    checkin_lists = [dict(cl, checkinlist=load_instance(CheckinList, cl['checkinlist'])) for cl in checkin_lists]
+
+    # Iterating over the rules is cheap compared to creating the dates, so they are counted upfront for the progress
+    total = max(_rule_set(rules).count() * len(times), 1)
+    created = 0
+    with transaction.atomic():
+        while True:
+            chunk = list(itertools.islice(dates, settings.SUBEVENT_BULK_CHUNK_SIZE))
+            if not chunk:
+                break
+            _save_chunk(event, user, chunk, meta_values, products, variations, quotas, checkin_lists, log_data)
+            if on_created:
+                on_created(chunk)
+            created += len(chunk)
+            if set_progress:
+                set_progress(created / total * 100)
+
+    event.cache.clear()
+    return created
+
+
+@app.task(base=ProfiledEventTask, bind=True)
+def bulk_create_subevents(self, event: Event, user: int, **kwargs) -> int:
+    def set_progress(val):
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta={'value': val})
+
+    return create_subevents(event, User.objects.get(pk=user), set_progress=set_progress, **kwargs)
@@ -2,6 +2,8 @@ import logging
 import os
 
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
 from django_scopes import scopes_disabled
@@ -17,15 +19,54 @@ from eventyay.base.models import (
 )
 from eventyay.base.services.tasks import EventTask, ProfiledTask
 from eventyay.base.settings import PERSON_NAME_SCHEMES
-from eventyay.base.signals import allow_ticket_download, register_ticket_outputs
+from eventyay.base.signals import (
+    allow_ticket_download,
+    order_paid,
+    register_ticket_outputs,
+)
 from eventyay.celery_app import app
 from eventyay.helpers.database import rolledback_transaction
 
 logger = logging.getLogger(__name__)
 
 
+def get_ticket_cache_version(event: Event) -> int:
+    """
+    Cached tickets are only valid if they have been rendered for the current ticket cache version of their event.
+    Invalidating the cached tickets of a whole event therefore only needs to bump the version, the outdated files are
+    removed in the background by ``clean_outdated_cached_tickets``.
+    """
+    return event.settings.get('ticket_cache_version', as_type=int)
+
+
+def get_cached_ticket(order_position: OrderPosition, provider: str):
+    ct = CachedTicket.objects.filter(
+        order_position=order_position,
+        provider=provider,
+        version=get_ticket_cache_version(order_position.order.event),
+        file__isnull=False,
+    ).last()
+    if not ct or not ct.file:
+        return None
+    return ct
+
+
+def get_cached_combined_ticket(order: Order, provider: str):
+    ct = CachedCombinedTicket.objects.filter(
+        order=order,
+        provider=provider,
+        version=get_ticket_cache_version(order.event),
+        file__isnull=False,
+    ).last()
+    if not ct or not ct.file:
+        return None
+    return ct
+
+
 def generate_orderposition(order_position: int, provider: str):
     order_position = OrderPosition.objects.select_related('order', 'order__event').get(id=order_position)
+    # Read the version before rendering, so a ticket rendered during an invalidation is not considered valid
+    version = get_ticket_cache_version(order_position.order.event)
 
     with language(order_position.order.locale, order_position.order.event.settings.region):
         responses = register_ticket_outputs.send(order_position.order.event)
@@ -34,14 +75,14 @@ def generate_orderposition(order_position: int, provider: str):
             if prov.identifier == provider:
                 filename, ttype, data = prov.generate(order_position)
                 path, ext = os.path.splitext(filename)
-                for ct in CachedTicket.objects.filter(order_position=order_position, provider=provider):
-                    ct.delete()
+                CachedTicket.objects.filter(order_position=order_position, provider=provider).delete()
                 ct = CachedTicket.objects.create(
                     order_position=order_position,
                     provider=provider,
                     extension=ext,
                     type=ttype,
                     file=None,
+                    version=version,
                 )
                 ct.file.save(filename, ContentFile(data))
                 return ct.pk
@@ -49,6 +90,7 @@ def generate_orderposition(order_position: int, provider: str):
 
 def generate_order(order: int, provider: str):
     order = Order.objects.select_related('event').get(id=order)
+    version = get_ticket_cache_version(order.event)
 
     with language(order.locale, order.event.settings.region):
         responses = register_ticket_outputs.send(order.event)
@@ -60,10 +102,9 @@ def generate_order(order: int, provider: str):
                     continue
 
                 path, ext = os.path.splitext(filename)
-                for ct in CachedCombinedTicket.objects.filter(order=order, provider=provider):
-                    ct.delete()
+                CachedCombinedTicket.objects.filter(order=order, provider=provider).delete()
                 ct = CachedCombinedTicket.objects.create(
-                    order=order, provider=provider, extension=ext, type=ttype, file=None
+                    order=order, provider=provider, extension=ext, type=ttype, file=None, version=version
                 )
                 ct.file.save(filename, ContentFile(data))
                 return ct.pk
@@ -160,8 +201,8 @@ def get_tickets_for_order(order, base_position=None):
             try:
                 if len(positions) == 0:
                     continue
-                ct = CachedCombinedTicket.objects.filter(order=order, provider=p.identifier, file__isnull=False).last()
-                if not ct or not ct.file:
+                ct = get_cached_combined_ticket(order, p.identifier)
+                if not ct:
                     retval = generate_order(order.pk, p.identifier)
                     if not retval:
                         continue
@@ -182,10 +223,8 @@ def get_tickets_for_order(order, base_position=None):
         else:
             for pos in positions:
                 try:
-                    ct = CachedTicket.objects.filter(
-                        order_position=pos, provider=p.identifier, file__isnull=False
-                    ).last()
-                    if not ct or not ct.file:
+                    ct = get_cached_ticket(pos, p.identifier)
+                    if not ct:
                         retval = generate_orderposition(pos.pk, p.identifier)
                         if not retval:
                             continue
@@ -221,8 +260,15 @@ def get_tickets_for_order(order, base_position=None):
 
 @app.task(base=EventTask, acks_late=True)
 def invalidate_cache(event: Event, product: int = None, provider: str = None, order: int = None, **kwargs):
-    qs = CachedTicket.objects.filter(order_position__order__event=event)
-    qsc = CachedCombinedTicket.objects.filter(order__event=event)
+    if not order:
+        # Invalidating all tickets of an event, product or provider is just a version bump, regardless of the number
+        # of tickets. This also invalidates the tickets of other products or providers of the event, which are then
+        # rendered again on their next use.
+        event.settings.ticket_cache_version = get_ticket_cache_version(event) + 1
+        return
+
+    qs = CachedTicket.objects.filter(order_position__order__event=event, order_position__order_id=order)
+    qsc = CachedCombinedTicket.objects.filter(order__event=event, order_id=order)
 
     if product:
         qs = qs.filter(order_position__product_id=product)
@@ -231,11 +277,42 @@ def invalidate_cache(event: Event, product: int = None, provider: str = None, or
         qs = qs.filter(provider=provider)
         qsc = qsc.filter(provider=provider)
 
-    if order:
-        qs = qs.filter(order_position__order_id=order)
-        qsc = qsc.filter(order_id=order)
+    qs.delete()
+    qsc.delete()
+
+
+@app.task(base=EventTask, acks_late=True)
+def warm_ticket_cache(event: Event, order: int):
+    """
+    Renders all tickets of a paid order ahead of time, so that neither the order confirmation email nor the first
+    download needs to wait for them.
+    """
+    order = Order.objects.select_related('event').get(pk=order, event=event)
+    if not order.ticket_download_available:
+        return
+    if not all([r for rr, r in allow_ticket_download.send(event, order=order)]):
+        return
+
+    positions = list(order.positions_with_tickets)
+    for recv, response in register_ticket_outputs.send(event):
+        provider = response(event)
+        if not provider.is_enabled:
+            continue
+        try:
+            if (
+                provider.multi_download_enabled
+                and positions
+                and not get_cached_combined_ticket(order, provider.identifier)
+            ):
+                generate_order(order.pk, provider.identifier)
+            for pos in positions:
+                if not get_cached_ticket(pos, provider.identifier):
+                    generate_orderposition(pos.pk, provider.identifier)
+        except:
+            logger.exception('Failed to generate ticket.')
+
 
-    for ct in qs:
-        ct.delete()
-    for ct in qsc:
-        ct.delete()
+@receiver(order_paid, dispatch_uid='eventyaybase_order_paid_warm_tickets')
+def warm_ticket_cache_on_paid(sender: Event, order: Order, **kwargs):
+    if sender.settings.ticket_download:
+        transaction.on_commit(lambda: warm_ticket_cache.apply_async(kwargs={'event': sender.pk, 'order': order.pk}))
@@ -1,16 +1,74 @@
-import sys
+from collections import defaultdict
 from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.dispatch import receiver
 from django.utils.timezone import now
+from django.utils.translation import gettext as _
 from django_scopes import scopes_disabled
 
-from eventyay.base.models import Event, User, WaitingListEntry
-from eventyay.base.models.waitinglist import WaitingListException
+from eventyay.base.email import get_email_context
+from eventyay.base.i18n import language
+from eventyay.base.models import Event, LogEntry, Quota, User, Voucher, WaitingListEntry
+from eventyay.base.models.vouchers import _generate_random_code
+from eventyay.base.services.eventstats import invalidate_event_stats
+from eventyay.base.services.mail import mail, mail_send_batch_task
+from eventyay.base.services.quotas import QuotaAvailability
 from eventyay.base.services.tasks import EventTask
 from eventyay.base.signals import periodic_task
 from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
+
+
+def _generate_voucher_codes(n):
+    codes = set()
+    while len(codes) < n:
+        codes |= {_generate_random_code() for _ in range(n - len(codes))}
+        # Rare collisions with existing vouchers are simply replaced in the next round
+        codes -= set(Voucher.objects.filter(code__in=codes).values_list('code', flat=True))
+    return list(codes)
+
+
+def _get_candidates(event, qs):
+    """
+    Returns the waiting list entries that could currently receive a voucher, in the order in which they should be
+    served, together with the quotas of every (product, variation, date) combination they are waiting for.
+    """
+    now_dt = now()
+    entries = []
+    for wle in qs:
+        ev = wle.subevent or event
+        if not ev.presale_is_running or (wle.subevent and not wle.subevent.active):
+            continue
+        if not wle.product.is_available(now_dt):
+            continue
+        if '@' not in wle.email:  # anonymized
+            continue
+        entries.append(wle)
+
+    keys = {(wle.product_id, wle.variation_id, wle.subevent_id) for wle in entries}
+    event_quotas = {
+        q.pk: q for q in event.quotas.filter(Q(subevent__isnull=True) | Q(subevent_id__in={k[2] for k in keys if k[2]}))
+    }
+    product_quotas = defaultdict(set)
+    for quota_id, product_id in Quota.products.through.objects.filter(quota_id__in=event_quotas.keys()).values_list(
+        'quota_id', 'product_id'
+    ):
+        product_quotas[product_id].add(quota_id)
+    variation_quotas = defaultdict(set)
+    for quota_id, variation_id in Quota.variations.through.objects.filter(quota_id__in=event_quotas.keys()).values_list(
+        'quota_id', 'productvariation_id'
+    ):
+        variation_quotas[variation_id].add(quota_id)
+    quotas = {}
+    for product_id, variation_id, subevent_id in keys:
+        quota_ids = variation_quotas[variation_id] if variation_id else product_quotas[product_id]
+        quotas[product_id, variation_id, subevent_id] = [
+            event_quotas[quota_id] for quota_id in quota_ids if event_quotas[quota_id].subevent_id == subevent_id
+        ]
+    return entries, quotas
 
 
 @app.task(base=EventTask)
@@ -20,13 +78,9 @@ def assign_automatically(event: Event, user_id: int = None, subevent_id: int = N
     else:
         user = None
 
-    quota_cache = {}
-    gone = set()
-
     qs = (
         WaitingListEntry.objects.filter(event=event, voucher__isnull=True)
-        .select_related('item', 'variation', 'subevent')
-        .prefetch_related('item__quotas', 'variation__quotas')
+        .select_related('product', 'variation', 'subevent')
         .order_by('-priority', 'created')
     )
 
@@ -34,49 +88,110 @@ def assign_automatically(event: Event, user_id: int = None, subevent_id: int = N
         subevent = event.subevents.get(id=subevent_id)
         qs = qs.filter(subevent=subevent)
 
-    sent = 0
+    # Everything that does not depend on the current quota usage is prepared before the event is locked
+    entries, quotas = _get_candidates(event, qs)
+    if not entries:
+        return 0
+    valid_until = now() + timedelta(hours=event.settings.waiting_list_hours)
+    codes = _generate_voucher_codes(len(entries))
 
     with event.lock():
-        for wle in qs:
-            if (wle.item, wle.variation, wle.subevent) in gone:
-                continue
-
-            ev = wle.subevent or event
-            if not ev.presale_is_running or (wle.subevent and not wle.subevent.active):
-                continue
-            if wle.subevent and not wle.subevent.presale_is_running:
-                continue
-            if not wle.item.is_available():
-                gone.add((wle.item, wle.variation, wle.subevent))
-                continue
-
-            quotas = (
-                wle.variation.quotas.filter(subevent=wle.subevent)
-                if wle.variation
-                else wle.item.quotas.filter(subevent=wle.subevent)
-            )
-            availability = (
-                wle.variation.check_quotas(count_waitinglist=False, _cache=quota_cache, subevent=wle.subevent)
-                if wle.variation
-                else wle.item.check_quotas(count_waitinglist=False, _cache=quota_cache, subevent=wle.subevent)
+        with transaction.atomic():
+            # Entries might have received a voucher from a concurrent assignment since they have been read
+            unassigned = set(
+                WaitingListEntry.objects.select_for_update()
+                .filter(pk__in=[wle.pk for wle in entries], voucher__isnull=True)
+                .values_list('pk', flat=True)
             )
-            if availability[1] is None or availability[1] > 0:
-                try:
-                    wle.send_voucher(quota_cache, user=user)
-                    sent += 1
-                except WaitingListException:  # noqa
+            entries = [wle for wle in entries if wle.pk in unassigned]
+
+            qa = QuotaAvailability(count_waitinglist=False)
+            qa.queue(*{q for qlist in quotas.values() for q in qlist})
+            qa.compute()
+            # Remaining capacity per quota, None meaning unlimited
+            left = {
+                q: max(0, available) if available is not None else None for q, (state, available) in qa.results.items()
+            }
+
+            assigned = []
+            for wle in entries:
+                wle_quotas = quotas[wle.product_id, wle.variation_id, wle.subevent_id]
+                if not wle_quotas:
+                    # Products without a quota cannot be bought, so a voucher would be of no use
+                    continue
+                # Unlimited quotas never run out and are not in the way of a voucher, as before
+                if any(left[q] is not None and left[q] < 1 for q in wle_quotas):
                     continue
+                for q in wle_quotas:
+                    if left[q] is not None:
+                        left[q] -= 1
+                assigned.append(wle)
 
-                # Reduce affected quotas in cache
-                for q in quotas:
-                    quota_cache[q.pk] = (
-                        quota_cache[q.pk][0] if quota_cache[q.pk][0] > 1 else 0,
-                        quota_cache[q.pk][1] - 1 if quota_cache[q.pk][1] is not None else sys.maxsize,
+            vouchers = []
+            logentries = []
+            for wle, code in zip(assigned, codes):
+                wle.voucher = Voucher(
+                    event=event,
+                    code=code,
+                    max_usages=1,
+                    valid_until=valid_until,
+                    product=wle.product,
+                    variation=wle.variation,
+                    tag='waiting-list',
+                    comment=_('Automatically created from waiting list entry for {email}').format(email=wle.email),
+                    block_quota=True,
+                    subevent=wle.subevent,
+                )
+                vouchers.append(wle.voucher)
+            bulk_save(Voucher, vouchers)
+            WaitingListEntry.objects.bulk_update(assigned, ['voucher'], batch_size=500)
+
+            for wle in assigned:
+                logentries.append(
+                    wle.voucher.log_action(
+                        'eventyay.voucher.added.waitinglist',
+                        {
+                            'product': wle.product_id,
+                            'variation': wle.variation_id,
+                            'tag': 'waiting-list',
+                            'block_quota': True,
+                            'valid_until': valid_until.isoformat(),
+                            'max_usages': 1,
+                            'email': wle.email,
+                            'waitinglistentry': wle.pk,
+                            'subevent': wle.subevent_id,
+                        },
+                        user=user,
+                        save=False,
                     )
-            else:
-                gone.add((wle.item, wle.variation, wle.subevent))
+                )
+                logentries.append(wle.log_action('eventyay.waitinglist.voucher', user=user, save=False))
+            bulk_save(LogEntry, logentries)
+            LogEntry.bulk_postprocess(logentries)
+        if assigned:
+            event.cache.set('vouchers_exist', True)
+            invalidate_event_stats(event)
+
+    # The emails are rendered after the lock has been released and sent in batches by the mail workers
+    messages = []
+    for wle in assigned:
+        with language(wle.locale, event.settings.region):
+            mail(
+                wle.email,
+                _('You have been selected from the waitinglist for {event}').format(event=str(event)),
+                event.settings.mail_text_waiting_list,
+                get_email_context(event=event, waiting_list_entry=wle),
+                event,
+                locale=wle.locale,
+                batch=messages,
+            )
+        if len(messages) >= settings.MAIL_BATCH_SIZE:
+            mail_send_batch_task.apply_async(kwargs={'event': event.pk, 'messages': messages})
+            messages = []
+    if messages:
+        mail_send_batch_task.apply_async(kwargs={'event': event.pk, 'messages': messages})
 
-    return sent
+    return len(assigned)
 
 
 @receiver(signal=periodic_task)
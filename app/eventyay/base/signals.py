@@ -1,3 +1,5 @@
+import sys
+import time
 import warnings
 from typing import Any, Callable, List, Tuple
 
@@ -9,6 +11,9 @@ from django.dispatch.dispatcher import NO_RECEIVERS
 from .models import Event
 
 app_cache = {}
+# Marker for receivers that belong to a core module and are active for every event
+_CORE_MODULE = object()
+_receiver_apps = {}
 
 
 def _populate_app_cache():
@@ -18,13 +23,82 @@ def _populate_app_cache():
         app_cache[ac.name] = ac
 
 
+def _receiver_app(receiver):
+    """
+    Returns the Django application a receiver belongs to, ``_CORE_MODULE`` for receivers of core modules or
+    ``None`` if it does not belong to any application.
+    """
+    searchpath = receiver.__module__
+    try:
+        return _receiver_apps[searchpath]
+    except KeyError:
+        pass
+
+    if searchpath.startswith(tuple(settings.CORE_MODULES)):
+        app = _CORE_MODULE
+    else:
+        while True:
+            app = app_cache.get(searchpath)
+            if '.' not in searchpath or app:
+                break
+            searchpath, _ = searchpath.rsplit('.', 1)
+    _receiver_apps[receiver.__module__] = app
+    return app
+
+
+def _signal_name(signal):
+    """
+    Returns the dotted path of a signal, looked up in the module that created it. Metrics labels must not depend on
+    the process, so there is no fallback to ``repr``.
+    """
+    name = getattr(signal, '_metrics_name', None)
+    if name is None:
+        module = sys.modules.get(signal._module)
+        attr = next((k for k, v in vars(module).items() if v is signal), None) if module else None
+        name = f'{signal._module}.{attr}' if attr else signal._module
+        signal._metrics_name = name
+    return name
+
+
+def _record_timing(signal, receiver, duration):
+    from eventyay.base.metrics import eventyay_signal_receiver_calls_total, eventyay_signal_receiver_seconds_total
+
+    labels = {'signal': _signal_name(signal), 'receiver': f'{receiver.__module__}.{receiver.__qualname__}'}
+    eventyay_signal_receiver_calls_total.inc(1, **labels)
+    eventyay_signal_receiver_seconds_total.inc(duration, **labels)
+
+
 class EventPluginSignal(django.dispatch.Signal):
     """
     This is an extension to Django's built-in signals which differs in a way that it sends
     out its events only to receivers which belong to plugins that are enabled for the given
     Event.
+
+    The receivers that are active for a given set of enabled plugins are computed only once
+    per signal and kept in a dispatch table until receivers are connected or disconnected.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Signals are defined at module level, the module is needed to find the signal's name for the metrics
+        frame = sys._getframe(1)
+        while frame.f_code.co_name == '__init__' and frame.f_back:
+            frame = frame.f_back
+        self._module = frame.f_globals.get('__name__', 'unknown')
+        self._dispatch_tables = {}
+        self._has_sender_receivers = False
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
+        super().connect(receiver, sender=sender, weak=weak, dispatch_uid=dispatch_uid)
+        if sender is not None:
+            self._has_sender_receivers = True
+        self._dispatch_tables = {}
+
+    def disconnect(self, receiver=None, sender=None, dispatch_uid=None):
+        disconnected = super().disconnect(receiver=receiver, sender=sender, dispatch_uid=dispatch_uid)
+        self._dispatch_tables = {}
+        return disconnected
+
     def get_live_receivers(self, sender):
         receivers = self._live_receivers(sender)
         if not receivers:
@@ -36,24 +110,44 @@ class EventPluginSignal(django.dispatch.Signal):
             # Send to all events!
             return True
 
-        # Find the Django application this belongs to
-        searchpath = receiver.__module__
-        core_module = any([searchpath.startswith(cm) for cm in settings.CORE_MODULES])
-        app = None
-        if not core_module:
-            while True:
-                app = app_cache.get(searchpath)
-                if '.' not in searchpath or app:
-                    break
-                searchpath, _ = searchpath.rsplit('.', 1)
+        app = _receiver_app(receiver)
+        if app is _CORE_MODULE:
+            return True
 
         # Only fire receivers from active plugins and core modules
         excluded = settings.PRETIX_PLUGINS_EXCLUDE
-        if core_module or (sender and app and app.name in sender.get_plugins() and app.name not in excluded):
-            if not hasattr(app, 'compatibility_errors') or not app.compatibility_errors:
+        if app and app.name in sender.get_plugins() and app.name not in excluded:
+            if not getattr(app, 'compatibility_errors', None):
                 return True
         return False
 
+    def _active_receivers(self, sender):
+        if not app_cache:
+            _populate_app_cache()
+
+        if sender is None or self._has_sender_receivers:
+            # Receivers connected for a specific sender can not be shared between events
+            return [receiver for receiver in self.get_live_receivers(sender) if self._is_active(sender, receiver)]
+
+        # The set of enabled plugins is the only property of the event that decides which receivers are active
+        tables = self._dispatch_tables
+        key = sender.plugins or ''
+        receivers = tables.get(key)
+        if receivers is None:
+            receivers = [receiver for receiver in self.get_live_receivers(sender) if self._is_active(sender, receiver)]
+            tables[key] = receivers
+        return receivers
+
+    def _call(self, receiver, sender, named):
+        if not settings.METRICS_SIGNAL_TIMING:
+            return receiver(signal=self, sender=sender, **named)
+
+        t0 = time.perf_counter()
+        try:
+            return receiver(signal=self, sender=sender, **named)
+        finally:
+            _record_timing(self, receiver, time.perf_counter() - t0)
+
     def send(self, sender: Event, **named) -> List[Tuple[Callable, Any]]:
         """
         Send signal from sender to all connected receivers that belong to
@@ -68,13 +162,9 @@ class EventPluginSignal(django.dispatch.Signal):
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return responses
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self.get_live_receivers(sender):
-            if self._is_active(sender, receiver):
-                response = receiver(signal=self, sender=sender, **named)
-                responses.append((receiver, response))
+        for receiver in self._active_receivers(sender):
+            response = self._call(receiver, sender, named)
+            responses.append((receiver, response))
         return responses
 
     def send_chained(self, sender: Event, chain_kwarg_name, **named) -> List[Tuple[Callable, Any]]:
@@ -92,13 +182,9 @@ class EventPluginSignal(django.dispatch.Signal):
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return response
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self.get_live_receivers(sender):
-            if self._is_active(sender, receiver):
-                named[chain_kwarg_name] = response
-                response = receiver(signal=self, sender=sender, **named)
+        for receiver in self._active_receivers(sender):
+            named[chain_kwarg_name] = response
+            response = self._call(receiver, sender, named)
         return response
 
     def send_robust(self, sender: Event, **named) -> List[Tuple[Callable, Any]]:
@@ -116,17 +202,13 @@ class EventPluginSignal(django.dispatch.Signal):
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return []
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self.get_live_receivers(sender):
-            if self._is_active(sender, receiver):
-                try:
-                    response = receiver(signal=self, sender=sender, **named)
-                except Exception as err:
-                    responses.append((receiver, err))
-                else:
-                    responses.append((receiver, response))
+        for receiver in self._active_receivers(sender):
+            try:
+                response = self._call(receiver, sender, named)
+            except Exception as err:
+                responses.append((receiver, err))
+            else:
+                responses.append((receiver, response))
         return responses
 
 
@@ -526,11 +608,14 @@ copy to, the ``source`` keyword argument will contain the product to **copy from
 
 periodic_task = django.dispatch.Signal()
 """
-This is a regular django signal (no pretix event signal) that we send out every
-time the periodic task cronjob runs. This interval is not sharply defined, it can
-be everything between a minute and a day. The actions you perform should be
-idempotent, i.e. it should not make a difference if this is sent out more often
-than expected.
+This is a regular django signal (no pretix event signal) whose receivers are called
+periodically. This interval is not sharply defined, it can be everything between a
+minute and a day. The actions you perform should be idempotent, i.e. it should not
+make a difference if this is sent out more often than expected.
+
+Every receiver is run as its own celery task by ``eventyay.base.services.periodic``,
+so receivers run in parallel and are not called with the other receivers of a
+specific run.
 """
 
 register_global_settings = django.dispatch.Signal()
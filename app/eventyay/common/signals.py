@@ -154,11 +154,12 @@ def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_runni
             key_running = f'pretalx_periodic_{func.__module__}.{func.__name__}_running'
             key_result = f'pretalx_periodic_{func.__module__}.{func.__name__}_result'
 
-            if cache.get(key_running) or cache.get(key_result):
+            if cache.get(key_result):
                 return
 
             uniqid = str(uuid.uuid4())
-            cache.set(key_running, uniqid, timeout=minutes_running_timeout * 60)
+            if not cache.add(key_running, uniqid, timeout=minutes_running_timeout * 60):
+                return
             try:
                 retval = func(*args, **kwargs)
             except Exception as e:
@@ -180,6 +181,11 @@ def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_runni
                 except Exception:
                     logger.exception('Could not release lock')
 
+        wrapper.periodic_keys = (
+            f'pretalx_periodic_{func.__module__}.{func.__name__}_running',
+            f'pretalx_periodic_{func.__module__}.{func.__name__}_result',
+        )
+        wrapper.running_timeout = minutes_running_timeout
         return wrapper
 
     return decorate
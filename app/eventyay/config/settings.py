@@ -479,6 +479,14 @@ else:
     EMAIL_USE_TLS = config.getboolean('mail', 'tls')
     EMAIL_USE_SSL = config.getboolean('mail', 'ssl')
 
+# Bulk mailings are sent in chunks over a single connection, optionally throttled to a number of messages per second
+MAIL_BATCH_SIZE = config.getint('mail', 'batch_size', fallback=100)
+MAIL_BATCH_RATE_LIMIT = config.getfloat('mail', 'batch_rate_limit', fallback=0)
+# Inline images of outgoing emails are cached for this many seconds, as long as they are not larger than the limit
+MAIL_IMAGE_CACHE_TTL = config.getint('mail', 'image_cache_ttl', fallback=3600)
+MAIL_IMAGE_CACHE_MAX_SIZE = config.getint('mail', 'image_cache_max_size', fallback=2 * 1024 * 1024)
+MAIL_IMAGE_CACHE_LOCAL_SIZE = config.getint('mail', 'image_cache_local_size', fallback=32 * 1024 * 1024)
+
 # Internal settings
 EVENTYAY_EMAIL_NONE_VALUE = 'info@eventyay.com'
 
@@ -662,6 +670,8 @@ LANGUAGES = [(language['code'], language['name']) for language in LANGUAGES_INFO
 METRICS_ENABLED = config.getboolean('metrics', 'enabled', fallback=False)
 METRICS_USER = config.get('metrics', 'user', fallback='metrics')
 METRICS_PASSPHRASE = config.get('metrics', 'passphrase', fallback='')
+# Record calls and run time of every receiver of an event plugin signal
+METRICS_SIGNAL_TIMING = config.getboolean('metrics', 'signal_timing', fallback=METRICS_ENABLED)
 
 # URL configurations
 SHORT_URL = os.getenv(
@@ -779,6 +789,22 @@ CACHES['redis_sessions'] = {
     'TIMEOUT': 3600 * 24 * 30,
     'OPTIONS': redis_options,
 }
+# Seconds for which namespace prefixes and computed values of namespaced caches are kept in the memory of a process
+CACHE_LOCAL_TTL = config.getint('cache', 'local_ttl', fallback=5)
+CACHE_LOCAL_MAXSIZE = config.getint('cache', 'local_maxsize', fallback=10000)
+# Storage of API calls with an X-Idempotency-Key header, responses are kept for API_IDEMPOTENCY_TTL seconds
+API_IDEMPOTENCY_BACKEND = config.get(
+    'api',
+    'idempotency_backend',
+    fallback=(
+        'eventyay.api.idempotency.RedisIdempotencyBackend'
+        if HAS_REDIS
+        else 'eventyay.api.idempotency.DatabaseIdempotencyBackend'
+    ),
+)
+API_IDEMPOTENCY_TTL = config.getint('api', 'idempotency_ttl', fallback=24 * 3600)
+API_IDEMPOTENCY_LOCK_TIMEOUT = config.getint('api', 'idempotency_lock_timeout', fallback=300)
+API_IDEMPOTENCY_MAX_BODY_SIZE = config.getint('api', 'idempotency_max_body_size', fallback=1024 * 1024)
 
 # Channels (WebSocket) configuration
 CHANNEL_LAYERS = {
@@ -829,6 +855,18 @@ CELERY_TASK_ROUTES = {
     'eventyay.base.services.notifications.*': {'queue': 'notifications'},
     'eventyay.api.webhooks.*': {'queue': 'notifications'},
 }
+CELERY_BEAT_SCHEDULE = {
+    'periodic-tasks': {
+        'task': 'eventyay.base.services.periodic.run_periodic_tasks',
+        'schedule': 60.0,
+    },
+}
+# Minutes after which a receiver of periodic_task is cancelled, unless it defines its own running timeout
+PERIODIC_TASK_TIMEOUT = config.getint('periodic', 'timeout', fallback=30)
+# Seconds after which a dispatched receiver that did not start yet is dropped in favor of a later dispatch
+PERIODIC_TASK_DISPATCH_EXPIRES = config.getint('periodic', 'dispatch_expires', fallback=300)
+# Periodic cleanup deletes objects and expires orders in chunks of this size
+CLEANUP_BATCH_SIZE = config.getint('periodic', 'cleanup_batch_size', fallback=1000)
 
 
 # Static files (CSS, JavaScript, Images)
@@ -881,6 +919,7 @@ HTMLEXPORT_ROOT = Path(
         fallback=str(Path(DATA_DIR) / 'htmlexport'),
     )
 )
+HTMLEXPORT_WORKERS = int(talk_config.get('filesystem', 'htmlexport_workers', fallback='4'))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -985,6 +1024,20 @@ EVENTYAY_SESSION_TIMEOUT_RELATIVE = 3600 * 3
 EVENTYAY_SESSION_TIMEOUT_ABSOLUTE = 3600 * 12
 
 PDFTK = config.get('tools', 'pdftk', fallback=None)
+# Bulk PDF exports of tickets and badges are rendered in chunks of positions, in parallel if more than one worker
+# process is configured
+PDF_RENDER_CHUNK_SIZE = config.getint('pdf', 'render_chunk_size', fallback=200)
+PDF_RENDER_WORKERS = config.getint('pdf', 'render_workers', fallback=1)
+# Order imports are saved in chunks of this many orders, each in its own transaction
+ORDER_IMPORT_CHUNK_SIZE = config.getint('import', 'chunk_size', fallback=500)
+# Dates of event series created in bulk are written in chunks of this many dates
+SUBEVENT_BULK_CHUNK_SIZE = config.getint('subevents', 'bulk_chunk_size', fallback=1000)
+# Dashboard statistics are recomputed after changes, and at the latest after this many seconds
+DASHBOARD_STATS_TTL = config.getint('dashboard', 'stats_ttl', fallback=600)
+# Seconds for which the availability of a date of an event series is reused in calendars
+SUBEVENT_AVAILABILITY_TTL = config.getint('presale', 'subevent_availability_ttl', fallback=60)
+# Seconds for which the rendered product list of an event is reused for visitors without a cart
+PRESALE_PRODUCT_LIST_CACHE_TTL = config.getint('presale', 'product_list_cache_ttl', fallback=60)
 PRETIX_SESSION_TIMEOUT_RELATIVE = 3600 * 3
 PRETIX_SESSION_TIMEOUT_ABSOLUTE = 3600 * 12
 
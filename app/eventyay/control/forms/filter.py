@@ -34,17 +34,18 @@ from eventyay.base.models import (
     EventMetaProperty,
     EventMetaValue,
     Invoice,
-    InvoiceAddress,
     Product,
     Order,
     OrderPayment,
     OrderPosition,
     OrderRefund,
+    OrderSearchDocument,
     Organizer,
     Question,
     QuestionAnswer,
     SubEvent,
 )
+from eventyay.base.services.ordersearch import search_document_q
 from eventyay.base.signals import register_payment_providers
 from eventyay.control.forms.widgets import Select2
 from eventyay.control.signals import order_search_filter_q
@@ -209,38 +210,14 @@ class OrderFilterForm(FilterForm):
         if fdata.get('query'):
             u = fdata.get('query')
 
-            if '-' in u:
-                code = Q(event__slug__icontains=u.rsplit('-', 1)[0]) & Q(
-                    code__icontains=Order.normalize_code(u.rsplit('-', 1)[1])
-                )
-            else:
-                code = Q(code__icontains=Order.normalize_code(u))
-
             matching_invoices = Invoice.objects.filter(
                 Q(invoice_no__iexact=u) | Q(invoice_no__iexact=u.zfill(5)) | Q(full_invoice_no__iexact=u)
             ).values_list('order_id', flat=True)
-            matching_positions = OrderPosition.objects.filter(
-                Q(
-                    Q(attendee_name_cached__icontains=u)
-                    | Q(attendee_email__icontains=u)
-                    | Q(secret__istartswith=u)
-                    | Q(pseudonymization_id__istartswith=u)
-                )
-            ).values_list('order_id', flat=True)
-            matching_invoice_addresses = InvoiceAddress.objects.filter(
-                Q(Q(name_cached__icontains=u) | Q(company__icontains=u))
-            ).values_list('order_id', flat=True)
-            matching_orders = Order.objects.filter(code | Q(email__icontains=u) | Q(comment__icontains=u)).values_list(
-                'id', flat=True
+            matching_documents = OrderSearchDocument.objects.filter(search_document_q(u)).values_list(
+                'order_id', flat=True
             )
 
-            mainq = (
-                Q(pk__in=matching_orders)
-                | Q(pk__in=matching_invoices)
-                | Q(pk__in=matching_positions)
-                | Q(pk__in=matching_invoice_addresses)
-                | Q(pk__in=matching_invoices)
-            )
+            mainq = Q(pk__in=matching_documents) | Q(pk__in=matching_invoices)
             for recv, q in order_search_filter_q.send(sender=getattr(self, 'event', None), query=u):
                 mainq = mainq | q
             qs = qs.filter(mainq)
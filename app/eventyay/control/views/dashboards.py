@@ -1,9 +1,7 @@
 from datetime import timedelta
-from decimal import Decimal
 from zoneinfo import ZoneInfo
 
 import pytz
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import (
     Count,
@@ -12,10 +10,8 @@ from django.db.models import (
     Max,
     Min,
     OuterRef,
-    Prefetch,
     Q,
     Subquery,
-    Sum,
 )
 from django.db.models.functions import Coalesce, Greatest
 from django.dispatch import receiver
@@ -34,9 +30,7 @@ from eventyay.base.decimal import round_decimal
 from eventyay.base.models import (
     Product,
     ProductCategory,
-    ProductVariation,
     Order,
-    OrderPosition,
     OrderRefund,
     Question,
     Quota,
@@ -45,6 +39,7 @@ from eventyay.base.models import (
     Voucher,
     WaitingListEntry,
 )
+from eventyay.base.services.eventstats import get_event_stats
 from eventyay.base.services.quotas import QuotaAvailability
 from eventyay.base.timeline import timeline_for_event
 from eventyay.control.forms.event import CommentForm
@@ -58,6 +53,18 @@ from ...base.models.orders import CancellationRequest
 from ..logdisplay import OVERVIEW_BANLIST
 
 NUM_WIDGET = '<div class="numwidget"><span class="num">{num}</span><span class="text">{text}</span></div>'
+STATS_WIDGET = (
+    '<div class="numwidget" title="{updated}"><span class="num">{num}</span><span class="text">{text}</span></div>'
+)
+
+
+def _stats_widget(event, stats, num, text):
+    updated = date_format(stats['updated'].astimezone(ZoneInfo(event.settings.timezone)), 'SHORT_DATETIME_FORMAT')
+    return STATS_WIDGET.format(
+        num=num,
+        text=text,
+        updated=escape(_('Last updated: {datetime}').format(datetime=updated)),
+    )
 
 
 @receiver(signal=event_dashboard_widgets)
@@ -75,35 +82,19 @@ def base_widgets(sender, subevent=None, lazy=False, **kwargs):
             .count()
         )
 
-        if subevent:
-            opqs = OrderPosition.objects.filter(subevent=subevent)
-        else:
-            opqs = OrderPosition.objects
-
-        tickc = opqs.filter(
-            order__event=sender,
-            product__admission=True,
-            order__status__in=(Order.STATUS_PAID, Order.STATUS_PENDING),
-        ).count()
-
-        paidc = opqs.filter(
-            order__event=sender,
-            product__admission=True,
-            order__status=Order.STATUS_PAID,
-        ).count()
-
-        if subevent:
-            rev = opqs.filter(order__event=sender, order__status=Order.STATUS_PAID).aggregate(sum=Sum('price'))[
-                'sum'
-            ] or Decimal('0.00')
-        else:
-            rev = Order.objects.filter(event=sender, status=Order.STATUS_PAID).aggregate(sum=Sum('total'))[
-                'sum'
-            ] or Decimal('0.00')
+        stats = get_event_stats(sender, subevent)
+        tickc = _stats_widget(sender, stats, stats['tickets_ordered'], _('Attendees (ordered)'))
+        paidc = _stats_widget(sender, stats, stats['tickets_paid'], _('Attendees (paid)'))
+        rev = _stats_widget(
+            sender,
+            stats,
+            formats.localize(round_decimal(stats['revenue'], sender.currency)),
+            _('Total revenue ({currency})').format(currency=sender.currency),
+        )
 
     return [
         {
-            'content': None if lazy else NUM_WIDGET.format(num=tickc, text=_('Attendees (ordered)')),
+            'content': None if lazy else tickc,
             'lazy': 'attendees-ordered',
             'display_size': 'small',
             'priority': 100,
@@ -114,7 +105,7 @@ def base_widgets(sender, subevent=None, lazy=False, **kwargs):
             + ('?subevent={}'.format(subevent.pk) if subevent else ''),
         },
         {
-            'content': None if lazy else NUM_WIDGET.format(num=paidc, text=_('Attendees (paid)')),
+            'content': None if lazy else paidc,
             'lazy': 'attendees-paid',
             'display_size': 'small',
             'priority': 100,
@@ -125,12 +116,7 @@ def base_widgets(sender, subevent=None, lazy=False, **kwargs):
             + ('?subevent={}'.format(subevent.pk) if subevent else ''),
         },
         {
-            'content': None
-            if lazy
-            else NUM_WIDGET.format(
-                num=formats.localize(round_decimal(rev, sender.currency)),
-                text=_('Total revenue ({currency})').format(currency=sender.currency),
-            ),
+            'content': None if lazy else rev,
             'lazy': 'total-revenue',
             'display_size': 'small',
             'priority': 100,
@@ -157,68 +143,19 @@ def base_widgets(sender, subevent=None, lazy=False, **kwargs):
 def waitinglist_widgets(sender, subevent=None, lazy=False, **kwargs):
     widgets = []
 
-    wles = WaitingListEntry.objects.filter(event=sender, subevent=subevent, voucher__isnull=True)
-    if wles.exists():
+    if WaitingListEntry.objects.filter(event=sender, subevent=subevent, voucher__isnull=True).exists():
         if not lazy:
-            quota_cache = {}
-            happy = 0
-            tuples = wles.values('product', 'variation').order_by().annotate(cnt=Count('id'))
-
-            products = {
-                i.pk: i
-                for i in sender.products.filter(id__in=[t['product'] for t in tuples]).prefetch_related(
-                    Prefetch(
-                        'quotas',
-                        to_attr='_subevent_quotas',
-                        queryset=sender.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent),
-                    ),
-                )
-            }
-            vars = {
-                i.pk: i
-                for i in ProductVariation.objects.filter(
-                    product__event=sender,
-                    id__in=[t['variation'] for t in tuples if t['variation']],
-                ).prefetch_related(
-                    Prefetch(
-                        'quotas',
-                        to_attr='_subevent_quotas',
-                        queryset=sender.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent),
-                    ),
-                )
-            }
-
-            for wlt in tuples:
-                product = products.get(wlt['product'])
-                variation = vars.get(wlt['variation'])
-                if not product:
-                    continue
-                quotas = (
-                    variation._get_quotas(subevent=subevent) if variation else product._get_quotas(subevent=subevent)
-                )
-                row = (
-                    variation.check_quotas(subevent=subevent, count_waitinglist=False, _cache=quota_cache)
-                    if variation
-                    else product.check_quotas(subevent=subevent, count_waitinglist=False, _cache=quota_cache)
-                )
-                if row[1] is None:
-                    happy += 1
-                elif row[1] > 0:
-                    happy += 1
-                    for q in quotas:
-                        if q.size is not None:
-                            quota_cache[q.pk] = (
-                                quota_cache[q.pk][0],
-                                quota_cache[q.pk][1] - 1,
-                            )
+            stats = get_event_stats(sender, subevent)
 
         widgets.append(
             {
                 'content': None
                 if lazy
-                else NUM_WIDGET.format(
-                    num=str(happy),
-                    text=_('available to give to people on waiting list'),
+                else _stats_widget(
+                    sender,
+                    stats,
+                    stats['waitinglist_available'],
+                    _('available to give to people on waiting list'),
                 ),
                 'lazy': 'waitinglist-avail',
                 'priority': 50,
@@ -235,7 +172,7 @@ def waitinglist_widgets(sender, subevent=None, lazy=False, **kwargs):
             {
                 'content': None
                 if lazy
-                else NUM_WIDGET.format(num=str(wles.count()), text=_('total waiting list length')),
+                else _stats_widget(sender, stats, stats['waitinglist_length'], _('total waiting list length')),
                 'lazy': 'waitinglist-length',
                 'display_size': 'small',
                 'priority': 50,
@@ -324,14 +261,19 @@ def shop_state_widget(sender, **kwargs):
 def checkin_widget(sender, subevent=None, lazy=False, **kwargs):
     widgets = []
     qs = sender.checkin_lists.filter(subevent=subevent)
+    stats = None if lazy else get_event_stats(sender, subevent)
     for cl in qs:
+        if not lazy:
+            inside, positions = stats['checkins'].get(cl.pk, (cl.inside_count, cl.position_count))
         widgets.append(
             {
                 'content': None
                 if lazy
-                else NUM_WIDGET.format(
-                    num='{}/{}'.format(cl.inside_count, cl.position_count),
-                    text=_('Present – {list}').format(list=escape(cl.name)),
+                else _stats_widget(
+                    sender,
+                    stats,
+                    '{}/{}'.format(inside, positions),
+                    _('Present – {list}').format(list=escape(cl.name)),
                 ),
                 'lazy': 'checkin-{}'.format(cl.pk),
                 'display_size': 'small',
@@ -587,6 +529,9 @@ def widgets_for_event_qs(request, qs, user, nmax, lazy=False):
                 else:
                     dr = date_format(event.date_from.astimezone(tz), 'DATE_FORMAT')
 
+            show_orders = user.has_active_staff_session(request.session.session_key) or event.pk in events_with_orders
+            order_count = event.order_count or 0
+
             if event.has_ra:
                 status = ('danger', _('Action required'))
             elif not event.live:
@@ -630,11 +575,9 @@ def widgets_for_event_qs(request, qs, user, nmax, lazy=False):
                                     'organizer': event.organizer.slug,
                                 },
                             ),
-                            orders_text=ngettext('{num} order', '{num} orders', event.order_count or 0).format(
-                                num=event.order_count or 0
-                            ),
+                            orders_text=ngettext('{num} order', '{num} orders', order_count).format(num=order_count),
                         )
-                        if user.has_active_staff_session(request.session.session_key) or event.pk in events_with_orders
+                        if show_orders
                         else ''
                     ),
                     daterange=dr,
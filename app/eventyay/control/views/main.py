@@ -12,12 +12,15 @@ from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
 from django.views import View
 from django.views.generic import ListView
+from django_scopes import scopes_disabled
 from i18nfield.strings import LazyI18nString
 
 from eventyay.base.forms import SafeSessionWizardView
 from eventyay.base.i18n import language
 from eventyay.base.models import Event, EventMetaValue, Organizer, Quota, Team
+from eventyay.base.services.eventcopy import copy_event_data
 from eventyay.base.services.quotas import QuotaAvailability
+from eventyay.base.views.tasks import AsyncAction
 from eventyay.control.forms.event import (
     EventWizardBasicsForm,
     EventWizardCopyForm,
@@ -111,7 +114,7 @@ def condition_copy(wizard):
     )
 
 
-class EventWizard(SafeSessionWizardView):
+class EventWizard(AsyncAction, SafeSessionWizardView):
     form_list = [
         ('foundation', EventWizardFoundationForm),
         ('basics', EventWizardBasicsForm),
@@ -123,6 +126,8 @@ class EventWizard(SafeSessionWizardView):
         'copy': 'pretixcontrol/events/create_copy.html',
     }
     condition_dict = {'copy': condition_copy}
+    task = copy_event_data
+    known_errortypes = ['EventCopyError']
 
     def get_form_initial(self, step):
         initial = super().get_form_initial(step)
@@ -217,6 +222,31 @@ class EventWizard(SafeSessionWizardView):
     def get_template_names(self):
         return [self.templates[self.steps.current]]
 
+    def get(self, request, *args, **kwargs):
+        if 'async_id' in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return SafeSessionWizardView.get(self, request, *args, **kwargs)
+
+    def get_success_url(self, value):
+        with scopes_disabled():
+            event = Event.objects.select_related('organizer').get(pk=value)
+        return (
+            reverse(
+                'control:event.settings',
+                kwargs={
+                    'organizer': event.organizer.slug,
+                    'event': event.slug,
+                },
+            )
+            + '?congratulations=1'
+        )
+
+    def get_error_url(self):
+        return reverse('control:events')
+
+    def get_success_message(self, value):
+        return None
+
     def done(self, form_list, form_dict, **kwargs):
         foundation_data = self.get_cleaned_data_for_step('foundation')
         basics_data = self.get_cleaned_data_for_step('basics')
@@ -260,30 +290,29 @@ class EventWizard(SafeSessionWizardView):
                 logdata.update({k: v for k, v in f.cleaned_data.items()})
             event.log_action('pretix.event.settings', user=self.request.user, data=logdata)
 
-            if copy_data and copy_data['copy_from_event']:
-                from_event = copy_data['copy_from_event']
-                event.copy_data_from(from_event)
-            elif self.clone_from:
-                event.copy_data_from(self.clone_from)
-            else:
+            copy_from = copy_data['copy_from_event'] if copy_data and copy_data['copy_from_event'] else self.clone_from
+            # Settings chosen in the wizard are not overwritten by those of the copied event
+            skip_settings = ['timezone', 'locale', 'locales']
+            if not copy_from:
                 event.checkin_lists.create(name=_('Default'), all_products=True)
                 event.set_defaults()
 
             if basics_data['tax_rate']:
-                if (
-                    not event.settings.tax_rate_default
-                    or event.settings.tax_rate_default.rate != basics_data['tax_rate']
-                ):
+                tax_rate_default = copy_from.settings.tax_rate_default if copy_from else event.settings.tax_rate_default
+                if not tax_rate_default or tax_rate_default.rate != basics_data['tax_rate']:
                     event.settings.tax_rate_default = event.tax_rules.create(
                         name=LazyI18nString.from_gettext(gettext('VAT')),
                         rate=basics_data['tax_rate'],
                     )
+                    skip_settings.append('tax_rate_default')
 
             event.settings.set('timezone', basics_data['timezone'])
             event.settings.set('locale', basics_data['locale'])
             event.settings.set('locales', foundation_data['locales'])
 
-        if (copy_data and copy_data['copy_from_event']) or self.clone_from or event.has_subevents:
+        if copy_from:
+            return self.do(event.pk, copy_from.pk, skip_attributes=skip_settings)
+        if event.has_subevents:
             return redirect(
                 reverse(
                     'control:event.settings',
@@ -78,7 +78,7 @@ from eventyay.base.models.orders import (
 )
 from eventyay.base.models.tax import cc_to_vat_prefix, is_eu_country
 from eventyay.base.payment import PaymentException
-from eventyay.base.secrets import assign_ticket_secret
+from eventyay.base.secrets import assign_ticket_secrets
 from eventyay.base.services import tickets
 from eventyay.base.services.cancelevent import cancel_event
 from eventyay.base.services.export import export
@@ -109,7 +109,11 @@ from eventyay.base.services.orders import (
     reactivate_order,
 )
 from eventyay.base.services.stats import order_overview
-from eventyay.base.services.tickets import generate
+from eventyay.base.services.tickets import (
+    generate,
+    get_cached_combined_ticket,
+    get_cached_ticket,
+)
 from eventyay.base.signals import (
     order_modified,
     register_data_exporters,
@@ -532,18 +536,8 @@ class OrderDownload(AsyncAction, OrderView):
 
     def get_last_ct(self):
         if 'position' in self.kwargs:
-            ct = CachedTicket.objects.filter(
-                order_position=self.order_position,
-                provider=self.output.identifier,
-                file__isnull=False,
-            ).last()
-        else:
-            ct = CachedCombinedTicket.objects.filter(
-                order=self.order, provider=self.output.identifier, file__isnull=False
-            ).last()
-        if not ct or not ct.file:
-            return None
-        return ct
+            return get_cached_ticket(self.order_position, self.output.identifier)
+        return get_cached_combined_ticket(self.order, self.output.identifier)
 
 
 class OrderComment(OrderView):
@@ -2165,13 +2159,11 @@ class OrderContactChange(OrderView):
             if self.form.cleaned_data['regenerate_secrets']:
                 changed = True
                 self.order.secret = generate_secret()
-                for op in self.order.all_positions.all():
-                    assign_ticket_secret(
-                        self.request.event,
-                        position=op,
-                        force_invalidate=True,
-                        save=True,
-                    )
+                assign_ticket_secrets(
+                    self.request.event,
+                    positions=self.order.all_positions.select_related('product', 'variation', 'subevent'),
+                    force_invalidate=True,
+                )
                 tickets.invalidate_cache.apply_async(kwargs={'event': self.request.event.pk, 'order': self.order.pk})
                 self.order.log_action('pretix.event.order.secret.changed', user=self.request.user)
 
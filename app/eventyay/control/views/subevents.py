@@ -1,8 +1,9 @@
 import copy
 from collections import defaultdict
-from datetime import datetime, time, timedelta
+from datetime import time
 
-from dateutil.rrule import DAILY, MONTHLY, WEEKLY, YEARLY, rrule, rruleset
+from dateutil.rrule import DAILY, MONTHLY, WEEKLY, YEARLY, rrule
+from django.conf import settings
 from django.contrib import messages
 from django.core.files import File
 from django.db import connections, transaction
@@ -14,7 +15,6 @@ from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils.formats import get_format
 from django.utils.functional import cached_property
-from django.utils.timezone import make_aware
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import pgettext_lazy
 from django.views import View
@@ -38,6 +38,13 @@ from eventyay.base.models.product import (
 from eventyay.base.reldate import RelativeDate, RelativeDateWrapper
 from eventyay.base.services import tickets
 from eventyay.base.services.quotas import QuotaAvailability
+from eventyay.base.services.subevents import (
+    bulk_create_subevents,
+    create_subevents,
+    dump_instance,
+    to_json_data,
+)
+from eventyay.base.views.tasks import AsyncAction
 from eventyay.control.forms.checkin import SimpleCheckinListForm
 from eventyay.control.forms.filter import SubEventFilterForm
 from eventyay.control.forms.product import QuotaForm
@@ -696,17 +703,18 @@ class SubEventBulkAction(SubEventQueryMixin, EventPermissionRequiredMixin, View)
         )
 
 
-class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, CreateView):
+class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, AsyncAction, CreateView):
     model = SubEvent
     template_name = 'pretixcontrol/subevents/bulk.html'
     permission = 'can_change_settings'
     context_object_name = 'subevent'
     form_class = SubEventBulkForm
+    task = bulk_create_subevents
 
     def is_valid(self, form):
         return self.rrule_formset.is_valid() and self.time_formset.is_valid() and super().is_valid(form)
 
-    def get_success_url(self) -> str:
+    def get_success_url(self, value=None) -> str:
         return reverse(
             'control:event.subevents',
             kwargs={
@@ -811,8 +819,8 @@ class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, Crea
             times.append(f.cleaned_data)
         return times
 
-    def get_rrule_set(self):
-        s = rruleset()
+    def get_rrules(self):
+        rules = []
         for f in self.rrule_formset:
             if f in self.rrule_formset.deleted_forms:
                 continue
@@ -848,50 +856,11 @@ class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, Crea
             else:
                 rule_kwargs['until'] = f.cleaned_data['until']
 
-            if f.cleaned_data['exclude']:
-                s.exrule(rrule(freq, **rule_kwargs))
-            else:
-                s.rrule(rrule(freq, **rule_kwargs))
+            rules.append((str(rrule(freq, **rule_kwargs)), bool(f.cleaned_data['exclude'])))
 
-        return s
+        return rules
 
-    @transaction.atomic
     def form_valid(self, form):
-        tz = self.request.event.timezone
-        subevents = []
-        for rdate in self.get_rrule_set():
-            for t in self.get_times():
-                se = copy.copy(form.instance)
-
-                se.date_from = make_aware(datetime.combine(rdate, t['time_from']), tz)
-
-                if t.get('time_to'):
-                    se.date_to = (
-                        make_aware(datetime.combine(rdate, t['time_to']), tz)
-                        if t.get('time_to') > t.get('time_from')
-                        else make_aware(
-                            datetime.combine(rdate + timedelta(days=1), t['time_to']),
-                            tz,
-                        )
-                    )
-                else:
-                    se.date_to = None
-                se.date_admission = (
-                    make_aware(datetime.combine(rdate, t['time_admission']), tz) if t.get('time_admission') else None
-                )
-                se.presale_start = (
-                    form.cleaned_data['rel_presale_start'].datetime(se)
-                    if form.cleaned_data.get('rel_presale_start')
-                    else None
-                )
-                se.presale_end = (
-                    form.cleaned_data['rel_presale_end'].datetime(se)
-                    if form.cleaned_data.get('rel_presale_end')
-                    else None
-                )
-                se.save(clear_cache=False)
-                subevents.append(se)
-
         data = dict(form.cleaned_data)
         for f in self.plugin_forms:
             data.update(
@@ -902,143 +871,101 @@ class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, Crea
                     for k in f.cleaned_data
                 }
             )
-        log_entries = []
-        for se in subevents:
-            log_entries.append(
-                se.log_action(
-                    'pretix.subevent.added',
-                    data=data,
-                    user=self.request.user,
-                    save=False,
-                )
-            )
 
-        to_save = []
-        for f in self.meta_forms:
-            if f.cleaned_data.get('value'):
-                for se in subevents:
-                    i = copy.copy(f.instance)
-                    i.pk = None
-                    i.subevent = se
-                    to_save.append(i)
-        SubEventMetaValue.objects.bulk_create(to_save)
-
-        to_save_products = []
-        to_save_variations = []
-        for f in self.productvar_forms:
-            for se in subevents:
-                i = copy.copy(f.instance)
-                i.pk = None
-                i.subevent = se
-                if isinstance(i, SubEventProduct):
-                    to_save_products.append(i)
-                else:
-                    to_save_variations.append(i)
-        SubEventProduct.objects.bulk_create(to_save_products)
-        SubEventProductVariation.objects.bulk_create(to_save_variations)
-
-        to_save_products = []
-        to_save_variations = []
+        quotas = []
         for f in self.formset.forms:
             if self.formset._should_delete_form(f) or not f.has_changed():
                 continue
-
-            change_data = {k: f.cleaned_data.get(k) for k in f.changed_data}
-            for se in subevents:
-                i = copy.copy(f.instance)
-                i.pk = None
-                i.subevent = se
-                i.event = se.event
-                i.save(clear_cache=False)
-                selected_products = set(
-                    list(
-                        self.request.event.products.filter(
-                            id__in=[i.split('-')[0] for i in f.cleaned_data.get('productvars', [])]
+            productvars = f.cleaned_data.get('productvars', [])
+            quotas.append(
+                {
+                    'quota': dump_instance(f.instance),
+                    'products': list(
+                        self.request.event.products.filter(id__in=[i.split('-')[0] for i in productvars]).values_list(
+                            'pk', flat=True
                         )
-                    )
-                )
-                selected_variations = list(
-                    ProductVariation.objects.filter(
-                        product__event=self.request.event,
-                        id__in=[i.split('-')[1] for i in f.cleaned_data.get('productvars', []) if '-' in i],
-                    )
-                )
-                for _i in selected_products:
-                    to_save_products.append(Quota.products.through(quota_id=i.pk, product_id=_i.pk))
-                for _i in selected_variations:
-                    to_save_variations.append(Quota.variations.through(quota_id=i.pk, productvariation_id=_i.pk))
-
-                change_data['id'] = i.pk
-                log_entries.append(
-                    i.log_action(
-                        action='pretix.event.quota.added',
-                        user=self.request.user,
-                        data=change_data,
-                        save=False,
-                    )
-                )
-                log_entries.append(
-                    se.log_action(
-                        'pretix.subevent.quota.added',
-                        user=self.request.user,
-                        data=change_data,
-                        save=False,
-                    )
-                )
-        Quota.products.through.objects.bulk_create(to_save_products)
-        Quota.variations.through.objects.bulk_create(to_save_variations)
+                    ),
+                    'variations': list(
+                        ProductVariation.objects.filter(
+                            product__event=self.request.event,
+                            id__in=[i.split('-')[1] for i in productvars if '-' in i],
+                        ).values_list('pk', flat=True)
+                    ),
+                    'log_data': to_json_data({k: f.cleaned_data.get(k) for k in f.changed_data}),
+                }
+            )
 
-        to_save_products = []
+        checkin_lists = []
         for f in self.cl_formset.forms:
             if self.cl_formset._should_delete_form(f) or not f.has_changed():
                 continue
-            change_data = {k: f.cleaned_data.get(k) for k in f.changed_data}
-            for se in subevents:
-                i = copy.copy(f.instance)
-                i.subevent = se
-                i.event = se.event
-                i.save()
-                for _i in f.cleaned_data.get('limit_products', []):
-                    to_save_products.append(CheckinList.limit_products.through(checkinlist_id=i.pk, product_id=_i.pk))
-
-                change_data['id'] = i.pk
-                log_entries.append(
-                    i.log_action(
-                        action='pretix.event.checkinlist.added',
-                        user=self.request.user,
-                        data=change_data,
-                        save=False,
-                    )
-                )
-        CheckinList.limit_products.through.objects.bulk_create(to_save_products)
+            checkin_lists.append(
+                {
+                    'checkinlist': dump_instance(f.instance),
+                    'limit_products': [p.pk for p in f.cleaned_data.get('limit_products', [])],
+                    'log_data': to_json_data({k: f.cleaned_data.get(k) for k in f.changed_data}),
+                }
+            )
 
-        for f in self.plugin_forms:
-            f.is_valid()
-            for se in subevents:
-                f.subevent = se
-                f.save()
+        kwargs = {
+            'rules': self.get_rrules(),
+            'times': [
+                [t[k].isoformat() if t.get(k) else None for k in ('time_from', 'time_to', 'time_admission')]
+                for t in self.get_times()
+            ],
+            'subevent': dump_instance(form.instance),
+            'presale_start': (
+                form.cleaned_data['rel_presale_start'].to_string()
+                if form.cleaned_data.get('rel_presale_start')
+                else None
+            ),
+            'presale_end': (
+                form.cleaned_data['rel_presale_end'].to_string() if form.cleaned_data.get('rel_presale_end') else None
+            ),
+            'meta_values': [dump_instance(f.instance) for f in self.meta_forms if f.cleaned_data.get('value')],
+            'products': [
+                dump_instance(f.instance) for f in self.productvar_forms if isinstance(f.instance, SubEventProduct)
+            ],
+            'variations': [
+                dump_instance(f.instance)
+                for f in self.productvar_forms
+                if isinstance(f.instance, SubEventProductVariation)
+            ],
+            'quotas': quotas,
+            'checkin_lists': checkin_lists,
+            'log_data': to_json_data(data),
+        }
 
-        if connections['default'].features.can_return_rows_from_bulk_insert:
-            LogEntry.objects.bulk_create(log_entries)
-            LogEntry.bulk_postprocess(log_entries)
-        else:
-            for le in log_entries:
-                le.save()
-            LogEntry.bulk_postprocess(log_entries)
+        if self.plugin_forms:
+            # Plugin forms can not be passed to a background task, so they are saved for each date right away
+            def save_plugin_forms(subevents):
+                for f in self.plugin_forms:
+                    f.is_valid()
+                    for se in subevents:
+                        f.subevent = se
+                        f.save()
 
-        self.request.event.cache.clear()
-        messages.success(
-            self.request,
-            pgettext_lazy('subevent', '{} new dates have been created.').format(len(subevents)),
-        )
-        return redirect(
-            reverse(
-                'control:event.subevents',
-                kwargs={
-                    'organizer': self.request.event.organizer.slug,
-                    'event': self.request.event.slug,
-                },
+            return self.success(
+                create_subevents(self.request.event, self.request.user, on_created=save_plugin_forms, **kwargs)
             )
+
+        return self.do(self.request.event.pk, user=self.request.user.pk, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        if 'async_id' in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return super().get(request, *args, **kwargs)
+
+    def get_success_message(self, value):
+        return pgettext_lazy('subevent', '{} new dates have been created.').format(value)
+
+    def get_error_url(self):
+        return reverse(
+            'control:event.subevents.bulk',
+            kwargs={
+                'organizer': self.request.event.organizer.slug,
+                'event': self.request.event.slug,
+            },
         )
 
     def post(self, request, *args, **kwargs):
@@ -1,6 +1,6 @@
 import contextlib
 
-from django.db import connection, transaction
+from django.db import connection, connections, transaction
 from django.db.models import Aggregate, Field, Lookup
 from django.db.models.expressions import OrderBy
 from django.utils.functional import lazy
@@ -39,6 +39,19 @@ def casual_reads():
     yield
 
 
+def bulk_save(model, objs, **save_kwargs):
+    """
+    Inserts ``objs`` with ``bulk_create`` if the database returns the primary keys of the inserted rows, which the
+    callers rely on, e.g. to log the objects or to pass log entries to ``LogEntry.bulk_postprocess``. Otherwise every
+    object is saved on its own with ``save_kwargs``.
+    """
+    if connections['default'].features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(objs, batch_size=500)
+    else:
+        for obj in objs:
+            obj.save(**save_kwargs)
+
+
 class FixedOrderBy(OrderBy):
     # Workaround for https://code.djangoproject.com/ticket/28848
     template = '%(expression)s %(ordering)s'
@@ -16,8 +16,12 @@ def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_runni
     isn't executed less than ``minutes_after_success`` after the last successful run and no less
     than ``minutes_after_error`` after the last failed run. There's also a simple locking mechanism
     implemented making sure the function is not called a second time while it is running, unless
-    ``minutes_running_timeout`` have passed. This locking mechanism is naive and not safe of
-    race-conditions, it should not be relied upon.
+    ``minutes_running_timeout`` have passed. The lock is acquired atomically, but relies on the
+    cache being shared between all processes.
+
+    The cache keys and the running timeout are exposed as attributes of the decorated function, so
+    that the scheduler in ``eventyay.base.services.periodic`` does not dispatch receivers that would
+    skip anyway.
     """
 
     def deco(f):
@@ -26,18 +30,15 @@ def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_runni
             key_running = f'pretix_periodic_{f.__module__}.{f.__name__}_running'
             key_result = f'pretix_periodic_{f.__module__}.{f.__name__}_result'
 
-            running_val = cache.get(key_running)
-            if running_val:
-                # Currently running
-                return SKIPPED
-
             result_val = cache.get(key_result)
             if result_val:
                 # Has run recently
                 return SKIPPED
 
             uniqid = str(uuid.uuid4())
-            cache.set(key_running, uniqid, timeout=minutes_running_timeout * 60)
+            if not cache.add(key_running, uniqid, timeout=minutes_running_timeout * 60):
+                # Currently running
+                return SKIPPED
             try:
                 retval = f(*args, **kwargs)
             except Exception as e:
@@ -59,6 +60,11 @@ def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_runni
                 except:
                     logger.exception('Could not release lock')
 
+        wrapper.periodic_keys = (
+            f'pretix_periodic_{f.__module__}.{f.__name__}_running',
+            f'pretix_periodic_{f.__module__}.{f.__name__}_result',
+        )
+        wrapper.running_timeout = minutes_running_timeout
         return wrapper
 
     return deco
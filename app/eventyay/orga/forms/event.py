@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.core.validators import RegexValidator
+from django.db import transaction
 from django.db.models import F, Q
 from django.forms import inlineformset_factory
 from django.utils.text import format_lazy
@@ -35,6 +36,7 @@ from eventyay.common.text.css import validate_css
 from eventyay.common.text.phrases import phrases
 from eventyay.base.models import Event, EventExtraLink
 from eventyay.orga.forms.widgets import HeaderSelect, MultipleLanguagesWidget
+from eventyay.schedule.availability import invalidate_availability_index
 from eventyay.base.models import Availability, TalkSlot
 from eventyay.base.models import ReviewPhase, ReviewScore, ReviewScoreCategory
 
@@ -312,6 +314,9 @@ class EventForm(ReadOnlyFlag, I18nHelpText, JsonSubfieldMixin, I18nModelForm):
             update = {key: F(key) + delta}
             talk_queryset.filter(**filt).update(**update)
             Availability.objects.filter(event=self.instance).filter(**filt).update(**update)
+        # Queryset updates do not send post_save, so the availability index has to be dropped here
+        event_id = self.instance.pk
+        transaction.on_commit(lambda: invalidate_availability_index(event_id))
 
     class Meta:
         model = Event
@@ -1,4 +1,3 @@
-import collections
 import datetime as dt
 import json
 import logging
@@ -33,8 +32,9 @@ from eventyay.common.views.mixins import (
     PermissionRequired,
 )
 from eventyay.orga.forms.schedule import ScheduleExportForm, ScheduleReleaseForm
+from eventyay.schedule.availability import get_availability_index, to_availabilities
 from eventyay.schedule.forms import QuickScheduleForm, RoomForm
-from eventyay.base.models import Availability, Room, TalkSlot
+from eventyay.base.models import Room, TalkSlot
 
 SCRIPT_SRC = "'self' 'unsafe-eval'"
 DEFAULT_SRC = "'self'"
@@ -370,42 +370,27 @@ class ScheduleAvailabilities(EventPermissionRequired, View):
     def _get_room_availabilities(self):
         # Serializing by hand because it's faster and we don't need
         # IDs or allDay
+        index = get_availability_index(self.request.event)
         return {
-            room.pk: [av.serialize(full=False) for av in room.availabilities.all()]
-            for room in self.request.event.rooms.all().prefetch_related('availabilities')
+            room.pk: [av.serialize(full=False) for av in to_availabilities(index.rooms.get(room.pk, []))]
+            for room in self.request.event.rooms.all()
         }
 
     def _get_speaker_availabilities(self):
         # Serializing by hand because it's faster and we don't need
         # IDs or allDay
-        speaker_avails = collections.defaultdict(list)
-        for avail in self.request.event.availabilities.filter(person__isnull=False).select_related('person__user'):
-            speaker_avails[avail.person.user.pk].append(avail)
-
-        result = {}
-
-        for talk in (
-            self.request.event.wip_schedule.talks.filter(submission__isnull=False)
-            .select_related('submission')
-            .prefetch_related('submission__speakers')
-        ):
-            if talk.submission.speakers.count() == 1:
-                result[talk.id] = [
-                    av.serialize(full=False) for av in speaker_avails[talk.submission.speakers.first().pk]
-                ]
-            else:
-                all_speaker_avails = [
-                    speaker_avails[speaker.pk]
-                    for speaker in talk.submission.speakers.all()
-                    if speaker_avails[speaker.pk]
-                ]
-                if not all_speaker_avails:
-                    result[talk.id] = []
-                else:
-                    result[talk.id] = [
-                        av.serialize(full=False) for av in Availability.intersection(*all_speaker_avails)
-                    ]
-        return result
+        index = get_availability_index(self.request.event)
+        return {
+            talk.id: [
+                av.serialize(full=False)
+                for av in to_availabilities(index.for_users(speaker.pk for speaker in talk.submission.speakers.all()))
+            ]
+            for talk in (
+                self.request.event.wip_schedule.talks.filter(submission__isnull=False)
+                .select_related('submission')
+                .prefetch_related('submission__speakers')
+            )
+        }
 
 
 class TalkUpdate(PermissionRequired, View):
@@ -1,5 +1,5 @@
-import copy
 import json
+import logging
 from collections import OrderedDict
 from datetime import datetime, time, timedelta
 from io import BytesIO
@@ -23,14 +23,16 @@ from reportlab.pdfgen import canvas
 
 from eventyay.base.exporter import BaseExporter
 from eventyay.base.i18n import language
-from eventyay.base.models import Order, OrderPosition
-from eventyay.base.pdf import Renderer
+from eventyay.base.models import Event, Order, OrderPosition
+from eventyay.base.pdf import Renderer, draw_background_forms, render_in_chunks
 from eventyay.base.services.orders import OrderError
 from eventyay.base.settings import PERSON_NAME_SCHEMES
 from eventyay.plugins.badges.models import BadgeProduct, BadgeLayout
 
 from ...helpers.templatetags.jsonfield import JSONExtract
 
+logger = logging.getLogger(__name__)
+
 
 def _renderer(event, layout):
     if layout is None:
@@ -187,10 +189,26 @@ def render_pdf(event, positions, opt):
 
     any = False
     npp = opt['cols'] * opt['rows']
+    background_forms = {}
+
+    def background_form(r):
+        if r not in background_forms:
+            background_forms[r] = (
+                '/EventyayBackground%d' % len(background_forms),
+                r._add_background_form(output_pdf_writer),
+            )
+        return background_forms[r]
 
     def render_page(positions):
+        # Without a layout, every page holds a single badge and is as large as its background
+        pagesize = opt['pagesize']
+        if not pagesize:
+            bg_pdf = positions[0][1].bg_pdf
+            pagesize = (
+                (float(bg_pdf.pages[0].mediabox[2]), float(bg_pdf.pages[0].mediabox[3])) if bg_pdf else pagesizes.A4
+            )
         buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=pagesizes.A4)
+        p = canvas.Canvas(buffer, pagesize=pagesize)
         for i, (op, r) in enumerate(positions):
             offsetx = opt['margins'][3] + (i % opt['cols']) * opt['offsets'][0]
             offsety = opt['margins'][2] + (opt['rows'] - 1 - i // opt['cols']) * opt['offsets'][1]
@@ -199,18 +217,32 @@ def render_pdf(event, positions, opt):
                 r.draw_page(p, op.order, op, show_page=False)
             p.translate(-offsetx, -offsety)
 
-        if opt['pagesize']:
-            p.setPageSize(opt['pagesize'])
+        p.setPageSize(pagesize)
         p.showPage()
         p.save()
         buffer.seek(0)
         canvas_pdf_reader = PdfReader(buffer)
-        empty_pdf_page = output_pdf_writer.add_blank_page(
-            width=opt['pagesize'][0] if opt['pagesize'] else positions[0][1].bg_pdf.pages[0].mediabox[2],
-            height=opt['pagesize'][1] if opt['pagesize'] else positions[0][1].bg_pdf.pages[0].mediabox[3],
-        )
+        try:
+            forms = [
+                (
+                    *background_form(r),
+                    opt['margins'][3] + (i % opt['cols']) * opt['offsets'][0],
+                    opt['margins'][2] + (opt['rows'] - 1 - i // opt['cols']) * opt['offsets'][1],
+                )
+                for i, (op, r) in enumerate(positions)
+            ]
+        except Exception:
+            logger.exception('Could not use the background as a form, falling back to merging it into every page')
+        else:
+            # Every badge background of the export is stored only once and referenced by all pages showing it
+            draw_background_forms(output_pdf_writer.add_page(canvas_pdf_reader.pages[0]), forms)
+            return
+
+        empty_pdf_page = output_pdf_writer.add_blank_page(width=pagesize[0], height=pagesize[1])
         for i, (op, r) in enumerate(positions):
-            bg_page = copy.copy(r.bg_pdf.pages[0])
+            # Transforming a shallow copy of the background page would change the content stream it shares with all
+            # other copies, so every badge gets a freshly parsed page
+            bg_page = PdfReader(BytesIO(r.bg_bytes), strict=False).pages[0]
             offsetx = opt['margins'][3] + (i % opt['cols']) * opt['offsets'][0]
             offsety = opt['margins'][2] + (opt['rows'] - 1 - i // opt['cols']) * opt['offsets'][1]
             bg_page.add_transformation(Transformation().translate(offsetx, offsety))
@@ -245,6 +277,19 @@ def render_pdf(event, positions, opt):
     return outbuffer
 
 
+def _render_badges(chunk):
+    event_id, position_ids, rendering = chunk
+    event = Event.objects.get(pk=event_id)
+    positions = (
+        OrderPosition.objects.filter(pk__in=position_ids)
+        .prefetch_related('answers', 'answers__question')
+        .select_related('order', 'product', 'variation', 'addon_to')
+    )
+    index = {pk: i for i, pk in enumerate(position_ids)}
+    positions = sorted(positions, key=lambda op: index[op.pk])
+    return render_pdf(event, positions, OPTIONS[rendering]).getvalue()
+
+
 class BadgeExporter(BaseExporter):
     identifier = 'badges'
     verbose_name = _('Attendee badges')
@@ -331,11 +376,7 @@ class BadgeExporter(BaseExporter):
         return d
 
     def render(self, form_data: dict) -> Tuple[str, str, str]:
-        qs = (
-            OrderPosition.objects.filter(order__event=self.event, product_id__in=form_data['products'])
-            .prefetch_related('answers', 'answers__question')
-            .select_related('order', 'product', 'variation', 'addon_to')
-        )
+        qs = OrderPosition.objects.filter(order__event=self.event, product_id__in=form_data['products'])
 
         if not form_data.get('include_addons'):
             qs = qs.filter(addon_to__isnull=True)
@@ -387,5 +428,30 @@ class BadgeExporter(BaseExporter):
                 .order_by('resolved_name_part')
             )
 
-        outbuffer = render_pdf(self.event, qs, OPTIONS[form_data.get('rendering', 'one')])
+        # Positions without a badge are filtered out beforehand, so that the badges are laid out on the pages
+        # exactly as if they were rendered in one go
+        qs = qs.exclude(Exists(BadgeProduct.objects.filter(product=OuterRef('product'), layout__isnull=True)))
+        if not self.event.badge_layouts.filter(default=True).exists():
+            qs = qs.filter(Exists(BadgeProduct.objects.filter(product=OuterRef('product'))))
+        position_ids = list(qs.values_list('pk', flat=True))
+        if not position_ids:
+            raise OrderError(_('None of the selected products is configured to print badges.'))
+
+        rendering = form_data.get('rendering', 'one')
+        opt = OPTIONS[rendering]
+        npp = opt['cols'] * opt['rows']
+        chunk_size = max(npp, settings.PDF_RENDER_CHUNK_SIZE // npp * npp)
+        chunks = [
+            (self.event.pk, position_ids[i : i + chunk_size], rendering)
+            for i in range(0, len(position_ids), chunk_size)
+        ]
+        outbuffer = render_in_chunks(
+            _render_badges,
+            chunks,
+            progress_callback=self.progress_callback,
+            metadata={
+                '/Title': 'Badges',
+                '/Creator': 'eventyay',
+            },
+        )
         return 'badges.pdf', 'application/pdf', outbuffer.read()
@@ -20,6 +20,7 @@ from eventyay.base.services.mail import SendMailException
 from eventyay.base.services.orders import change_payment_provider
 from eventyay.base.services.tasks import TransactionAwareTask
 from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
 
 from .models import BankImportJob, BankTransaction
 
@@ -68,47 +69,104 @@ def cancel_old_payments(order):
             )
 
 
-def _find_order_for_code(base_qs, code):
-    try_codes = [
+class ReferenceMatcher:
+    """
+    Finds order references, i.e. an event slug followed by an order code, in the reference texts of bank
+    transactions. The slugs are kept in a trie, so that every position of a text is only compared with the slugs
+    actually starting with the character at that position, instead of with all slugs of the organizer. Dashes in a
+    slug match any number of dashes in the text, including none.
+    """
+
+    def __init__(self, slugs: list, min_code_length: int, max_code_length: int):
+        self.slugs = slugs
+        self.trie = {}
+        for i, slug in enumerate(slugs):
+            node = self.trie
+            for char in slug.upper():
+                node = node.setdefault(char, {})
+            node.setdefault(None, i)
+        self.code_pattern = re.compile('[ \\-_]*([A-Z0-9]{%s,%s})' % (min_code_length, max_code_length))
+
+    def _slugs_at(self, text: str, pos: int):
+        """
+        Returns ``(index, end)`` tuples for all slugs found at the given position of the text, in the order of
+        ``slugs``.
+        """
+        found = set()
+        stack = [(self.trie, pos)]
+        while stack:
+            node, i = stack.pop()
+            if None in node:
+                found.add((node[None], -i))
+            if i < len(text) and text[i] in node:
+                stack.append((node[text[i]], i + 1))
+            if '-' in node:
+                stack.append((node['-'], i))
+                while i < len(text) and text[i] == '-':
+                    i += 1
+                    stack.append((node['-'], i))
+        return [(index, -end) for index, end in sorted(found)]
+
+    def findall(self, text: str) -> list:
+        """
+        Returns a list of ``(slug, code)`` tuples for all non-overlapping order references in the given text.
+        """
+        matches = []
+        pos = 0
+        while pos < len(text):
+            if text[pos] in self.trie:
+                for index, end in self._slugs_at(text, pos):
+                    m = self.code_pattern.match(text, end)
+                    if m:
+                        matches.append((self.slugs[index], m.group(1)))
+                        pos = m.end()
+                        break
+                else:
+                    pos += 1
+            else:
+                pos += 1
+        return matches
+
+
+def _try_codes(code):
+    return [
         code,
         Order.normalize_code(code, is_fallback=True),
         code[: settings.ENTROPY['order_code']],
         Order.normalize_code(code[: settings.ENTROPY['order_code']], is_fallback=True),
     ]
-    for c in try_codes:
-        try:
-            return base_qs.get(code=c)
-        except Order.DoesNotExist:
-            pass
+
+
+def _get_order_ids(matches, event: Event = None, organizer: Organizer = None) -> dict:
+    """
+    Looks up the orders for all codes that might be meant by the given matches at once and returns a dictionary
+    mapping ``(slug, code)`` tuples to order IDs.
+    """
+    qs = event.orders.all() if event else Order.objects.filter(event__organizer=organizer)
+    codes = list({c for slug, code in matches for c in _try_codes(code)})
+    order_ids = {}
+    for i in range(0, len(codes), 1000):
+        for pk, code, slug in qs.filter(code__in=codes[i : i + 1000]).values_list('pk', 'code', 'event__slug'):
+            order_ids[slug.lower(), code] = pk
+    return order_ids
+
+
+def _find_order_for_code(order_ids: dict, slug, code):
+    for c in _try_codes(code):
+        if (slug.lower(), c) in order_ids:
+            return order_ids[slug.lower(), c]
 
 
 @transaction.atomic
-def _handle_transaction(
-    trans: BankTransaction,
-    matches: tuple,
-    event: Event = None,
-    organizer: Organizer = None,
-):
-    orders = []
-    if event:
-        for slug, code in matches:
-            order = _find_order_for_code(event.orders, code)
-            if order and order.code not in {o.code for o in orders}:
-                orders.append(order)
-    else:
-        qs = Order.objects.filter(event__organizer=organizer)
-        for slug, code in matches:
-            order = _find_order_for_code(qs.filter(event__slug__iexact=slug), code)
-            if order and order.code not in {o.code for o in orders}:
-                orders.append(order)
+def _handle_transaction(trans: BankTransaction, order_ids: list):
+    orders = sorted(Order.objects.filter(pk__in=order_ids), key=lambda o: order_ids.index(o.pk))
 
     if not orders:
         # No match
         trans.state = BankTransaction.STATE_NOMATCH
         trans.save()
         return
-    else:
-        trans.order = orders[0]
+    trans.order = orders[0]
 
     for o in orders:
         if o.status == Order.STATUS_PAID and o.pending_sum <= Decimal('0.00'):
@@ -211,12 +269,8 @@ def parse_date(date_str):
 
 def _get_unknown_transactions(job: BankImportJob, data: list, event: Event = None, organizer: Organizer = None):
     amount_pattern = re.compile('[^0-9.-]')
-    known_checksums = set(
-        t['checksum']
-        for t in BankTransaction.objects.filter(Q(event=event) if event else Q(organizer=organizer)).values('checksum')
-    )
 
-    transactions = []
+    candidates = []
     for row in data:
         amount = row['amount']
         if not isinstance(amount, Decimal):
@@ -243,16 +297,27 @@ def _get_unknown_transactions(job: BankImportJob, data: list, event: Event = Non
             date=row['date'],
             iban=row.get('iban', ''),
             bic=row.get('bic', ''),
+            state=BankTransaction.STATE_UNCHECKED,
         )
 
         trans.date_parsed = parse_date(trans.date)
 
         trans.checksum = trans.calculate_checksum()
-        if trans.checksum not in known_checksums:
-            trans.state = BankTransaction.STATE_UNCHECKED
-            trans.save()
-            transactions.append(trans)
+        candidates.append(trans)
+
+    # Only look up the checksums of this import instead of loading all known ones
+    checksums = list({t.checksum for t in candidates})
+    known_checksums = set()
+    for i in range(0, len(checksums), 1000):
+        known_checksums.update(
+            BankTransaction.objects.filter(
+                Q(event=event) if event else Q(organizer=organizer),
+                checksum__in=checksums[i : i + 1000],
+            ).values_list('checksum', flat=True)
+        )
 
+    transactions = [t for t in candidates if t.checksum not in known_checksums]
+    bulk_save(BankTransaction, transactions)
     return transactions
 
 
@@ -277,29 +342,32 @@ def process_banktransfers(self, job: int, data: list) -> None:
                     .aggregate(min=Min('clen'), max=Max('clen'))
                 )
                 if job.event:
-                    prefixes = [job.event.slug.upper()]
+                    slugs = [job.event.slug]
                 else:
-                    prefixes = [e.slug.upper() for e in job.organizer.events.all()]
-                pattern = re.compile(
-                    '(%s)[ \\-_]*([A-Z0-9]{%s,%s})'
-                    % (
-                        '|'.join(p.replace('.', r'\.').replace('-', r'[\- ]*') for p in prefixes),
-                        code_len_agg['min'] or 0,
-                        code_len_agg['max'] or 5,
-                    )
+                    slugs = list(job.organizer.events.values_list('slug', flat=True))
+                matcher = ReferenceMatcher(slugs, code_len_agg['min'] or 0, code_len_agg['max'] or 5)
+
+                matches = {
+                    trans.pk: matcher.findall(trans.reference.replace(' ', '').replace('\n', '').upper())
+                    for trans in transactions
+                }
+                order_ids = _get_order_ids(
+                    [m for trans_matches in matches.values() for m in trans_matches], **job.owner_kwargs
                 )
 
+                nomatch = []
                 for trans in transactions:
-                    matches = pattern.findall(trans.reference.replace(' ', '').replace('\n', '').upper())
-
-                    if matches:
-                        if job.event:
-                            _handle_transaction(trans, matches, event=job.event)
-                        else:
-                            _handle_transaction(trans, matches, organizer=job.organizer)
+                    trans_order_ids = []
+                    for slug, code in matches[trans.pk]:
+                        order_id = _find_order_for_code(order_ids, slug, code)
+                        if order_id and order_id not in trans_order_ids:
+                            trans_order_ids.append(order_id)
+
+                    if trans_order_ids:
+                        _handle_transaction(trans, trans_order_ids)
                     else:
-                        trans.state = BankTransaction.STATE_NOMATCH
-                        trans.save()
+                        nomatch.append(trans.pk)
+                BankTransaction.objects.filter(pk__in=nomatch).update(state=BankTransaction.STATE_NOMATCH)
             except LockTimeoutException:
                 try:
                     self.retry()
@@ -1,11 +1,47 @@
+from django.conf import settings
+from django.db.models import Prefetch
 from i18nfield.strings import LazyI18nString
 
 from eventyay.base.email import get_email_context
 from eventyay.base.i18n import language
-from eventyay.base.models import Event, InvoiceAddress, Order, User
-from eventyay.base.services.mail import SendMailException, mail
+from eventyay.base.models import (
+    Event,
+    InvoiceAddress,
+    LogEntry,
+    Order,
+    OrderPosition,
+    User,
+)
+from eventyay.base.services.mail import SendMailException, mail, mail_send_batch_task
 from eventyay.base.services.tasks import ProfiledEventTask
 from eventyay.celery_app import app
+from eventyay.helpers.database import bulk_save
+
+
+class _MailBatch:
+    """
+    Collects the messages and log entries of a bulk mailing and hands them over in chunks of
+    ``MAIL_BATCH_SIZE`` messages, each of which is sent over a single mail server connection.
+    """
+
+    def __init__(self, event: Event):
+        self.event = event
+        self.messages = []
+        self.log_entries = []
+
+    def log(self, logentry):
+        self.log_entries.append(logentry)
+        if len(self.messages) >= settings.MAIL_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.log_entries:
+            bulk_save(LogEntry, self.log_entries)
+            LogEntry.bulk_postprocess(self.log_entries)
+            self.log_entries = []
+        if self.messages:
+            mail_send_batch_task.apply_async(kwargs={'event': self.event.pk, 'messages': self.messages})
+            self.messages = []
 
 
 @app.task(base=ProfiledEventTask, acks_late=True)
@@ -24,12 +60,32 @@ def send_mails(
 ) -> None:
     failures = []
     user = User.objects.get(pk=user) if user else None
-    orders = Order.objects.filter(pk__in=orders, event=event)
+    orders = (
+        Order.objects.filter(pk__in=orders, event=event)
+        .select_related('invoice_address')
+        .prefetch_related(
+            Prefetch(
+                'all_positions',
+                queryset=OrderPosition.objects.prefetch_related('addons', 'checkins'),
+                to_attr='mail_positions',
+            )
+        )
+    )
     subject = LazyI18nString(subject)
     message = LazyI18nString(message)
+    batch = _MailBatch(event)
 
-    for o in orders:
+    # Subject and message only need to be localized once per locale, not once per recipient
+    localized = {}
+
+    def localize(locale):
+        if locale not in localized:
+            localized[locale] = (subject.localize(locale), message.localize(locale))
+        return localized[locale]
+
+    for o in orders.iterator(chunk_size=settings.MAIL_BATCH_SIZE):
         send_to_order = recipients in ('both', 'orders')
+        subject_text, message_text = localize(o.locale)
 
         try:
             ia = o.invoice_address
@@ -37,7 +93,7 @@ def send_mails(
             ia = InvoiceAddress(order=o)
 
         if recipients in ('both', 'attendees'):
-            for p in o.positions.prefetch_related('addons'):
+            for p in o.mail_positions:
                 if p.addon_to_id is not None:
                     continue
 
@@ -71,16 +127,20 @@ def send_mails(
                             order=o,
                             position=p,
                             attach_cached_files=attachments,
+                            batch=batch.messages,
                         )
-                        o.log_action(
-                            'pretix.plugins.sendmail.order.email.sent.attendee',
-                            user=user,
-                            data={
-                                'position': p.positionid,
-                                'subject': subject.localize(o.locale).format_map(email_context),
-                                'message': message.localize(o.locale).format_map(email_context),
-                                'recipient': p.attendee_email,
-                            },
+                        batch.log(
+                            o.log_action(
+                                'pretix.plugins.sendmail.order.email.sent.attendee',
+                                user=user,
+                                data={
+                                    'position': p.positionid,
+                                    'subject': subject_text.format_map(email_context),
+                                    'message': message_text.format_map(email_context),
+                                    'recipient': p.attendee_email,
+                                },
+                                save=False,
+                            )
                         )
                 except SendMailException:
                     failures.append(p.attendee_email)
@@ -98,15 +158,21 @@ def send_mails(
                         locale=o.locale,
                         order=o,
                         attach_cached_files=attachments,
+                        batch=batch.messages,
                     )
-                    o.log_action(
-                        'pretix.plugins.sendmail.order.email.sent',
-                        user=user,
-                        data={
-                            'subject': subject.localize(o.locale).format_map(email_context),
-                            'message': message.localize(o.locale).format_map(email_context),
-                            'recipient': o.email,
-                        },
+                    batch.log(
+                        o.log_action(
+                            'pretix.plugins.sendmail.order.email.sent',
+                            user=user,
+                            data={
+                                'subject': subject_text.format_map(email_context),
+                                'message': message_text.format_map(email_context),
+                                'recipient': o.email,
+                            },
+                            save=False,
+                        )
                     )
             except SendMailException:
                 failures.append(o.email)
+
+    batch.flush()
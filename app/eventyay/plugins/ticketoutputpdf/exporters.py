@@ -16,12 +16,47 @@ from pypdf import PdfWriter
 from eventyay.base.exporter import BaseExporter
 from eventyay.base.i18n import language
 from eventyay.base.models import Event, Order, OrderPosition
+from eventyay.base.pdf import render_in_chunks
 from eventyay.base.settings import PERSON_NAME_SCHEMES
 
 from ...helpers.templatetags.jsonfield import JSONExtract
 from .ticketoutput import PdfTicketOutput
 
 
+def _render_tickets(position_ids: list):
+    positions = (
+        OrderPosition.objects.filter(pk__in=position_ids)
+        .prefetch_related('answers', 'answers__question')
+        .select_related('order', 'order__event', 'product', 'variation', 'addon_to')
+    )
+    index = {pk: i for i, pk in enumerate(position_ids)}
+    positions = sorted(positions, key=lambda op: index[op.pk])
+
+    merger = PdfWriter()
+    o = PdfTicketOutput(Event.objects.none())
+    for op in positions:
+        if not op.generate_ticket:
+            continue
+
+        if op.order.event != o.event:
+            o = PdfTicketOutput(op.order.event)
+
+        with language(op.order.locale, o.event.settings.region):
+            layout = o.layout_map.get(
+                (op.product_id, op.order.sales_channel),
+                o.layout_map.get((op.product_id, 'web'), o.default_layout),
+            )
+            outbuffer = o._draw_page(layout, op, op.order)
+            merger.append(ContentFile(outbuffer.read()))
+
+    if not merger.pages:
+        return None
+    outbuffer = BytesIO()
+    merger.write(outbuffer)
+    merger.close()
+    return outbuffer.getvalue()
+
+
 class AllTicketsPDF(BaseExporter):
     name = 'alltickets'
     verbose_name = gettext_lazy('All PDF tickets in one file')
@@ -86,12 +121,7 @@ class AllTicketsPDF(BaseExporter):
         return d
 
     def render(self, form_data):
-        merger = PdfWriter()
-        qs = (
-            OrderPosition.objects.filter(order__event__in=self.events)
-            .prefetch_related('answers', 'answers__question')
-            .select_related('order', 'item', 'variation', 'addon_to')
-        )
+        qs = OrderPosition.objects.filter(order__event__in=self.events)
 
         if form_data.get('include_pending'):
             qs = qs.filter(order__status__in=[Order.STATUS_PAID, Order.STATUS_PENDING])
@@ -140,26 +170,12 @@ class AllTicketsPDF(BaseExporter):
                 .order_by('resolved_name_part')
             )
 
-        o = PdfTicketOutput(Event.objects.none())
-        for op in qs:
-            if not op.generate_ticket:
-                continue
-
-            if op.order.event != o.event:
-                o = PdfTicketOutput(op.event)
-
-            with language(op.order.locale, o.event.settings.region):
-                layout = o.layout_map.get(
-                    (op.item_id, op.order.sales_channel),
-                    o.layout_map.get((op.item_id, 'web'), o.default_layout),
-                )
-                outbuffer = o._draw_page(layout, op, op.order)
-                merger.append(ContentFile(outbuffer.read()))
-
-        outbuffer = BytesIO()
-        merger.write(outbuffer)
-        merger.close()
-        outbuffer.seek(0)
+        position_ids = list(qs.values_list('pk', flat=True))
+        chunks = [
+            position_ids[i : i + settings.PDF_RENDER_CHUNK_SIZE]
+            for i in range(0, len(position_ids), settings.PDF_RENDER_CHUNK_SIZE)
+        ]
+        outbuffer = render_in_chunks(_render_tickets, chunks, progress_callback=self.progress_callback)
 
         if self.is_multievent:
             return (
@@ -1,5 +1,6 @@
 import calendar
 import datetime as dt
+import hashlib
 import importlib.util
 import logging
 import sys
@@ -25,11 +26,12 @@ from django.db.models import (
 )
 from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.utils.formats import get_format
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from django.utils.translation import pgettext_lazy
+from django.utils.translation import get_language, pgettext_lazy
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
@@ -48,7 +50,7 @@ from eventyay.base.models.product import (
     SubEventProduct,
     SubEventProductVariation,
 )
-from eventyay.base.services.quotas import QuotaAvailability
+from eventyay.base.services.quotas import QuotaAvailability, product_quota_cache_key
 from eventyay.helpers.compat import date_fromisocalendar
 from eventyay.helpers.formats.en.formats import WEEK_FORMAT
 from eventyay.multidomain.urlreverse import eventreverse
@@ -98,6 +100,17 @@ def product_group_by_category(products):
     )
 
 
+def product_list_fingerprint(event, subevent=None, channel='web'):
+    """
+    Returns a fingerprint of the availability the product list of an event or one of its dates has last been
+    computed with, or ``None`` if it is not known without computing it again.
+    """
+    quota_cache = event.cache.get(product_quota_cache_key(subevent.pk if subevent else None, channel, 0))
+    if not quota_cache:
+        return None
+    return hashlib.sha1(repr(sorted(quota_cache.items())).encode()).hexdigest()
+
+
 def get_grouped_products(
     event,
     subevent=None,
@@ -214,7 +227,7 @@ def get_grouped_products(
         products = products.filter(category_id__in=[a for a in filter_categories if a.isdigit()])
 
     display_add_to_cart = False
-    quota_cache_key = f'product_quota_cache:{subevent.id if subevent else 0}:{channel}:{bool(require_seat)}'
+    quota_cache_key = product_quota_cache_key(subevent.pk if subevent else None, channel, require_seat)
     quota_cache = quota_cache or event.cache.get(quota_cache_key) or {}
     quota_cache_existed = bool(quota_cache)
 
@@ -498,7 +511,14 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
             self.request.event.cache.set('vouchers_exist', vouchers_exist)
         context['show_vouchers'] = context['vouchers_exist'] = vouchers_exist
 
-        if not self.request.event.has_subevents or self.subevent:
+        show_products = not self.request.event.has_subevents or self.subevent
+        cached_product_list = None
+        if show_products:
+            cache_key = self._product_list_cache_key()
+            cached_product_list = self.request.event.cache.get(cache_key) if cache_key else None
+        if cached_product_list:
+            context.update(cached_product_list)
+        elif show_products:
             # Fetch all products
             products, display_add_to_cart = get_grouped_products(
                 self.request.event,
@@ -586,8 +606,52 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                 _('This event only available for registered users. Please login to continue.'),
             )
 
+        if show_products and not cached_product_list:
+            self._cache_product_list(context)
+
         return context
 
+    def _product_list_cache_key(self):
+        # Filtered lists and visitors with a cart always get a freshly rendered product list
+        if self.request.GET.getlist('product') or self.request.GET.getlist('category') or get_cart(self.request):
+            return None
+        fingerprint = product_list_fingerprint(self.request.event, self.subevent, self.request.sales_channel.identifier)
+        if not fingerprint:
+            return None
+        return ':'.join(
+            [
+                'product_list',
+                str(self.subevent.pk) if self.subevent else '',
+                self.request.sales_channel.identifier,
+                get_language(),
+                self.kwargs.get('cart_namespace') or '',
+                str((self.subevent or self.request.event).presale_is_running),
+                fingerprint,
+            ]
+        )
+
+    def _cache_product_list(self, context):
+        """
+        Renders the product list of anonymous visitors once and keeps it in the event's cache, keyed by the
+        availability it has just been rendered with, so that it is not rendered again until the availability changes.
+        """
+        cache_key = self._product_list_cache_key()
+        if not cache_key:
+            return
+        context['product_list_html'] = render_to_string(
+            'pretixpresale/event/fragment_product_list.html', context, request=self.request
+        )
+        self.request.event.cache.set(
+            cache_key,
+            {
+                'product_list_html': context['product_list_html'],
+                'productnum': context['productnum'],
+                'allfree': context['allfree'],
+                'display_add_to_cart': context['display_add_to_cart'],
+            },
+            settings.PRESALE_PRODUCT_LIST_CACHE_TTL,
+        )
+
     def _subevent_list_context(self):
         voucher = None
         if self.request.GET.get('voucher'):
@@ -623,9 +687,9 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
             ebd = defaultdict(list)
             add_subevents_for_days(
                 filter_qs_by_attr(
-                    self.request.event.subevents_annotated(self.request.sales_channel.identifier).using(
-                        settings.DATABASE_REPLICA
-                    ),
+                    self.request.event.subevents_annotated(
+                        self.request.sales_channel.identifier, active_quotas=False
+                    ).using(settings.DATABASE_REPLICA),
                     self.request,
                 ),
                 before,
@@ -635,6 +699,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                 self.request.event,
                 self.kwargs.get('cart_namespace'),
                 voucher,
+                channel=self.request.sales_channel.identifier,
             )
 
             context['show_names'] = (
@@ -674,9 +739,9 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
             ebd = defaultdict(list)
             add_subevents_for_days(
                 filter_qs_by_attr(
-                    self.request.event.subevents_annotated(self.request.sales_channel.identifier).using(
-                        settings.DATABASE_REPLICA
-                    ),
+                    self.request.event.subevents_annotated(
+                        self.request.sales_channel.identifier, active_quotas=False
+                    ).using(settings.DATABASE_REPLICA),
                     self.request,
                 ),
                 before,
@@ -686,6 +751,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                 self.request.event,
                 self.kwargs.get('cart_namespace'),
                 voucher,
+                channel=self.request.sales_channel.identifier,
             )
 
             context['show_names'] = (
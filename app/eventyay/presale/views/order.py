@@ -60,7 +60,12 @@ from eventyay.base.services.orders import (
     change_payment_provider,
 )
 from eventyay.base.services.pricing import get_price
-from eventyay.base.services.tickets import generate, invalidate_cache
+from eventyay.base.services.tickets import (
+    generate,
+    get_cached_combined_ticket,
+    get_cached_ticket,
+    invalidate_cache,
+)
 from eventyay.base.signals import (
     allow_ticket_download,
     order_modified,
@@ -1092,18 +1097,8 @@ class OrderDownloadMixin:
 
     def get_last_ct(self):
         if 'position' in self.kwargs:
-            ct = CachedTicket.objects.filter(
-                order_position=self.order_position,
-                provider=self.output.identifier,
-                file__isnull=False,
-            ).last()
-        else:
-            ct = CachedCombinedTicket.objects.filter(
-                order=self.order, provider=self.output.identifier, file__isnull=False
-            ).last()
-        if not ct or not ct.file:
-            return None
-        return ct
+            return get_cached_ticket(self.order_position, self.output.identifier)
+        return get_cached_combined_ticket(self.order, self.output.identifier)
 
 
 @method_decorator(xframe_options_exempt, 'dispatch')
@@ -25,7 +25,7 @@ from eventyay.base.models import (
     SubEvent,
     SubEventMetaValue,
 )
-from eventyay.base.services.quotas import QuotaAvailability
+from eventyay.base.services.subeventavailability import annotate_availability
 from eventyay.helpers.compat import date_fromisocalendar
 from eventyay.helpers.daterange import daterange
 from eventyay.helpers.formats.de.formats import WEEK_FORMAT
@@ -408,7 +408,9 @@ def add_events_for_days(request, baseqs, before, after, ebd, timezones):
             )
 
 
-def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_namespace=None, voucher=None):
+def add_subevents_for_days(
+    qs, before, after, ebd, timezones, event=None, cart_namespace=None, voucher=None, channel='web'
+):
     qs = (
         qs.filter(active=True, is_public=True)
         .filter(
@@ -418,30 +420,30 @@ def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_n
         )
         .order_by('date_from')
     )
-
-    quotas_to_compute = []
-    for se in qs:
-        if se.presale_is_running:
-            quotas_to_compute += se.active_quotas
+    subevents = list(qs)
+    annotate_availability(subevents, channel)
 
     name = None
-    qcache = {}
-    if quotas_to_compute:
-        qa = QuotaAvailability()
-        qa.queue(*quotas_to_compute)
-        qa.compute(allow_cache=True)
-        qcache.update(qa.results)
-
-    for se in qs:
-        if qcache:
-            se._quota_cache = qcache
+    # Settings and the voucher URL only depend on the event, not on the individual date
+    event_settings = {}
+    redeem_urls = {}
+    for se in subevents:
         kwargs = {'subevent': se.pk}
         if cart_namespace:
             kwargs['cart_namespace'] = cart_namespace
 
-        s = event.settings if event else se.event.settings
+        s = event_settings.get(se.event_id)
+        if s is None:
+            es = event.settings if event else se.event.settings
+            s = event_settings[se.event_id] = {
+                'event_list_available_only': es.event_list_available_only,
+                'timezones': es.timezones,
+                'timezone': es.timezone,
+                'show_date_to': es.show_date_to,
+                'show_times': es.show_times,
+            }
 
-        if s.event_list_available_only:
+        if s['event_list_available_only']:
             hide = se.presale_has_ended or (
                 (not voucher or not voucher.allow_ignore_quota)
                 and se.best_availability_state is not None
@@ -450,15 +452,26 @@ def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_n
             if hide:
                 continue
 
-        timezones.add(s.timezones)
-        tz = pytz.timezone(s.timezone)
+        if voucher:
+            if se.event_id not in redeem_urls:
+                redeem_urls[se.event_id] = eventreverse(
+                    se.event,
+                    'presale:event.redeem',
+                    kwargs={k: v for k, v in kwargs.items() if k != 'subevent'},
+                )
+            url = redeem_urls[se.event_id] + f'?subevent={se.pk}&voucher={quote(voucher.code)}'
+        else:
+            url = eventreverse(se.event, 'presale:event.index', kwargs=kwargs)
+
+        timezones.add(s['timezones'])
+        tz = pytz.timezone(s['timezone'])
         datetime_from = se.date_from.astimezone(tz)
         date_from = datetime_from.date()
         if name is None:
             name = str(se.name)
         elif str(se.name) != name:
             ebd['_subevents_different_names'] = True
-        if s.show_date_to and se.date_to:
+        if s['show_date_to'] and se.date_to:
             datetime_to = se.date_to.astimezone(tz)
             date_to = se.date_to.astimezone(tz).date()
             d = max(date_from, before.date())
@@ -467,8 +480,8 @@ def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_n
                 ebd[d].append(
                     {
                         'continued': not first,
-                        'timezone': s.timezone,
-                        'time': datetime_from.time().replace(tzinfo=None) if first and s.show_times else None,
+                        'timezone': s['timezone'],
+                        'time': datetime_from.time().replace(tzinfo=None) if first and s['show_times'] else None,
                         'time_end': (
                             datetime_to.time().replace(tzinfo=None)
                             if (
@@ -478,20 +491,11 @@ def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_n
                                     and datetime_to.time() < datetime_from.time()
                                 )
                             )
-                            and s.show_times
+                            and s['show_times']
                             else None
                         ),
                         'event': se,
-                        'url': (
-                            eventreverse(
-                                se.event,
-                                'presale:event.redeem',
-                                kwargs={k: v for k, v in kwargs.items() if k != 'subevent'},
-                            )
-                            + f'?subevent={se.pk}&voucher={quote(voucher.code)}'
-                            if voucher
-                            else eventreverse(se.event, 'presale:event.index', kwargs=kwargs)
-                        ),
+                        'url': url,
                     }
                 )
                 d += timedelta(days=1)
@@ -501,18 +505,9 @@ def add_subevents_for_days(qs, before, after, ebd, timezones, event=None, cart_n
                 {
                     'event': se,
                     'continued': False,
-                    'time': datetime_from.time().replace(tzinfo=None) if s.show_times else None,
-                    'url': (
-                        eventreverse(
-                            se.event,
-                            'presale:event.redeem',
-                            kwargs={k: v for k, v in kwargs.items() if k != 'subevent'},
-                        )
-                        + f'?subevent={se.pk}&voucher={quote(voucher.code)}'
-                        if voucher
-                        else eventreverse(se.event, 'presale:event.index', kwargs=kwargs)
-                    ),
-                    'timezone': s.timezone,
+                    'time': datetime_from.time().replace(tzinfo=None) if s['show_times'] else None,
+                    'url': url,
+                    'timezone': s['timezone'],
                 }
             )
 
@@ -620,7 +615,8 @@ class CalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
                     ).prefetch_related(
                         'event___settings_objects',
                         'event__organizer___settings_objects',
-                    )
+                    ),
+                    active_quotas=False,
                 ),
                 self.request,
             ).using(settings.DATABASE_REPLICA),
@@ -721,7 +717,8 @@ class WeekCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
                     ).prefetch_related(
                         'event___settings_objects',
                         'event__organizer___settings_objects',
-                    )
+                    ),
+                    active_quotas=False,
                 ),
                 self.request,
             ).using(settings.DATABASE_REPLICA),
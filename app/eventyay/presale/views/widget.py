@@ -498,7 +498,7 @@ class WidgetAPIProductList(EventListMixin, View):
             if hasattr(self.request, 'event'):
                 add_subevents_for_days(
                     filter_qs_by_attr(
-                        self.request.event.subevents_annotated('web').filter(
+                        self.request.event.subevents_annotated('web', active_quotas=False).filter(
                             event__sales_channels__contains=self.request.sales_channel.identifier
                         ),
                         self.request,
@@ -536,7 +536,8 @@ class WidgetAPIProductList(EventListMixin, View):
                             ).prefetch_related(
                                 'event___settings_objects',
                                 'event__organizer___settings_objects',
-                            )
+                            ),
+                            active_quotas=False,
                         ),
                         self.request,
                     ),
@@ -584,7 +585,7 @@ class WidgetAPIProductList(EventListMixin, View):
             ebd = defaultdict(list)
             if hasattr(self.request, 'event'):
                 add_subevents_for_days(
-                    filter_qs_by_attr(self.request.event.subevents_annotated('web'), self.request),
+                    filter_qs_by_attr(self.request.event.subevents_annotated('web', active_quotas=False), self.request),
                     before,
                     after,
                     ebd,
@@ -615,7 +616,8 @@ class WidgetAPIProductList(EventListMixin, View):
                             ).prefetch_related(
                                 'event___settings_objects',
                                 'event__organizer___settings_objects',
-                            )
+                            ),
+                            active_quotas=False,
                         ),
                         self.request,
                     ),
@@ -0,0 +1,135 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from eventyay.base.models import Availability, SpeakerProfile
+
+
+def merge_intervals(intervals):
+    """Merge overlapping and adjacent ``(start, end)`` tuples, like
+    :meth:`Availability.union` does for availability objects."""
+    result = []
+    for start, end in sorted(intervals):
+        if result and start <= result[-1][1]:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+
+def intersect_intervals(intervals_a, intervals_b):
+    """Intersect two merged and sorted lists of ``(start, end)`` tuples in a
+    single sweep. Ranges that merely touch are not part of the result, like
+    in :meth:`Availability.intersection`."""
+    result = []
+    i = j = 0
+    while i < len(intervals_a) and j < len(intervals_b):
+        start = max(intervals_a[i][0], intervals_b[j][0])
+        end = min(intervals_a[i][1], intervals_b[j][1])
+        if start < end:
+            result.append((start, end))
+        if intervals_a[i][1] < intervals_b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def contains_interval(intervals, start, end):
+    """Check if any range in a merged and sorted list of ``(start, end)``
+    tuples covers the given range."""
+    position = bisect_right(intervals, start, key=lambda interval: interval[0]) - 1
+    return position >= 0 and intervals[position][1] >= end
+
+
+def to_availabilities(intervals):
+    return [Availability(start=start, end=end) for start, end in intervals]
+
+
+class AvailabilityIndex:
+    """The merged, sorted availabilities of all speaker profiles and rooms of
+    an event.
+
+    The index is built with a single query and shared between processes
+    through the cache until an availability of the event is changed, see
+    :func:`invalidate_availability_index`. Use :func:`get_availability_index`
+    to retrieve it.
+    """
+
+    def __init__(self, speakers, rooms, users):
+        self.speakers = speakers
+        self.rooms = rooms
+        self.users = users
+        self._intersections = {}
+
+    @classmethod
+    def build(cls, event):
+        speakers = defaultdict(list)
+        rooms = defaultdict(list)
+        for person_id, room_id, start, end in event.availabilities.all().values_list(
+            'person_id', 'room_id', 'start', 'end'
+        ):
+            if person_id:
+                speakers[person_id].append((start, end))
+            elif room_id:
+                rooms[room_id].append((start, end))
+        users = dict(SpeakerProfile.objects.filter(event=event, pk__in=speakers.keys()).values_list('user_id', 'pk'))
+        return cls(
+            speakers={key: merge_intervals(value) for key, value in speakers.items()},
+            rooms={key: merge_intervals(value) for key, value in rooms.items()},
+            users=users,
+        )
+
+    @property
+    def all_rooms(self):
+        """The times at which at least one room is available."""
+        return merge_intervals(interval for intervals in self.rooms.values() for interval in intervals)
+
+    def room_is_available(self, room_id, start, end):
+        """Rooms without any availabilities count as always available."""
+        intervals = self.rooms.get(room_id)
+        return not intervals or contains_interval(intervals, start, end)
+
+    def speaker_is_available(self, profile_id, start, end):
+        """Speakers without any availabilities count as always available."""
+        intervals = self.speakers.get(profile_id)
+        return not intervals or contains_interval(intervals, start, end)
+
+    def for_users(self, user_ids):
+        """The times at which all of the given users are available, ignoring
+        users who did not provide any availabilities. Results are cached per
+        set of users."""
+        key = frozenset(user_ids)
+        if key not in self._intersections:
+            sets = [self.speakers[self.users[user]] for user in key if self.users.get(user) in self.speakers]
+            result = sets[0] if sets else []
+            for intervals in sets[1:]:
+                result = intersect_intervals(result, intervals)
+            self._intersections[key] = result
+        return self._intersections[key]
+
+
+def _cache_key(event_id):
+    return f'availability_index:{event_id}'
+
+
+def get_availability_index(event) -> AvailabilityIndex:
+    if index := getattr(event, '_availability_index', None):
+        return index
+    data = cache.get(_cache_key(event.pk))
+    if data is None:
+        index = AvailabilityIndex.build(event)
+        cache.set(_cache_key(event.pk), (index.speakers, index.rooms, index.users), 3600)
+    else:
+        index = AvailabilityIndex(*data)
+    event._availability_index = index
+    return index
+
+
+def invalidate_availability_index(event_id):
+    """Drop the shared index of an event after its availabilities have been
+    changed. Call this after the transaction has been committed, otherwise
+    another process might rebuild the index from the old data."""
+    cache.delete(_cache_key(event_id))
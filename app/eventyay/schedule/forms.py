@@ -11,6 +11,11 @@ from i18nfield.forms import I18nModelForm
 from eventyay.common.forms.mixins import ReadOnlyFlag
 from eventyay.common.forms.widgets import HtmlDateInput, HtmlTimeInput
 from eventyay.base.models import Availability, Room, TalkSlot
+from eventyay.schedule.availability import (
+    get_availability_index,
+    invalidate_availability_index,
+    to_availabilities,
+)
 
 
 class AvailabilitiesFormMixin(forms.Form):
@@ -41,9 +46,8 @@ class AvailabilitiesFormMixin(forms.Form):
         if self.resolution:
             result['resolution'] = self.resolution
         if self.limit_to_rooms and self.event:
-            room_avails = self.event.availabilities.filter(room__isnull=False)
-            if room_avails:
-                merged_avails = Availability.union(room_avails)
+            merged_avails = to_availabilities(get_availability_index(self.event).all_rooms)
+            if merged_avails:
                 result['constraints'] = []
                 # make sure the availabilities don't cross date boundaries, otherwise split
                 for avail in merged_avails:
@@ -173,6 +177,8 @@ class AvailabilitiesFormMixin(forms.Form):
             # TODO: do not recreate objects unnecessarily, give the client the IDs, so we can track modifications and leave unchanged objects alone
             instance.availabilities.all().delete()
             Availability.objects.bulk_create(availabilities)
+            # bulk_create does not send signals, so we need to invalidate the index ourselves
+            transaction.on_commit(lambda: invalidate_availability_index(self.event.pk))
 
     def save(self, *args, **kwargs):
         if return_instance := hasattr(super(), 'save'):
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from eventyay.common.signals import (
@@ -80,3 +82,11 @@ def register_my_json_exporter(sender, **kwargs):
     from .exporters import MyFrabJsonExporter
 
     return MyFrabJsonExporter
+
+
+@receiver((post_save, post_delete), sender='base.Availability', dispatch_uid='availability_index_invalidate')
+def invalidate_availability_index_on_change(sender, instance, **kwargs):
+    from .availability import invalidate_availability_index
+
+    event_id = instance.event_id
+    transaction.on_commit(lambda: invalidate_availability_index(event_id))